@@ -96,4 +96,21 @@ class StorytellingMetrics(BaseModel):
     narrative_structure: Optional[float] = None
     authenticity: Optional[float] = None
     concreteness: Optional[float] = None
-    pacing: Optional[float] = None
\ No newline at end of file
+    pacing: Optional[float] = None
+
+
+class MediaProbe(BaseModel):
+    """Container/stream metadata from a single ffprobe run, stored as videos.media_info"""
+    model_config = ConfigDict(extra="ignore")
+    format_name: str = "unknown"
+    duration: Optional[float] = None
+    bit_rate: Optional[int] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    has_video: bool = False
+    has_audio: bool = False
@@ -5,7 +5,7 @@ import uuid
 
 from utils.auth import get_current_user
 
-def create_coaching_router(supabase):
+def create_coaching_router(repository):
     router = APIRouter(prefix="/coaching", tags=["coaching"])
 
     @router.post("/requests")
@@ -17,9 +17,6 @@ def create_coaching_router(supabase):
         user = get_current_user(session_token, authorization)
 
         try:
-            # Get Supabase client
-            supabase_client = supabase()
-            
             now = datetime.now(timezone.utc).isoformat()
             req_id = f"coachreq_{uuid.uuid4().hex}"
 
@@ -37,8 +34,8 @@ def create_coaching_router(supabase):
                 "updated_at": now,
             }
 
-            # Save coaching request to Supabase
-            response = supabase_client.table("coaching_requests").insert(doc).execute()
+            # Save coaching request
+            await repository.insert("coaching_requests", doc)
             
             return {"request_id": req_id}
             
@@ -53,13 +50,10 @@ def create_coaching_router(supabase):
         user = get_current_user(session_token, authorization)
 
         try:
-            # Get Supabase client
-            supabase_client = supabase()
-            
-            # Query coaching requests from Supabase
-            response = supabase_client.table("coaching_requests").select("*").eq("user_id", user["user_id"]).order("created_at", desc=True).execute()
-            
-            requests = response.data if response.data else []
+            # Query coaching requests
+            requests = await repository.select(
+                "coaching_requests", {"user_id": user["user_id"]}, order_by="created_at", desc=True
+            )
             return {"requests": requests}
             
         except Exception as e:
@@ -6,7 +6,7 @@ import uuid
 from models.profile import ProfileCreateRequest, UserProfile
 from utils.auth import get_current_user
 
-def create_profile_router(supabase):
+def create_profile_router(repository):
     router = APIRouter(prefix="/profile", tags=["profile"])
     
     @router.post("/")
@@ -18,9 +18,6 @@ def create_profile_router(supabase):
         user = get_current_user(session_token, authorization)
         
         try:
-            # Get Supabase client
-            supabase_client = supabase()
-            
             now = datetime.now(timezone.utc).isoformat()
             
             # Prepare profile data
@@ -36,10 +33,8 @@ def create_profile_router(supabase):
                 "updated_at": now
             }
             
-            # Save profile to Supabase
-            response = supabase_client.table("profiles").upsert(profile_data).execute()
-            
-            return response.data[0] if response.data else profile_data
+            # Save profile
+            return await repository.upsert("profiles", profile_data)
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create profile: {str(e)}")
@@ -52,16 +47,13 @@ def create_profile_router(supabase):
         user = get_current_user(session_token, authorization)
         
         try:
-            # Get Supabase client
-            supabase_client = supabase()
-            
-            # Query profile from Supabase
-            response = supabase_client.table("profiles").select("*").eq("id", user["user_id"]).execute()
+            # Query profile
+            profile = await repository.select_one("profiles", {"id": user["user_id"]})
             
-            if not response.data:
+            if not profile:
                 raise HTTPException(status_code=404, detail="Profile not found")
             
-            return response.data[0]
+            return profile
             
         except HTTPException:
             raise
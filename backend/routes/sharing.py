@@ -5,7 +5,7 @@ import uuid
 
 from utils.auth import get_current_user
 
-def create_sharing_router(supabase):
+def create_sharing_router(repository):
     router = APIRouter(tags=["sharing"])
 
     @router.post("/reports/{report_id}/share")
@@ -17,13 +17,10 @@ def create_sharing_router(supabase):
         user = await get_current_user(session_token, authorization)
 
         try:
-            # Get Supabase client
-            supabase_client = supabase
-            
             # Check if report exists and belongs to the user
-            report_response = supabase_client.table("reports").select("id").eq("id", report_id).eq("user_id", user["user_id"]).execute()
+            report = await repository.select_one("reports", {"id": report_id, "user_id": user["user_id"]}, columns="id")
             
-            if not report_response.data:
+            if not report:
                 raise HTTPException(status_code=404, detail="Report not found or not owned by user")
 
             share_id = f"share_{uuid.uuid4().hex}"
@@ -39,8 +36,8 @@ def create_sharing_router(supabase):
                 "revoked": False,
             }
 
-            # Save share link to Supabase
-            response = supabase_client.table("shared_reports").insert(doc).execute()
+            # Save share link
+            await repository.insert("shared_reports", doc)
             
             return {"share_id": share_id, "expires_at": expires_at.isoformat()}
             
@@ -52,16 +49,11 @@ def create_sharing_router(supabase):
     @router.get("/shared/reports/{share_id}")
     async def get_shared_report(share_id: str):
         try:
-            # Get Supabase client
-            supabase_client = supabase
-            
-            # Query share link from Supabase
-            share_response = supabase_client.table("shared_reports").select("*").eq("id", share_id).execute()
+            # Query share link
+            share = await repository.select_one("shared_reports", {"id": share_id})
             
-            if not share_response.data:
+            if not share:
                 raise HTTPException(status_code=404, detail="Share link not found")
-                
-            share = share_response.data[0]
             
             if share.get("revoked"):
                 raise HTTPException(status_code=404, detail="Share link not found")
@@ -74,13 +66,11 @@ def create_sharing_router(supabase):
                 if exp < datetime.now(timezone.utc):
                     raise HTTPException(status_code=410, detail="Share link expired")
 
-            # Get the report from Supabase
-            report_response = supabase_client.table("reports").select("*").eq("id", share["report_id"]).execute()
+            # Get the report
+            report = await repository.select_one("reports", {"id": share["report_id"]})
             
-            if not report_response.data:
+            if not report:
                 raise HTTPException(status_code=404, detail="Report not found")
-                
-            report = report_response.data[0]
 
             # Hide internal identifiers
             report.pop("user_id", None)
@@ -100,17 +90,13 @@ def create_sharing_router(supabase):
         user = await get_current_user(session_token, authorization)
 
         try:
-            # Get Supabase client
-            supabase_client = supabase
+            # Revoke the share link if it exists and belongs to the user
+            revoked = await repository.update(
+                "shared_reports", {"revoked": True}, {"id": share_id, "owner_id": user["user_id"]}
+            )
             
-            # Check if share link exists and belongs to the user
-            share_response = supabase_client.table("shared_reports").select("id").eq("id", share_id).eq("owner_id", user["user_id"]).execute()
-            
-            if not share_response.data:
+            if not revoked:
                 raise HTTPException(status_code=404, detail="Share link not found or not owned by user")
-
-            # Revoke the share link
-            supabase_client.table("shared_reports").update({"revoked": True}).eq("id", share_id).execute()
             
             return {"message": "Share link revoked successfully"}
             
@@ -56,7 +56,7 @@ class UpgradeRequest(BaseModel):
     tier: str
     billing_cycle: str  # monthly or yearly
 
-async def check_subscription_status(user_id: str, user_email: str, supabase_client):
+async def check_subscription_status(user_id: str, user_email: str, repository):
     """Check user's subscription status"""
     # Check if user is whitelisted
     if user_email in WHITELISTED_EMAILS:
@@ -69,10 +69,9 @@ async def check_subscription_status(user_id: str, user_email: str, supabase_clie
     
     try:
         # Query subscriptions table for user's active subscription
-        response = supabase_client.table("subscriptions").select("*").eq("user_id", user_id).eq("status", "active").execute()
+        subscription = await repository.select_one("subscriptions", {"user_id": user_id, "status": "active"})
         
-        if response.data:
-            subscription = response.data[0]
+        if subscription:
             tier_info = SUBSCRIPTION_TIERS.get(subscription["plan_type"], SUBSCRIPTION_TIERS["free"])
             
             return {
@@ -101,7 +100,7 @@ async def check_subscription_status(user_id: str, user_email: str, supabase_clie
             "limits": SUBSCRIPTION_TIERS["free"]
         }
 
-def get_subscription_routes(supabase):
+def get_subscription_routes(repository):
     from utils.supabase_auth import get_current_user
     
     @router.get("/subscription/status")
@@ -113,11 +112,8 @@ def get_subscription_routes(supabase):
         user = await get_current_user(session_token, authorization)
         
         try:
-            # Get Supabase client
-            supabase_client = supabase
-            
             # Check subscription status
-            subscription = await check_subscription_status(user["user_id"], user["email"], supabase_client)
+            subscription = await check_subscription_status(user["user_id"], user["email"], repository)
             
             # Add device fingerprint if provided
             if device_fingerprint:
@@ -131,7 +127,7 @@ def get_subscription_routes(supabase):
                     }
                     
                     # Upsert device information
-                    supabase_client.table("devices").upsert(device_data).execute()
+                    await repository.upsert("devices", device_data)
                 except Exception as e:
                     # Log error but don't fail the request
                     print(f"Failed to store device fingerprint: {str(e)}")
@@ -153,11 +149,8 @@ def get_subscription_routes(supabase):
             raise HTTPException(status_code=400, detail="Invalid subscription tier")
         
         try:
-            # Get Supabase client
-            supabase_client = supabase
-            
             # Deactivate any existing active subscriptions
-            supabase_client.table("subscriptions").update({"status": "cancelled"}).eq("user_id", user["user_id"]).eq("status", "active").execute()
+            await repository.update("subscriptions", {"status": "cancelled"}, {"user_id": user["user_id"], "status": "active"})
             
             # Create new subscription
             now = datetime.now(timezone.utc)
@@ -177,9 +170,7 @@ def get_subscription_routes(supabase):
             }
             
             # Insert new subscription
-            response = supabase_client.table("subscriptions").insert(subscription_data).execute()
-            
-            return response.data[0] if response.data else subscription_data
+            return await repository.insert("subscriptions", subscription_data)
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to upgrade subscription: {str(e)}")
@@ -0,0 +1,372 @@
+"""
+Resumable upload routes (tus-style)
+Lets clients upload large recordings in chunks and resume after a dropped
+connection instead of re-sending the whole file:
+
+    POST   /api/uploads                          create an upload, returns upload_id
+    HEAD   /api/uploads/{upload_id}              current offset (Upload-Offset header)
+    PATCH  /api/uploads/{upload_id}              append a chunk at Upload-Offset
+    PUT    /api/uploads/{upload_id}/parts/{n}    write part n (parallel uploads)
+    GET    /api/uploads/{upload_id}              received ranges and missing parts
+    POST   /api/uploads/{upload_id}/finalize     store the assembled video, returns video_id
+    DELETE /api/uploads/{upload_id}              abort
+
+Chunks are staged on disk under UPLOAD_STAGING_DIR; each received byte range
+is recorded as its own marker file so concurrent part uploads never rewrite
+shared state. Every request of an upload must see the same staging
+directory: with more than one API instance, UPLOAD_STAGING_DIR has to be a
+volume they all mount (or uploads need sticky routing to one instance).
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import tempfile
+from typing import Optional, List, Tuple
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Cookie, Header, Request, Response
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "ep_uploads"))
+UPLOAD_STAGING_TTL_SECONDS = int(os.getenv("UPLOAD_STAGING_TTL_HOURS", "24")) * 3600
+# Matches the storage part size so parts map 1:1 onto resumable storage parts
+UPLOAD_PART_SIZE = 6 * 1024 * 1024
+MAX_UPLOAD_SIZE = 1024 * 1024 * 1024  # 1GB, same limit as /api/videos/upload
+
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: Optional[str] = "video/mp4"
+
+
+class UploadStagingStore:
+    """Disk staging area for resumable uploads.
+
+    The public methods are coroutines that run the file I/O on worker threads.
+    """
+
+    def __init__(self, root: str = UPLOAD_STAGING_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, upload_id: str) -> str:
+        if not upload_id.startswith("upload_") or not upload_id[7:].isalnum():
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return os.path.join(self.root, upload_id)
+
+    def data_path(self, upload_id: str) -> str:
+        return os.path.join(self._dir(upload_id), "data")
+
+    def _create(self, user_id: str, request: CreateUploadRequest) -> dict:
+        self._cleanup_expired()
+
+        upload_id = f"upload_{uuid.uuid4().hex}"
+        upload_dir = self._dir(upload_id)
+        os.makedirs(os.path.join(upload_dir, "ranges"))
+
+        meta = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "filename": os.path.basename(request.filename),
+            "content_type": request.content_type,
+            "size": request.size,
+            "part_size": UPLOAD_PART_SIZE,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        with open(os.path.join(upload_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # Sparse file: parts can be written at any offset
+        with open(self.data_path(upload_id), "wb") as f:
+            f.truncate(request.size)
+
+        return meta
+
+    def _get(self, upload_id: str, user_id: str) -> dict:
+        meta_path = os.path.join(self._dir(upload_id), "meta.json")
+        if not os.path.exists(meta_path):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return meta
+
+    def _record_range(self, upload_id: str, start: int, end: int):
+        if end > start:
+            open(os.path.join(self._dir(upload_id), "ranges", f"{start}-{end}"), "w").close()
+
+    def _ranges(self, upload_id: str) -> List[Tuple[int, int]]:
+        """Received byte ranges, merged and sorted"""
+        markers = os.listdir(os.path.join(self._dir(upload_id), "ranges"))
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(tuple(map(int, name.split("-"))) for name in markers):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def offset_from(ranges: List[Tuple[int, int]]) -> int:
+        return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+    @staticmethod
+    def missing_parts_from(meta: dict, ranges: List[Tuple[int, int]]) -> List[int]:
+        part_count = (meta["size"] + meta["part_size"] - 1) // meta["part_size"]
+        missing = []
+        for part in range(part_count):
+            start = part * meta["part_size"]
+            end = min(start + meta["part_size"], meta["size"])
+            if not any(r_start <= start and end <= r_end for r_start, r_end in ranges):
+                missing.append(part)
+        return missing
+
+    async def write(self, upload_id: str, offset: int, request: Request, limit: int) -> int:
+        """Stream the request body into the staging file at `offset`; returns bytes written
+
+        Bytes that arrive before a dropped connection are still recorded so the
+        client can resume from the new offset.
+        """
+        if await asyncio.to_thread(os.path.exists, self._finalizing_path(upload_id)):
+            raise HTTPException(status_code=409, detail="Upload is being finalized")
+
+        written = 0
+        handle = await asyncio.to_thread(open, self.data_path(upload_id), "r+b")
+        try:
+            await asyncio.to_thread(handle.seek, offset)
+            async for chunk in request.stream():
+                if written + len(chunk) > limit:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds upload length")
+                await asyncio.to_thread(handle.write, chunk)
+                written += len(chunk)
+        finally:
+            await asyncio.to_thread(handle.close)
+        return written
+
+    def _finalizing_path(self, upload_id: str) -> str:
+        return os.path.join(self._dir(upload_id), "finalizing")
+
+    def _claim_finalize(self, upload_id: str) -> bool:
+        # O_EXCL: exactly one request (on any instance sharing the directory) wins
+        try:
+            os.close(os.open(self._finalizing_path(upload_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            return False
+
+    def _release_finalize(self, upload_id: str):
+        try:
+            os.unlink(self._finalizing_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _last_activity(path: str) -> float:
+        # New range markers touch ranges/ and chunk writes touch data; the upload directory itself changes neither
+        times = [os.path.getmtime(path)]
+        for name in ("ranges", "data"):
+            try:
+                times.append(os.path.getmtime(os.path.join(path, name)))
+            except FileNotFoundError:
+                pass
+        return max(times)
+
+    def _cleanup_expired(self):
+        cutoff = time.time() - UPLOAD_STAGING_TTL_SECONDS
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                expired = name.startswith("upload_") and self._last_activity(path) < cutoff
+            except FileNotFoundError:
+                continue
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+
+    async def create(self, user_id: str, request: CreateUploadRequest) -> dict:
+        return await asyncio.to_thread(self._create, user_id, request)
+
+    async def get(self, upload_id: str, user_id: str) -> dict:
+        return await asyncio.to_thread(self._get, upload_id, user_id)
+
+    async def record_range(self, upload_id: str, start: int, end: int):
+        await asyncio.to_thread(self._record_range, upload_id, start, end)
+
+    async def ranges(self, upload_id: str) -> List[Tuple[int, int]]:
+        return await asyncio.to_thread(self._ranges, upload_id)
+
+    async def offset(self, upload_id: str) -> int:
+        return self.offset_from(await self.ranges(upload_id))
+
+    async def missing_parts(self, meta: dict) -> List[int]:
+        return self.missing_parts_from(meta, await self.ranges(meta["upload_id"]))
+
+    async def claim_finalize(self, upload_id: str) -> bool:
+        return await asyncio.to_thread(self._claim_finalize, upload_id)
+
+    async def release_finalize(self, upload_id: str):
+        await asyncio.to_thread(self._release_finalize, upload_id)
+
+    async def delete(self, upload_id: str):
+        await asyncio.to_thread(shutil.rmtree, self._dir(upload_id), True)
+
+
+def create_uploads_router():
+    from utils.supabase_auth import get_current_user
+    from utils.supabase_storage import save_video_file_to_storage
+
+    router = APIRouter(prefix="/api/uploads", tags=["uploads"])
+    store = UploadStagingStore()
+
+    async def offset_headers(upload_id: str, meta: dict) -> dict:
+        return {
+            "Upload-Offset": str(await store.offset(upload_id)),
+            "Upload-Length": str(meta["size"]),
+            "Cache-Control": "no-store"
+        }
+
+    @router.post("", status_code=201)
+    async def create_upload(
+        request: CreateUploadRequest,
+        response: Response,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+
+        if request.size <= 0:
+            raise HTTPException(status_code=400, detail="Upload size must be positive")
+        if request.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(status_code=400, detail="Video size exceeds 1GB limit")
+
+        meta = await store.create(user["user_id"], request)
+        response.headers["Location"] = f"/api/uploads/{meta['upload_id']}"
+        return {"upload_id": meta["upload_id"], "offset": 0, "part_size": meta["part_size"]}
+
+    @router.head("/{upload_id}")
+    async def get_upload_offset(
+        upload_id: str,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        meta = await store.get(upload_id, user["user_id"])
+        return Response(status_code=200, headers=await offset_headers(upload_id, meta))
+
+    @router.get("/{upload_id}")
+    async def get_upload_status(
+        upload_id: str,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        meta = await store.get(upload_id, user["user_id"])
+        ranges = await store.ranges(upload_id)
+        return {
+            "upload_id": upload_id,
+            "size": meta["size"],
+            "part_size": meta["part_size"],
+            "offset": store.offset_from(ranges),
+            "received_ranges": ranges,
+            "missing_parts": store.missing_parts_from(meta, ranges)
+        }
+
+    @router.patch("/{upload_id}")
+    async def append_chunk(
+        upload_id: str,
+        request: Request,
+        upload_offset: int = Header(..., alias="Upload-Offset"),
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        meta = await store.get(upload_id, user["user_id"])
+
+        current = await store.offset(upload_id)
+        if upload_offset != current:
+            raise HTTPException(status_code=409, detail=f"Offset mismatch: server offset is {current}")
+
+        written = 0
+        try:
+            written = await store.write(upload_id, upload_offset, request, meta["size"] - upload_offset)
+        finally:
+            await store.record_range(upload_id, upload_offset, upload_offset + written)
+
+        return Response(status_code=204, headers=await offset_headers(upload_id, meta))
+
+    @router.put("/{upload_id}/parts/{part_number}")
+    async def upload_part(
+        upload_id: str,
+        part_number: int,
+        request: Request,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        meta = await store.get(upload_id, user["user_id"])
+
+        start = part_number * meta["part_size"]
+        if part_number < 0 or start >= meta["size"]:
+            raise HTTPException(status_code=400, detail="Invalid part number")
+        expected = min(meta["part_size"], meta["size"] - start)
+
+        written = await store.write(upload_id, start, request, expected)
+        if written != expected:
+            # Partial parts are not recorded; the client re-sends the whole part
+            raise HTTPException(status_code=400, detail=f"Part {part_number} must be {expected} bytes, got {written}")
+        await store.record_range(upload_id, start, start + written)
+
+        return {"part_number": part_number, "size": written}
+
+    @router.post("/{upload_id}/finalize")
+    async def finalize_upload(
+        upload_id: str,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        meta = await store.get(upload_id, user["user_id"])
+
+        ranges = await store.ranges(upload_id)
+        if ranges != [(0, meta["size"])]:
+            raise HTTPException(status_code=409, detail={
+                "message": "Upload is incomplete",
+                "offset": store.offset_from(ranges),
+                "missing_parts": store.missing_parts_from(meta, ranges)
+            })
+
+        # A retried or duplicated finalize must not store the video twice
+        if not await store.claim_finalize(upload_id):
+            raise HTTPException(status_code=409, detail="Upload is already being finalized")
+
+        try:
+            video_id = await save_video_file_to_storage(
+                store.data_path(upload_id), meta["filename"], meta["content_type"], user["user_id"]
+            )
+        except Exception as e:
+            await store.release_finalize(upload_id)
+            raise HTTPException(status_code=500, detail=f"Failed to save video: {str(e)}")
+
+        await store.delete(upload_id)
+        logger.info(f"Resumable upload {upload_id} finalized as video {video_id}")
+        return {"video_id": video_id, "message": "Video uploaded successfully"}
+
+    @router.delete("/{upload_id}")
+    async def abort_upload(
+        upload_id: str,
+        session_token: Optional[str] = Cookie(None),
+        authorization: Optional[str] = Header(None)
+    ):
+        user = await get_current_user(session_token, authorization)
+        await store.get(upload_id, user["user_id"])
+        await store.delete(upload_id)
+        return {"message": "Upload aborted"}
+
+    return router
@@ -30,6 +30,8 @@ from fastapi.responses import StreamingResponse, FileResponse
 from starlette.middleware.cors import CORSMiddleware
 import logging
 from datetime import datetime, timezone, timedelta
+import json
+import hmac
 import uuid
 import asyncio
 from typing import Optional
@@ -45,6 +47,10 @@ from models.profile import ProfileCreateRequest, UserProfile
 from utils.auth import create_user, get_user_by_email, verify_password
 from utils.supabase_storage import save_video_to_storage, get_video_from_storage
 from services.video_processor import VideoProcessorService
+from services.job_queue import get_job_queue
+from services.repository import get_repository
+from services.job_events import get_job_event_hub, is_terminal
+from utils.session_tokens import SESSION_TOKEN_MODE, issue_session_token
 from routes.profile import create_profile_router
 from routes.subscription import get_subscription_routes
 from services.timed_content import (
@@ -57,6 +63,7 @@ from services.timed_content import (
 from routes.coaching import create_coaching_router
 from routes.sharing import create_sharing_router
 from routes.content import get_content_routes
+from routes.uploads import create_uploads_router
 from services.video_retention import create_retention_router, VideoRetentionService
 
 # Environment variables already loaded at the top of the file
@@ -84,7 +91,7 @@ async def signup(request: SignupRequest, response: Response):
         supabase = get_supabase_client()
         
         # Use Supabase Auth to sign up the user
-        auth_response = supabase.auth.sign_up({
+        auth_response = await asyncio.to_thread(supabase.auth.sign_up, {
             "email": request.email,
             "password": request.password,
             "options": {
@@ -107,13 +114,25 @@ async def signup(request: SignupRequest, response: Response):
         }
         
         try:
-            get_supabase_client().table("users").insert(user_table_data).execute()
+            await get_repository().insert("users", user_table_data)
         except Exception as e:
             # User might already exist in the table, which is fine
             pass
         
+        # Transform user data to match existing structure
+        user = {
+            "user_id": user_data.id,
+            "email": user_data.email,
+            "name": request.name,
+            "picture": None,
+            "created_at": user_data.created_at
+        }
+        
         # Create our own session token for compatibility with existing frontend
-        session_token = str(uuid.uuid4())
+        if SESSION_TOKEN_MODE == "signed":
+            session_token, _ = issue_session_token(user)
+        else:
+            session_token = str(uuid.uuid4())
         
         # Check if we're in development mode
         is_production = not os.getenv("DEV_MODE", "false").lower() == "true"
@@ -128,15 +147,6 @@ async def signup(request: SignupRequest, response: Response):
             max_age=7 * 24 * 60 * 60
         )
         
-        # Transform user data to match existing structure
-        user = {
-            "user_id": user_data.id,
-            "email": user_data.email,
-            "name": request.name,
-            "picture": None,
-            "created_at": user_data.created_at
-        }
-        
         return {"user": user, "session_token": session_token}
         
     except Exception as e:
@@ -160,7 +170,7 @@ async def login(request: LoginRequest, response: Response):
         print(f"DEBUG: Attempting Supabase login for {request.email}")  # Debug print
         
         # Use Supabase Auth to sign in the user
-        auth_response = supabase.auth.sign_in_with_password({
+        auth_response = await asyncio.to_thread(supabase.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -175,26 +185,39 @@ async def login(request: LoginRequest, response: Response):
         print(f"DEBUG: User data: {user_data}")  # Debug print
         print(f"DEBUG: Session data: {session_data}")  # Debug print
         
-        # Create our own session token for compatibility with existing frontend
-        session_token = str(uuid.uuid4())
+        # Transform user data to match existing structure
+        user = {
+            "user_id": user_data.id,
+            "email": user_data.email,
+            "name": getattr(user_data, 'user_metadata', {}).get('name', ''),
+            "picture": getattr(user_data, 'user_metadata', {}).get('picture'),
+            "created_at": user_data.created_at
+        }
         
-        print(f"DEBUG: Generated session token: {session_token}")  # Debug print
+        if SESSION_TOKEN_MODE == "signed":
+            # Self-contained token: later requests are validated without a database lookup
+            session_token, _ = issue_session_token(user)
+        else:
+            # Create our own session token for compatibility with existing frontend
+            session_token = str(uuid.uuid4())
         
-        # Save session to database
-        from datetime import datetime, timezone, timedelta
-        session_id = str(uuid.uuid4())
-        expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+            print(f"DEBUG: Generated session token: {session_token}")  # Debug print
         
-        session_record = {
-            "id": session_id,
-            "user_id": user_data.id,
-            "session_token": session_token,
-            "expires_at": expires_at.isoformat()
-        }
+            # Save session to database
+            from datetime import datetime, timezone, timedelta
+            session_id = str(uuid.uuid4())
+            expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+        
+            session_record = {
+                "id": session_id,
+                "user_id": user_data.id,
+                "session_token": session_token,
+                "expires_at": expires_at.isoformat()
+            }
         
-        # Insert session record into database
-        supabase.table("user_sessions").insert(session_record).execute()
-        print(f"DEBUG: Saved session to database: {session_record}")  # Debug print
+            # Insert session record into database
+            await get_repository().insert("user_sessions", session_record)
+            print(f"DEBUG: Saved session to database: {session_record}")  # Debug print
         
         # Check if we're in development mode
         is_production = not os.getenv("DEV_MODE", "false").lower() == "true"
@@ -209,15 +232,6 @@ async def login(request: LoginRequest, response: Response):
             max_age=7 * 24 * 60 * 60
         )
         
-        # Transform user data to match existing structure
-        user = {
-            "user_id": user_data.id,
-            "email": user_data.email,
-            "name": getattr(user_data, 'user_metadata', {}).get('name', ''),
-            "picture": getattr(user_data, 'user_metadata', {}).get('picture'),
-            "created_at": user_data.created_at
-        }
-        
         print(f"DEBUG: Returning user data: {user}")  # Debug print
         
         return {"user": user, "session_token": session_token}
@@ -292,8 +306,23 @@ async def get_me(session_token: Optional[str] = Cookie(None), authorization: Opt
     return user
 
 @api_router.post("/auth/logout")
-async def logout(response: Response, session_token: Optional[str] = Cookie(None)):
-    # Clear the cookie with the appropriate settings (bypass session validation)
+async def logout(
+    response: Response,
+    session_token: Optional[str] = Cookie(None),
+    authorization: Optional[str] = Header(None)
+):
+    token = session_token
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization.replace("Bearer ", "")
+    
+    # End the session server-side too, so the token stops working everywhere (bypass session validation)
+    if token:
+        from utils.supabase_auth import delete_session
+        try:
+            await delete_session(token)
+        except Exception as e:
+            logger.warning(f"Failed to delete session on logout: {str(e)}")
+    
     is_production = not os.getenv("DEV_MODE", "false").lower() == "true"
     
     # Clear the cookie with the appropriate settings
@@ -317,7 +346,9 @@ async def upload_video(
     if file.size and file.size > 1024 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Video size exceeds 1GB limit")
     
-    # Save video to storage
+    # Save video to storage. Starlette spools the multipart body to a temporary
+    # file and save_video_to_storage streams it in fixed-size parts, so memory
+    # per upload stays bounded by UPLOAD_CHUNK_SIZE regardless of video size.
     try:
         from utils.supabase_storage import save_video_to_storage
         video_id = await save_video_to_storage(file, user["user_id"])
@@ -352,19 +383,14 @@ async def process_video(
     # Create a processing job
     job_id = f"job_{uuid.uuid4().hex}"
     
-    job_data = {
-        "id": job_id,
-        "user_id": user["user_id"],
-        "video_id": video_id,
-        "status": "pending",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    logger.info(f"Processing job created: {job_data}")
+    # Persist the job; a worker process claims it from the queue
+    try:
+        await get_job_queue().enqueue(job_id, user["user_id"], video_id)
+    except Exception as e:
+        logger.error(f"Failed to enqueue job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to start processing: {str(e)}")
     
-    # Trigger video processing asynchronously
-    asyncio.create_task(process_video_async(job_id, video_id, user["user_id"]))
+    logger.info(f"Processing job {job_id} queued for video {video_id}")
     
     return {"job_id": job_id, "message": "Video processing started"}
 
@@ -377,24 +403,53 @@ async def get_job_status(
     user = await get_current_user(session_token, authorization)
     
     try:
-        # Get Supabase client
-        from utils.supabase_client import get_supabase_client
-        supabase = get_supabase_client()
-        
-        # Query the database for the actual job status
-        response = supabase.table("jobs").select("*").eq("id", job_id).eq("user_id", user["user_id"]).execute()
+        # Query the job queue for the actual job status
+        job = await get_job_queue().get_job(job_id, user["user_id"])
         
-        if not response.data:
+        if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job = response.data[0]
         logger.info(f"Returning job status: {job}")
         return job
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get job status: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get job status: {str(e)}")
 
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    session_token: Optional[str] = Cookie(None),
+    authorization: Optional[str] = Header(None)
+):
+    """Server-Sent Events: the job's state, then every progress change until it completes or fails for good"""
+    user = await get_current_user(session_token, authorization)
+    
+    # Authenticate and check ownership once; the stream itself never touches the session tables
+    job = await get_job_queue().get_job(job_id, user["user_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        # Reconnect quickly if the connection drops mid-job
+        yield "retry: 3000\n\n"
+        async for state in get_job_event_hub().stream(job):
+            if state is None:
+                # Keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+            elif is_terminal(state):
+                yield f"event: done\ndata: {json.dumps(state)}\n\n"
+            else:
+                yield f"data: {json.dumps(state)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/reports/{report_id}")
 async def get_report(
     report_id: str,
@@ -404,17 +459,12 @@ async def get_report(
     user = await get_current_user(session_token, authorization)
     
     try:
-        # Get Supabase client
-        from utils.supabase_client import get_supabase_client
-        supabase = get_supabase_client()
-        
         # Query the database for the actual report
-        response = supabase.table("reports").select("*").eq("id", report_id).eq("user_id", user["user_id"]).execute()
+        report = await get_repository().select_one("reports", {"id": report_id, "user_id": user["user_id"]})
         
-        if not response.data:
+        if not report:
             raise HTTPException(status_code=404, detail="Report not found")
         
-        report = response.data[0]
         logger.info(f"Returning report: {report}")
         return report
         
@@ -430,14 +480,8 @@ async def list_reports(
     user = await get_current_user(session_token, authorization)
     
     try:
-        # Get Supabase client
-        from utils.supabase_client import get_supabase_client
-        supabase = get_supabase_client()
-        
         # Query the database for the user's reports
-        response = supabase.table("reports").select("*").eq("user_id", user["user_id"]).order("created_at", desc=True).execute()
-        
-        reports = response.data if response.data else []
+        reports = await get_repository().select("reports", {"user_id": user["user_id"]}, order_by="created_at", desc=True)
         logger.info(f"Returning reports list with {len(reports)} items")
         return {"reports": reports}
         
@@ -456,7 +500,7 @@ async def stream_video(
     try:
         # Get signed URL from Supabase storage
         from utils.supabase_storage import get_signed_url
-        signed_url = get_signed_url(video_id, expires_in=3600)  # URL expires in 1 hour
+        signed_url = await asyncio.to_thread(get_signed_url, video_id, expires_in=3600)  # URL expires in 1 hour
         
         return {"url": signed_url, "video_id": video_id}
     except Exception as e:
@@ -467,12 +511,13 @@ async def stream_video(
 app.include_router(api_router)
 
 # Include other routers
-app.include_router(create_profile_router(get_supabase_client()))
-app.include_router(get_subscription_routes(get_supabase_client()))
-app.include_router(create_coaching_router(get_supabase_client()))
-app.include_router(create_sharing_router(get_supabase_client()))
-app.include_router(create_retention_router(get_supabase_client()))
+app.include_router(create_profile_router(get_repository()))
+app.include_router(get_subscription_routes(get_repository()))
+app.include_router(create_coaching_router(get_repository()))
+app.include_router(create_sharing_router(get_repository()))
+app.include_router(create_retention_router(get_repository()))
 app.include_router(get_content_routes())
+app.include_router(create_uploads_router())
 
 # CORS middleware
 # Get frontend URL from environment variable, fallback to localhost for development
@@ -502,23 +547,51 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
-async def process_video_async(job_id: str, video_id: str, user_id: str):
-    """Process video using the real video processor service"""
-    try:
-        # Update job status to processing
-        logger.info(f"Processing video {video_id} for job {job_id}")
-        
-        # Get the video processor service
-        video_processor = get_video_processor()
-        
-        # Process the video
-        report_id = await video_processor.process_video(job_id, video_id, user_id)
-        
-        logger.info(f"Video processing completed for job {job_id}, report_id: {report_id}")
-        
-    except Exception as e:
-        logger.error(f"Video processing failed for job {job_id}: {str(e)}")
-        # In a real implementation, you would update the job status to failed in the database
+# Prometheus counters summed across the API and worker processes; scrapers send
+# METRICS_TOKEN as a bearer token, and the endpoint does not exist without one
+@app.get("/metrics")
+async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if not metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorization or not hmac.compare_digest(authorization.encode(), f"Bearer {metrics_token}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    from utils.metrics import render_prometheus
+    body = await asyncio.to_thread(render_prometheus)
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+# Video processing workers
+# Workers run in separate processes; set JOB_WORKERS_EMBEDDED=false and run
+# `python backend/worker.py` to scale analysis independently of the API tier.
+worker_pool = None
+
+async def _supervise_workers():
+    while True:
+        await asyncio.sleep(5)
+        worker_pool.supervise()
+
+# Development only: every API process (uvicorn/gunicorn worker) would start its own pool
+@app.on_event("startup")
+async def start_embedded_workers():
+    global worker_pool
+    if os.getenv("JOB_WORKERS_EMBEDDED", "false").lower() != "true":
+        return
+    from worker import WorkerPool
+    worker_pool = WorkerPool()
+    worker_pool.start()
+    asyncio.create_task(_supervise_workers())
+
+@app.on_event("shutdown")
+async def stop_embedded_workers():
+    if worker_pool is not None:
+        # Joins each process for up to 30 s; keep the event loop free meanwhile
+        await asyncio.to_thread(worker_pool.stop)
+    from utils.openai_client import close_openai_client
+    await close_openai_client()
+    from services.repository import close_repository
+    await close_repository()
+    from services.job_events import close_job_events
+    await close_job_events()
 
 @api_router.get("/learning/daily-tip")
 async def get_daily_tip(
@@ -0,0 +1,132 @@
+"""
+Analysis Cache
+Caches pipeline stage outputs (transcript, vocal metrics, frames, vision and
+NLP results) keyed by the video's content hash and the stage version, so
+re-processing an identical upload skips Whisper/GPT-4o calls entirely.
+
+Bump a stage's version in the pipeline whenever its output format or prompt
+changes to invalidate old entries.
+
+Backends:
+- local: JSON files under ANALYSIS_CACHE_DIR
+- supabase: the `analysis_cache` table (see supabase/migrations)
+"""
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_DIR = os.getenv(
+    "ANALYSIS_CACHE_DIR",
+    str(Path(__file__).parent.parent / "data" / "analysis_cache")
+)
+
+_MISS = object()
+
+
+class AnalysisCache:
+    """Interface shared by the cache backends; lookups return None on a miss"""
+
+    async def get(self, content_hash: str, stage: str, version: int, variant: str = "") -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, content_hash: str, stage: str, version: int, result: Any, variant: str = "") -> None:
+        raise NotImplementedError
+
+
+class LocalAnalysisCache(AnalysisCache):
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR):
+        self.root = Path(root)
+
+    def _path(self, content_hash: str, stage: str, version: int, variant: str) -> Path:
+        name = f"{stage}-v{version}{'-' + variant if variant else ''}.json"
+        return self.root / content_hash[:2] / content_hash / name
+
+    def _read(self, path: Path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return _MISS
+
+    def _write(self, path: Path, result: Any):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write atomically so concurrent workers never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+
+    async def get(self, content_hash: str, stage: str, version: int, variant: str = "") -> Optional[Any]:
+        result = await asyncio.to_thread(self._read, self._path(content_hash, stage, version, variant))
+        return None if result is _MISS else result
+
+    async def set(self, content_hash: str, stage: str, version: int, result: Any, variant: str = "") -> None:
+        await asyncio.to_thread(self._write, self._path(content_hash, stage, version, variant), result)
+
+
+class SupabaseAnalysisCache(AnalysisCache):
+    def __init__(self, supabase=None):
+        self._supabase = supabase
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    async def get(self, content_hash: str, stage: str, version: int, variant: str = "") -> Optional[Any]:
+        query = (
+            self.supabase.table("analysis_cache").select("result")
+            .eq("content_hash", content_hash).eq("stage", stage)
+            .eq("version", version).eq("variant", variant)
+        )
+        response = await asyncio.to_thread(query.execute)
+        return response.data[0]["result"] if response.data else None
+
+    async def set(self, content_hash: str, stage: str, version: int, result: Any, variant: str = "") -> None:
+        row = {
+            "content_hash": content_hash,
+            "stage": stage,
+            "version": version,
+            "variant": variant,
+            "result": result,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        query = self.supabase.table("analysis_cache").upsert(row)
+        await asyncio.to_thread(query.execute)
+
+
+_analysis_cache = _MISS
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    """Return the cache selected by ANALYSIS_CACHE_BACKEND (local, supabase, auto or none)"""
+    global _analysis_cache
+
+    if _analysis_cache is not _MISS:
+        return _analysis_cache
+
+    backend = os.getenv("ANALYSIS_CACHE_BACKEND", "auto").lower()
+    if backend == "auto":
+        has_supabase = os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY")
+        backend = "supabase" if has_supabase else "local"
+
+    if backend == "local":
+        _analysis_cache = LocalAnalysisCache()
+    elif backend == "supabase":
+        _analysis_cache = SupabaseAnalysisCache()
+    elif backend == "none":
+        _analysis_cache = None
+    else:
+        raise ValueError(f"Unknown ANALYSIS_CACHE_BACKEND: {backend}")
+
+    logger.info(f"Using {backend} analysis cache backend")
+    return _analysis_cache
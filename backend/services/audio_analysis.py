@@ -1,8 +1,51 @@
+import os
+import asyncio
 import librosa
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import re
 
+from services.audio_artifact import AudioArtifact
+
+# The extractor writes 16 kHz mono PCM; loading at the same rate avoids a resample
+ANALYSIS_SAMPLE_RATE = 16000
+# piptrack (spectral peak picking) or yin (lighter time-domain f0 estimator)
+PITCH_ESTIMATOR = os.getenv("PITCH_ESTIMATOR", "piptrack").lower()
+YIN_FMIN, YIN_FMAX = 65.0, 400.0
+# batch loads the whole WAV; stream processes fixed blocks in constant memory;
+# auto streams recordings longer than AUDIO_STREAM_MIN_SECONDS
+AUDIO_ANALYSIS_MODE = os.getenv("AUDIO_ANALYSIS_MODE", "auto").lower()
+AUDIO_STREAM_MIN_SECONDS = float(os.getenv("AUDIO_STREAM_MIN_SECONDS", "600"))
+# STFT frames per streamed block (256 x 512 samples ~ 8 s at 16 kHz)
+AUDIO_STREAM_BLOCK_FRAMES = 256
+FRAME_LENGTH, HOP_LENGTH = 2048, 512
+
+
+class RunningStats:
+    """Online mean/variance (Welford, merged per batch with Chan's update)"""
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def update(self, values: np.ndarray):
+        n = values.size
+        if not n:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+    
+    @property
+    def std(self) -> float:
+        # Population std, matching np.std
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
 class AudioAnalysisService:
     def __init__(self):
         self.filler_patterns = [
@@ -77,36 +120,90 @@ class AudioAnalysisService:
             "benchmark": "Ideal: <2 fillers per minute for executive presence"
         }
     
-    async def analyze_vocal_metrics(self, audio_path: str) -> Dict[str, Any]:
+    async def analyze_vocal_metrics(self, audio: Union[str, AudioArtifact]) -> Dict[str, Any]:
+        # librosa is CPU-bound; keep it off the event loop so other stages run concurrently
+        return await asyncio.to_thread(self._compute_vocal_metrics, audio)
+    
+    @staticmethod
+    def _pitch_frames(y: np.ndarray, sr: int, loudness_mean: float, center: bool = True,
+                      spectrogram: Optional[np.ndarray] = None):
+        """(per-frame pitch in Hz, voiced mask, hop length in samples)
+        
+        `loudness_mean` is the mean frame RMS of the whole recording; yin
+        treats frames below half of it as unvoiced. `spectrogram` is an
+        already computed |STFT| (FRAME_LENGTH/HOP_LENGTH) that piptrack uses
+        instead of transforming `y` again.
+        """
+        if PITCH_ESTIMATOR == "yin":
+            frame_length, hop_length = 1024, 256
+            f0 = librosa.yin(y, fmin=YIN_FMIN, fmax=YIN_FMAX, sr=sr, frame_length=frame_length,
+                             hop_length=hop_length, center=center)
+            # yin reports a pitch for every frame; drop quiet frames and estimates pinned to the search bounds
+            rms = librosa.feature.rms(y=y, frame_length=frame_length, hop_length=hop_length, center=center)[0][:len(f0)]
+            voiced = (rms > 0.5 * loudness_mean) & (f0 > YIN_FMIN) & (f0 < YIN_FMAX)
+            return f0, voiced, hop_length
+        
+        if spectrogram is not None:
+            pitches, magnitudes = librosa.piptrack(S=spectrogram, sr=sr, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH)
+        else:
+            pitches, magnitudes = librosa.piptrack(y=y, sr=sr, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH, center=center)
+        # Pitch at the strongest bin of every frame, selected for all frames at once
+        strongest = magnitudes.argmax(axis=0)[np.newaxis, :]
+        frame_pitches = np.take_along_axis(pitches, strongest, axis=0)[0]
+        return frame_pitches, frame_pitches > 0, HOP_LENGTH
+    
+    @staticmethod
+    def _vocal_result(pitch_mean: float, pitch_std: float, loudness_std: float) -> Dict[str, Any]:
+        return {
+            "pitch_mean_hz": round(float(pitch_mean), 2),
+            "pitch_variability": round(float(pitch_std), 2),
+            "loudness_stability": round(float(loudness_std), 4),
+            "benchmark": "Optimal pitch variability: 20-40 Hz for engaging delivery"
+        }
+    
+    @staticmethod
+    def _open_artifact(audio: Union[str, AudioArtifact]) -> Optional[AudioArtifact]:
+        if isinstance(audio, AudioArtifact):
+            return audio
+        try:
+            artifact = AudioArtifact(audio)
+        except ValueError as e:
+            print(f"Audio is not 16-bit PCM, decoding with librosa: {str(e)}")
+            return None
+        return artifact if artifact.sample_rate == ANALYSIS_SAMPLE_RATE else None
+    
+    def _compute_vocal_metrics(self, audio: Union[str, AudioArtifact]) -> Dict[str, Any]:
         try:
-            y, sr = librosa.load(audio_path, sr=None)
+            artifact = self._open_artifact(audio)
             
-            pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-            pitch_values = []
+            if artifact is None:
+                y, sr = librosa.load(audio, sr=ANALYSIS_SAMPLE_RATE)
+                rms = librosa.feature.rms(y=y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)[0]
+                frame_pitches, voiced, _ = self._pitch_frames(y, sr, rms.mean())
+            else:
+                stream = AUDIO_ANALYSIS_MODE == "stream" or (
+                    AUDIO_ANALYSIS_MODE == "auto" and artifact.duration > AUDIO_STREAM_MIN_SECONDS
+                )
+                if stream:
+                    return self._compute_vocal_metrics_streaming(artifact)
+                
+                spectrogram = artifact.stft_magnitude(FRAME_LENGTH, HOP_LENGTH) if PITCH_ESTIMATOR != "yin" else None
+                rms = artifact.rms(FRAME_LENGTH, HOP_LENGTH)
+                frame_pitches, voiced, _ = self._pitch_frames(artifact.samples, artifact.sample_rate, rms.mean(),
+                                                              spectrogram=spectrogram)
             
-            for t in range(pitches.shape[1]):
-                index = magnitudes[:, t].argmax()
-                pitch = pitches[index, t]
-                if pitch > 0:
-                    pitch_values.append(pitch)
+            pitch_values = frame_pitches[voiced]
             
-            if pitch_values:
+            if pitch_values.size:
                 pitch_mean = np.mean(pitch_values)
                 pitch_std = np.std(pitch_values)
             else:
                 pitch_mean = 0
                 pitch_std = 0
             
-            rms = librosa.feature.rms(y=y)[0]
-            loudness_mean = np.mean(rms)
             loudness_std = np.std(rms)
             
-            return {
-                "pitch_mean_hz": round(float(pitch_mean), 2),
-                "pitch_variability": round(float(pitch_std), 2),
-                "loudness_stability": round(float(loudness_std), 4),
-                "benchmark": "Optimal pitch variability: 20-40 Hz for engaging delivery"
-            }
+            return self._vocal_result(pitch_mean, pitch_std, loudness_std)
         except Exception as e:
             return {
                 "pitch_mean_hz": 0,
@@ -116,6 +213,46 @@ class AudioAnalysisService:
                 "benchmark": "Unavailable"
             }
     
+    @staticmethod
+    def _stream_blocks(artifact: AudioArtifact):
+        """(block, whether it is the last) for each streamed block"""
+        blocks = artifact.blocks(AUDIO_STREAM_BLOCK_FRAMES, FRAME_LENGTH, HOP_LENGTH)
+        block = next(blocks, None)
+        while block is not None:
+            next_block = next(blocks, None)
+            yield block, next_block is None
+            block = next_block
+    
+    def _compute_vocal_metrics_streaming(self, artifact: AudioArtifact) -> Dict[str, Any]:
+        """Block-wise vocal metrics with memory bounded by the block size.
+        
+        Blocks are read straight from the memory-mapped PCM and overlap by
+        FRAME_LENGTH - HOP_LENGTH samples so every analysis frame is seen
+        whole; frames are not centred (edge padding is the only difference
+        from the batch path), and frames of an estimator with a finer hop are
+        kept only up to where the next block starts so none is counted twice.
+        
+        Loudness is measured in a first pass so the yin voicing threshold is
+        relative to the whole recording, as in the batch path, rather than to
+        each block.
+        """
+        sr = artifact.sample_rate
+        
+        loudness_stats = RunningStats()
+        for block, last in self._stream_blocks(artifact):
+            rms = librosa.feature.rms(y=block, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, center=False)[0]
+            loudness_stats.update(rms if last else rms[:AUDIO_STREAM_BLOCK_FRAMES])
+        
+        pitch_stats = RunningStats()
+        for block, last in self._stream_blocks(artifact):
+            frame_pitches, voiced, hop_length = self._pitch_frames(block, sr, loudness_stats.mean, center=False)
+            if not last:
+                keep = AUDIO_STREAM_BLOCK_FRAMES * HOP_LENGTH // hop_length
+                frame_pitches, voiced = frame_pitches[:keep], voiced[:keep]
+            pitch_stats.update(frame_pitches[voiced])
+        
+        return self._vocal_result(pitch_stats.mean, pitch_stats.std, loudness_stats.std)
+    
     def analyze_sentence_clarity(self, transcript: str) -> List[Dict[str, Any]]:
         sentences = re.split(r'[.!?]+', transcript)
         sentences = [s.strip() for s in sentences if s.strip()]
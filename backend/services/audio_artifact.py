@@ -0,0 +1,128 @@
+"""
+Audio Artifact
+The 16 kHz mono PCM that extract_audio produces, opened once per job and
+shared by every consumer. Samples are exposed as a zero-copy int16
+numpy.memmap over the WAV's data chunk; the float signal, RMS frames and STFT
+magnitudes are derived lazily on first use and then reused, so transcription
+chunking, vocal metrics and fallbacks never decode the file again.
+"""
+import os
+import struct
+import threading
+import numpy as np
+from typing import Dict, Iterator, Tuple
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _read_wav_layout(path: str) -> Tuple[int, int, int, int]:
+    """(data offset, sample count, sample rate, channels) of a 16-bit PCM WAV"""
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} is not a WAV file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} has no fmt chunk")
+                audio_format, channels, sample_rate, _, _, bits = fmt
+                if audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) or bits != 16:
+                    raise ValueError(f"{path} is not 16-bit PCM (format {audio_format}, {bits} bits)")
+                offset = f.tell()
+                # Writers that could not seek back leave the size unset; trust the file length then
+                data_size = min(chunk_size, file_size - offset)
+                return offset, data_size // (2 * channels), sample_rate, channels
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+class AudioArtifact:
+    """Shared, lazily analysed view of a job's extracted audio"""
+
+    def __init__(self, path: str):
+        self.path = path
+        offset, frames, self.sample_rate, self.channels = _read_wav_layout(path)
+        self._offset = offset
+        self._frames = frames
+        self._lock = threading.Lock()
+        self._pcm = None
+        self._samples = None
+        self._features: Dict[tuple, np.ndarray] = {}
+
+    @property
+    def duration(self) -> float:
+        return self._frames / self.sample_rate if self.sample_rate else 0.0
+
+    @property
+    def pcm(self) -> np.ndarray:
+        """int16 samples mapped straight from the file (mono, or interleaved frames x channels)"""
+        if self._pcm is None:
+            shape = (self._frames,) if self.channels == 1 else (self._frames, self.channels)
+            self._pcm = np.memmap(self.path, dtype="<i2", mode="r", offset=self._offset, shape=shape)
+        return self._pcm
+
+    def _to_float(self, pcm: np.ndarray) -> np.ndarray:
+        if pcm.ndim > 1:
+            pcm = pcm.mean(axis=1)
+        return (pcm / 32768.0).astype(np.float32)
+
+    @property
+    def samples(self) -> np.ndarray:
+        """Full float32 mono signal in [-1, 1), converted once and reused"""
+        with self._lock:
+            if self._samples is None:
+                self._samples = self._to_float(self.pcm)
+            return self._samples
+
+    def segment(self, start: int, stop: int) -> np.ndarray:
+        """Float32 copy of samples [start, stop) without converting the whole file"""
+        return self._to_float(self.pcm[start:stop])
+
+    def blocks(self, block_frames: int, frame_length: int, hop_length: int) -> Iterator[np.ndarray]:
+        """Float32 blocks of `block_frames` analysis frames, overlapping by
+        frame_length - hop_length samples (the layout librosa.stream uses)"""
+        step = block_frames * hop_length
+        length = frame_length + (block_frames - 1) * hop_length
+        for start in range(0, max(self._frames - frame_length, 0) + 1, step):
+            yield self.segment(start, min(start + length, self._frames))
+
+    def _cached(self, key: tuple, compute):
+        with self._lock:
+            if key not in self._features:
+                self._features[key] = compute()
+            return self._features[key]
+
+    def rms(self, frame_length: int = 2048, hop_length: int = 512) -> np.ndarray:
+        import librosa
+        samples = self.samples
+        return self._cached(
+            ("rms", frame_length, hop_length),
+            lambda: librosa.feature.rms(y=samples, frame_length=frame_length, hop_length=hop_length)[0]
+        )
+
+    def stft_magnitude(self, n_fft: int = 2048, hop_length: int = 512) -> np.ndarray:
+        import librosa
+        samples = self.samples
+        return self._cached(
+            ("stft", n_fft, hop_length),
+            lambda: np.abs(librosa.stft(samples, n_fft=n_fft, hop_length=hop_length))
+        )
+
+    def close(self):
+        """Drop the mapping and every derived array"""
+        with self._lock:
+            self._pcm = None
+            self._samples = None
+            self._features.clear()
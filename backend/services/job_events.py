@@ -0,0 +1,239 @@
+"""
+Job Events
+Pushes job progress (status, progress, current_step, report_id) to clients
+streaming GET /api/jobs/{job_id}/events, so they stop polling the status
+endpoint and its per-request session and job lookups.
+
+Jobs publish each update_job_status transition to the broker. In the API
+process a JobEventHub fans events out to every client watching the job.
+Workers may run in processes the broker cannot reach (the local broker), and
+retry or dead-letter transitions are written by the queue itself, so the hub
+also reads all watched jobs from the queue in one batched query every
+JOB_EVENTS_POLL_SECONDS and forwards anything that changed. That is one read
+per API process per interval, however many clients are watching.
+
+Brokers (JOB_EVENTS_BACKEND):
+- local: in-process fan-out; transitions from other processes arrive via
+  the poller
+- redis: Redis pub/sub shared by the workers and every API process
+  (REDIS_URL, requires `redis`); raise JOB_EVENTS_POLL_SECONDS to make the
+  poller a slow safety net
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+from services.job_queue import JOB_PROGRESS_COLUMNS, QUEUE_DONE, QUEUE_DEAD, get_job_queue
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "2"))
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", "15"))
+# Pending events per client; a slow client loses the oldest, later ones supersede them
+JOB_EVENTS_QUEUE_SIZE = 32
+REDIS_CHANNEL_PREFIX = "job_events:"
+
+_MISS = object()
+
+
+def job_event(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """The progress fields of a job row or status update"""
+    return {key: fields[key] for key in JOB_PROGRESS_COLUMNS if key in fields and key != "id"}
+
+
+def is_terminal(event: Dict[str, Any]) -> bool:
+    # A failed attempt may still be retried; only the queue marks a job finished
+    return event.get("status") == "completed" or event.get("queue_state") in (QUEUE_DONE, QUEUE_DEAD)
+
+
+class JobEventBroker:
+    """Transport for job events between the processes running jobs and those streaming them"""
+
+    def __init__(self):
+        self._handler: Optional[Callable[[str, Dict[str, Any]], None]] = None
+
+    def set_handler(self, handler: Callable[[str, Dict[str, Any]], None]):
+        """Receive every event published to this broker (by any process it reaches)"""
+        self._handler = handler
+
+    async def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalJobEventBroker(JobEventBroker):
+    async def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        if self._handler:
+            self._handler(job_id, event)
+
+
+class RedisJobEventBroker(JobEventBroker):
+    def __init__(self, url: str):
+        super().__init__()
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        await self.redis.publish(REDIS_CHANNEL_PREFIX + job_id, json.dumps(event))
+
+    async def start(self) -> None:
+        # Processes that only publish (workers) never subscribe
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(REDIS_CHANNEL_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage" or not self._handler:
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._handler(channel[len(REDIS_CHANNEL_PREFIX):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job event subscription lost, reconnecting: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self.redis.close()
+
+
+class JobEventHub:
+    """Fans job events out to the clients watching each job"""
+
+    def __init__(self, broker: JobEventBroker, poll_seconds: float = JOB_EVENTS_POLL_SECONDS,
+                 keepalive_seconds: float = JOB_EVENTS_KEEPALIVE_SECONDS):
+        self.broker = broker
+        self.poll_seconds = poll_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # Last state sent for each watched job, so the poller only forwards changes
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._poller: Optional[asyncio.Task] = None
+        broker.set_handler(self._receive)
+
+    async def _start(self):
+        if self._poller is None:
+            self._poller = asyncio.create_task(self._poll())
+            await self.broker.start()
+
+    def _receive(self, job_id: str, event: Dict[str, Any]):
+        subscribers = self._subscribers.get(job_id)
+        if not subscribers:
+            return
+        previous = self._latest.get(job_id, {})
+        state = {**previous, **job_event(event)}
+        if {k: v for k, v in state.items() if k != "updated_at"} == \
+                {k: v for k, v in previous.items() if k != "updated_at"}:
+            return
+        self._latest[job_id] = state
+        for queue in subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            job_ids = list(self._subscribers)
+            if not job_ids:
+                continue
+            try:
+                jobs = await get_job_queue().get_jobs(job_ids)
+            except Exception as e:
+                logger.warning(f"Failed to poll watched jobs: {str(e)}")
+                continue
+            for job in jobs:
+                self._receive(job["id"], job)
+
+    async def stream(self, job: Dict[str, Any]) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """The job's current state, then each change until it finishes; None when a keepalive is due"""
+        job_id = job["id"]
+        queue: asyncio.Queue = asyncio.Queue(maxsize=JOB_EVENTS_QUEUE_SIZE)
+        await self._start()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        # Full rows leave unset columns out (e.g. report_id before the report exists)
+        state = self._latest.setdefault(job_id, job_event({**dict.fromkeys(JOB_PROGRESS_COLUMNS), **job}))
+        try:
+            yield state
+            while not is_terminal(state):
+                try:
+                    state = await asyncio.wait_for(queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield state
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+                    self._latest.pop(job_id, None)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        await self.broker.close()
+
+
+_broker = _MISS
+_hub: Optional[JobEventHub] = None
+
+
+def get_job_event_broker() -> JobEventBroker:
+    """Return the broker selected by JOB_EVENTS_BACKEND (local or redis)"""
+    global _broker
+
+    if _broker is not _MISS:
+        return _broker
+
+    backend = os.getenv("JOB_EVENTS_BACKEND", "local").lower()
+    if backend == "local":
+        _broker = LocalJobEventBroker()
+    elif backend == "redis":
+        url = os.getenv("REDIS_URL")
+        if not url:
+            raise ValueError("REDIS_URL must be set for the redis job events backend")
+        _broker = RedisJobEventBroker(url)
+    else:
+        raise ValueError(f"Unknown JOB_EVENTS_BACKEND: {backend}")
+
+    logger.info(f"Using {backend} job events backend")
+    return _broker
+
+
+def get_job_event_hub() -> JobEventHub:
+    global _hub
+    if _hub is None:
+        _hub = JobEventHub(get_job_event_broker())
+    return _hub
+
+
+async def close_job_events():
+    global _broker, _hub
+    if _hub is not None:
+        await _hub.close()
+    elif _broker is not _MISS:
+        await _broker.close()
+    _broker = _MISS
+    _hub = None
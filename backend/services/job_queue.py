@@ -0,0 +1,465 @@
+"""
+Durable Job Queue
+Persists video processing jobs so they survive API and worker restarts.
+Jobs are claimed by separate worker processes under a time-limited lease that
+workers extend with heartbeats; leases that expire (crashed or stuck workers)
+are recovered and the job is retried until max attempts is reached.
+
+Backends:
+- supabase: the `jobs` table (see supabase/migrations)
+- sqlite: a local file-backed stand-in used when Supabase is not configured
+"""
+import os
+import json
+import sqlite3
+import asyncio
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Queue states (separate from the user-facing pipeline `status`)
+QUEUE_QUEUED = "queued"
+QUEUE_LEASED = "leased"
+QUEUE_DONE = "done"
+QUEUE_DEAD = "dead"
+
+# What a client watching a job needs (see services/job_events.py)
+JOB_PROGRESS_COLUMNS = (
+    "id", "status", "progress", "current_step", "report_id", "last_error", "queue_state", "updated_at"
+)
+
+DEFAULT_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+DEFAULT_SQLITE_PATH = os.getenv(
+    "JOB_QUEUE_SQLITE_PATH",
+    str(Path(__file__).parent.parent / "data" / "job_queue.sqlite3")
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobQueue:
+    """Interface shared by the queue backends"""
+
+    def __init__(self, lease_seconds: int = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def _lease_expiry(self) -> str:
+        return (_now() + timedelta(seconds=self.lease_seconds)).isoformat()
+
+    async def enqueue(self, job_id: str, user_id: str, video_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest runnable job (queued, or leased with an expired lease)"""
+        raise NotImplementedError
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; returns False if the worker no longer owns the job"""
+        raise NotImplementedError
+
+    async def complete(self, job_id: str, worker_id: str) -> None:
+        raise NotImplementedError
+
+    async def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Release a failed job; returns True if it was re-queued for another attempt"""
+        raise NotImplementedError
+
+    async def update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    async def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_jobs(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        """Progress fields (JOB_PROGRESS_COLUMNS) of several jobs in one read"""
+        raise NotImplementedError
+
+    def _release_fields(self, attempts: int, error: str, max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        """Fields written when a leased job fails or its lease is recovered"""
+        now = _now().isoformat()
+        max_attempts = max_attempts or self.max_attempts
+        if attempts < max_attempts:
+            return {
+                "queue_state": QUEUE_QUEUED,
+                "status": "pending",
+                "current_step": f"Retrying (attempt {attempts + 1} of {max_attempts})",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "last_error": error,
+                "updated_at": now
+            }
+        return {
+            "queue_state": QUEUE_DEAD,
+            "status": "failed",
+            "current_step": f"Processing failed: {error}",
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": error,
+            "updated_at": now
+        }
+
+
+class SupabaseJobQueue(JobQueue):
+    """Queue backed by the Supabase `jobs` table.
+
+    PostgREST has no row locking, so claims use compare-and-set updates on
+    (queue_state, attempts): only one worker's UPDATE matches the row.
+    """
+
+    def __init__(self, supabase=None, **kwargs):
+        super().__init__(**kwargs)
+        self._supabase = supabase
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    def _execute(self, query):
+        return query.execute()
+
+    async def _run(self, query):
+        return await asyncio.to_thread(self._execute, query)
+
+    async def enqueue(self, job_id: str, user_id: str, video_id: str) -> Dict[str, Any]:
+        now = _now().isoformat()
+        job = {
+            "id": job_id,
+            "user_id": user_id,
+            "video_id": video_id,
+            "status": "pending",
+            "progress": 0,
+            "current_step": "Queued",
+            "queue_state": QUEUE_QUEUED,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "created_at": now,
+            "updated_at": now
+        }
+        await self._run(self.supabase.table("jobs").insert(job))
+        return job
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        now = _now()
+        response = await self._run(
+            self.supabase.table("jobs")
+            .select("id,user_id,video_id,queue_state,attempts,max_attempts,lease_expires_at")
+            .or_(f"queue_state.eq.{QUEUE_QUEUED},and(queue_state.eq.{QUEUE_LEASED},lease_expires_at.lt.{now.isoformat()})")
+            .order("created_at")
+            .limit(10)
+        )
+
+        for candidate in response.data or []:
+            attempts = candidate.get("attempts") or 0
+            max_attempts = candidate.get("max_attempts") or self.max_attempts
+
+            if candidate["queue_state"] == QUEUE_LEASED and attempts >= max_attempts:
+                # Lease expired on the final attempt: give up on the job
+                logger.warning(f"Job {candidate['id']} lease expired after {attempts} attempts, marking dead")
+                await self._run(
+                    self.supabase.table("jobs")
+                    .update(self._release_fields(attempts, "Worker lease expired", max_attempts))
+                    .eq("id", candidate["id"])
+                    .eq("queue_state", QUEUE_LEASED)
+                    .eq("attempts", attempts)
+                )
+                continue
+
+            claimed = await self._run(
+                self.supabase.table("jobs")
+                .update({
+                    "queue_state": QUEUE_LEASED,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": self._lease_expiry(),
+                    "heartbeat_at": now.isoformat(),
+                    "attempts": attempts + 1,
+                    "updated_at": now.isoformat()
+                })
+                .eq("id", candidate["id"])
+                .eq("queue_state", candidate["queue_state"])
+                .eq("attempts", attempts)
+            )
+            if claimed.data:
+                return claimed.data[0]
+
+        return None
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        response = await self._run(
+            self.supabase.table("jobs")
+            .update({"lease_expires_at": self._lease_expiry(), "heartbeat_at": _now().isoformat()})
+            .eq("id", job_id)
+            .eq("lease_owner", worker_id)
+            .eq("queue_state", QUEUE_LEASED)
+        )
+        return bool(response.data)
+
+    async def complete(self, job_id: str, worker_id: str) -> None:
+        await self._run(
+            self.supabase.table("jobs")
+            .update({"queue_state": QUEUE_DONE, "lease_owner": None, "lease_expires_at": None})
+            .eq("id", job_id)
+            .eq("lease_owner", worker_id)
+        )
+
+    async def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        response = await self._run(
+            self.supabase.table("jobs").select("attempts,max_attempts").eq("id", job_id).eq("lease_owner", worker_id)
+        )
+        if not response.data:
+            return False
+
+        row = response.data[0]
+        release = self._release_fields(row.get("attempts") or 0, error, row.get("max_attempts"))
+
+        await self._run(
+            self.supabase.table("jobs").update(release).eq("id", job_id).eq("lease_owner", worker_id)
+        )
+        return release["queue_state"] == QUEUE_QUEUED
+
+    async def update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        response = await self._run(self.supabase.table("jobs").update(fields).eq("id", job_id))
+        return bool(response.data)
+
+    async def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        query = self.supabase.table("jobs").select("*").eq("id", job_id)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        response = await self._run(query)
+        return response.data[0] if response.data else None
+
+    async def get_jobs(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        response = await self._run(
+            self.supabase.table("jobs").select(",".join(JOB_PROGRESS_COLUMNS)).in_("id", job_ids)
+        )
+        return response.data or []
+
+
+class SQLiteJobQueue(JobQueue):
+    """Local file-backed stand-in for the `jobs` table.
+
+    Claims run inside BEGIN IMMEDIATE transactions so concurrent worker
+    processes sharing the file never lease the same job twice.
+    """
+
+    COLUMNS = (
+        "id", "user_id", "video_id", "status", "progress", "current_step",
+        "queue_state", "attempts", "max_attempts", "lease_owner", "lease_expires_at",
+        "heartbeat_at", "last_error", "created_at", "updated_at"
+    )
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    video_id TEXT,
+                    status TEXT DEFAULT 'pending',
+                    progress REAL DEFAULT 0,
+                    current_step TEXT,
+                    queue_state TEXT DEFAULT 'queued',
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER,
+                    lease_owner TEXT,
+                    lease_expires_at TEXT,
+                    heartbeat_at TEXT,
+                    last_error TEXT,
+                    extra TEXT DEFAULT '{}',
+                    created_at TEXT,
+                    updated_at TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue_state ON jobs(queue_state, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = {key: row[key] for key in self.COLUMNS}
+        job.update(json.loads(row["extra"] or "{}"))
+        return job
+
+    def _write(self, conn: sqlite3.Connection, job_id: str, fields: Dict[str, Any], where: str = "", params: tuple = ()) -> int:
+        columns = {k: v for k, v in fields.items() if k in self.COLUMNS and k != "id"}
+        extra = {k: v for k, v in fields.items() if k not in self.COLUMNS}
+
+        assignments = [f"{key} = ?" for key in columns]
+        values = list(columns.values())
+        if extra:
+            assignments.append("extra = json_patch(COALESCE(extra, '{}'), ?)")
+            values.append(json.dumps(extra))
+        if not assignments:
+            return 0
+
+        cursor = conn.execute(
+            f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ? {where}",
+            (*values, job_id, *params)
+        )
+        return cursor.rowcount
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                result = func(conn, *args)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._transaction, func, *args)
+
+    async def enqueue(self, job_id: str, user_id: str, video_id: str) -> Dict[str, Any]:
+        now = _now().isoformat()
+        job = {
+            "id": job_id,
+            "user_id": user_id,
+            "video_id": video_id,
+            "status": "pending",
+            "progress": 0,
+            "current_step": "Queued",
+            "queue_state": QUEUE_QUEUED,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        def insert(conn):
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(job)}) VALUES ({', '.join('?' for _ in job)})",
+                tuple(job.values())
+            )
+
+        await self._run(insert)
+        return job
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        def claim_next(conn):
+            now = _now()
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE queue_state = ? OR (queue_state = ? AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 10",
+                (QUEUE_QUEUED, QUEUE_LEASED, now.isoformat())
+            ).fetchall()
+
+            for row in rows:
+                attempts = row["attempts"] or 0
+                max_attempts = row["max_attempts"] or self.max_attempts
+                if row["queue_state"] == QUEUE_LEASED and attempts >= max_attempts:
+                    logger.warning(f"Job {row['id']} lease expired after {attempts} attempts, marking dead")
+                    self._write(conn, row["id"], self._release_fields(attempts, "Worker lease expired", max_attempts))
+                    continue
+
+                self._write(conn, row["id"], {
+                    "queue_state": QUEUE_LEASED,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": self._lease_expiry(),
+                    "heartbeat_at": now.isoformat(),
+                    "attempts": attempts + 1,
+                    "updated_at": now.isoformat()
+                })
+                claimed = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                return self._row_to_job(claimed)
+
+            return None
+
+        return await self._run(claim_next)
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        fields = {"lease_expires_at": self._lease_expiry(), "heartbeat_at": _now().isoformat()}
+        updated = await self._run(
+            self._write, job_id, fields, "AND lease_owner = ? AND queue_state = ?", (worker_id, QUEUE_LEASED)
+        )
+        return updated > 0
+
+    async def complete(self, job_id: str, worker_id: str) -> None:
+        fields = {"queue_state": QUEUE_DONE, "lease_owner": None, "lease_expires_at": None}
+        await self._run(self._write, job_id, fields, "AND lease_owner = ?", (worker_id,))
+
+    async def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        def release(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            fields = self._release_fields(row["attempts"] or 0, error, row["max_attempts"])
+            self._write(conn, job_id, fields)
+            return fields["queue_state"] == QUEUE_QUEUED
+
+        return await self._run(release)
+
+    async def update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        return await self._run(self._write, job_id, fields) > 0
+
+    async def get_job(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        def fetch(conn):
+            if user_id:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ? AND user_id = ?", (job_id, user_id)).fetchone()
+            else:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_job(row) if row else None
+
+        return await self._run(fetch)
+
+    async def get_jobs(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        def fetch(conn):
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE id IN ({', '.join('?' for _ in job_ids)})", tuple(job_ids)
+            ).fetchall()
+            return [
+                {key: job.get(key) for key in JOB_PROGRESS_COLUMNS}
+                for job in map(self._row_to_job, rows)
+            ]
+
+        return await self._run(fetch)
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue selected by JOB_QUEUE_BACKEND (supabase, sqlite or auto)"""
+    global _job_queue
+
+    if _job_queue is not None:
+        return _job_queue
+
+    backend = os.getenv("JOB_QUEUE_BACKEND", "auto").lower()
+    if backend == "auto":
+        has_supabase = os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY")
+        backend = "supabase" if has_supabase else "sqlite"
+
+    if backend == "supabase":
+        _job_queue = SupabaseJobQueue()
+    elif backend == "sqlite":
+        _job_queue = SQLiteJobQueue()
+    else:
+        raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+
+    logger.info(f"Using {backend} job queue backend")
+    return _job_queue
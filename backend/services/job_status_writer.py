@@ -0,0 +1,124 @@
+"""
+Job Status Writer
+Write-behind for pipeline progress. Progress updates only record the job's
+latest state in memory; a background flusher writes each changed job once
+per JOB_STATUS_FLUSH_SECONDS, so a job costs a few UPDATEs instead of one
+per pipeline step and the pipeline never waits on them. Terminal states
+(completed, failed) are written immediately, together with anything still
+pending, and retried; if they still cannot be stored the error propagates
+so the job fails instead of being reported finished.
+
+Writes for a job are serialized, so a slow progress flush can never land
+after (and overwrite) the job's final state.
+"""
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from services.job_queue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_FLUSH_SECONDS = float(os.getenv("JOB_STATUS_FLUSH_SECONDS", "5"))
+TERMINAL_WRITE_ATTEMPTS = 4
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobStatusWriter:
+    def __init__(self, queue=None, flush_seconds: float = JOB_STATUS_FLUSH_SECONDS):
+        self._queue = queue
+        self.flush_seconds = flush_seconds
+        # Fields not yet written, per job (later updates overwrite earlier ones)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = get_job_queue()
+        return self._queue
+
+    def _lock(self, job_id: str) -> asyncio.Lock:
+        if job_id not in self._locks:
+            self._locks[job_id] = asyncio.Lock()
+        return self._locks[job_id]
+
+    def update(self, job_id: str, fields: Dict[str, Any]):
+        """Record progress; it is written with the job's next flush"""
+        self._pending.setdefault(job_id, {}).update(fields)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def write(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        """Write pending progress and `fields` now, retrying failures (the last one is raised); returns False if the job does not exist"""
+        lock = self._lock(job_id)
+        async with lock:
+            merged = {**self._pending.pop(job_id, {}), **fields}
+            for attempt in range(TERMINAL_WRITE_ATTEMPTS):
+                try:
+                    updated = await self.queue.update_job(job_id, merged)
+                    break
+                except Exception as e:
+                    if attempt == TERMINAL_WRITE_ATTEMPTS - 1:
+                        raise
+                    logger.warning(f"Failed to write status of job {job_id} (attempt {attempt + 1}): {str(e)}")
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        # The job is finished with; don't keep a lock per job ever processed
+        if not lock.locked() and job_id not in self._pending:
+            self._locks.pop(job_id, None)
+        return updated
+
+    async def discard(self, job_id: str):
+        """Drop unwritten progress (waiting out a flush in flight) before someone else writes the job's state"""
+        lock = self._lock(job_id)
+        async with lock:
+            self._pending.pop(job_id, None)
+        if not lock.locked():
+            self._locks.pop(job_id, None)
+
+    async def _flush_job(self, job_id: str):
+        async with self._lock(job_id):
+            fields = self._pending.pop(job_id, None)
+            if not fields:
+                return
+            try:
+                if not await self.queue.update_job(job_id, fields):
+                    logger.warning(f"Job {job_id} not found while flushing its status")
+            except Exception as e:
+                # Keep the fields for the next flush unless newer ones replaced them
+                self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+                logger.warning(f"Failed to flush status of job {job_id}: {str(e)}")
+
+    async def flush(self):
+        """Write every job's pending progress"""
+        await asyncio.gather(*(self._flush_job(job_id) for job_id in list(self._pending)))
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+
+_job_status_writer: Optional[JobStatusWriter] = None
+
+
+def get_job_status_writer() -> JobStatusWriter:
+    global _job_status_writer
+    if _job_status_writer is None:
+        _job_status_writer = JobStatusWriter()
+    return _job_status_writer
+
+
+async def close_job_status_writer():
+    global _job_status_writer
+    if _job_status_writer is not None:
+        await _job_status_writer.close()
+    _job_status_writer = None
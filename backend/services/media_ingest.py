@@ -0,0 +1,129 @@
+"""
+Media Ingest Service
+Decodes an uploaded video exactly once: a single ffmpeg process writes the
+16 kHz mono PCM for transcription/vocal analysis and the fps-sampled,
+scaled-down JPEG frames for vision analysis. Which outputs to ask for comes
+from the job's media probe (MediaProbeService), so a missing stream never
+costs a failed first pass.
+"""
+import os
+import glob
+import base64
+import shutil
+import asyncio
+import tempfile
+from typing import Dict, Any, Optional
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "/usr/bin/ffmpeg")
+INGEST_TIMEOUT_SECONDS = int(os.getenv("INGEST_TIMEOUT_SECONDS", "600"))
+
+
+class MediaIngestService:
+    def __init__(self, fps: int = 2, max_frames: int = 60, frame_width: int = 640, with_frames: bool = True):
+        self.fps = fps
+        self.max_frames = max_frames
+        self.frame_width = frame_width
+        # Without frames only the audio stream is decoded; vision then seeks to its own keyframes
+        self.with_frames = with_frames
+
+    def _build_command(self, video_path: str, audio_path: str, frame_pattern: str, with_audio: bool = True,
+                       with_frames: bool = True) -> list:
+        command = [FFMPEG_PATH, '-hide_banner', '-nostdin', '-i', video_path]
+        if with_audio:
+            command.extend([
+                '-map', '0:a:0',
+                '-vn',
+                '-acodec', 'pcm_s16le',
+                '-ar', '16000',
+                '-ac', '1',
+                '-y', audio_path
+            ])
+        if with_frames:
+            command.extend([
+                '-map', '0:v:0',
+                '-an',
+                '-vf', f'fps={self.fps},scale=w=min({self.frame_width}\\,iw):h=-2',
+                '-frames:v', str(self.max_frames),
+                '-q:v', '5',
+                '-y', frame_pattern
+            ])
+        return command
+
+    async def _run(self, command: list):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=INGEST_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"ffmpeg ingest timed out after {INGEST_TIMEOUT_SECONDS}s")
+        return process.returncode, stderr.decode(errors="replace")
+
+    @staticmethod
+    def _load_frames(workdir: str) -> list:
+        # ffmpeg already wrote JPEGs; base64 them as-is without re-encoding
+        frames = []
+        for frame_file in sorted(glob.glob(os.path.join(workdir, "frame_*.jpg"))):
+            with open(frame_file, "rb") as f:
+                frames.append(base64.b64encode(f.read()).decode('utf-8'))
+        return frames
+
+    async def ingest(self, video_path: str, has_audio: Optional[bool] = None,
+                     has_video: Optional[bool] = None) -> Dict[str, Any]:
+        """Run the single-pass demux.
+
+        `has_audio` and `has_video` come from the job's probe; a stream it
+        reports missing is left out of the command. None (no probe) means
+        try both and, if that fails, retry for the frames alone.
+
+        Returns {"workdir", "audio_path", "frames", "frame_timestamps"};
+        frames are base64 JPEGs in the same format VisionAnalysisService.extract_frames
+        produces. The caller removes `workdir` when the job is done.
+        """
+        with_audio = has_audio is not False
+        with_frames = self.with_frames and has_video is not False
+        if not with_audio and not with_frames:
+            # Nothing to decode; extract_audio reports the missing audio track
+            return {"workdir": None, "audio_path": None, "frames": [], "frame_timestamps": []}
+
+        workdir = tempfile.mkdtemp(prefix="ep_ingest_")
+        audio_path = os.path.join(workdir, "audio.wav")
+        frame_pattern = os.path.join(workdir, "frame_%05d.jpg")
+
+        try:
+            returncode, stderr_text = await self._run(
+                self._build_command(video_path, audio_path, frame_pattern, with_audio, with_frames)
+            )
+
+            if returncode != 0 and has_audio is None and with_frames:
+                # Unprobed input, possibly without an audio track: still extract the frames
+                returncode, stderr_text = await self._run(
+                    self._build_command(video_path, audio_path, frame_pattern, with_audio=False, with_frames=True)
+                )
+
+            if returncode != 0:
+                raise RuntimeError(f"ffmpeg ingest failed: {stderr_text[-2000:]}")
+
+            frames = await asyncio.to_thread(self._load_frames, workdir)
+
+            audio_written = os.path.exists(audio_path) and os.path.getsize(audio_path) > 1000
+            print(f"Ingested {video_path}: {len(frames)} frames, audio={audio_written}")
+
+            return {
+                "workdir": workdir,
+                "audio_path": audio_path if audio_written else None,
+                "frames": frames,
+                "frame_timestamps": [round(index / self.fps, 3) for index in range(len(frames))]
+            }
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def cleanup(result: Optional[Dict[str, Any]]):
+        if result and result.get("workdir"):
+            shutil.rmtree(result["workdir"], ignore_errors=True)
@@ -0,0 +1,122 @@
+"""
+Media Probe Service
+Runs ffprobe once per video, asynchronously, and parses its JSON output into
+a MediaProbe record. Results are kept in a per-process cache keyed by the
+video's content hash (or id) and stored on the `videos` row, so later stages,
+retries and re-uploads of the same file never probe again.
+"""
+import os
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from models.video import MediaProbe
+
+logger = logging.getLogger(__name__)
+
+FFPROBE_PATH = os.getenv("FFPROBE_PATH", "/usr/bin/ffprobe")
+PROBE_TIMEOUT_SECONDS = float(os.getenv("PROBE_TIMEOUT_SECONDS", "15"))
+PROBE_CACHE_SIZE = 256
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[float]:
+    """ffprobe frame rates are fractions such as "30000/1001" ("0/0" when unknown)"""
+    if not rate:
+        return None
+    numerator, _, denominator = rate.partition("/")
+    try:
+        value = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value > 0 else None
+
+
+def _parse_number(value, cast=float):
+    try:
+        return cast(value) if value not in (None, "N/A") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffprobe_output(output: dict) -> MediaProbe:
+    fmt = output.get("format", {})
+    streams = output.get("streams", [])
+    # Cover art and thumbnails are reported as video streams too
+    video = next((s for s in streams if s.get("codec_type") == "video"
+                  and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    duration = _parse_number(fmt.get("duration"))
+    if duration is None:
+        stream_durations = [_parse_number(s.get("duration")) for s in (video, audio) if s]
+        duration = max([d for d in stream_durations if d], default=None)
+
+    return MediaProbe(
+        format_name=fmt.get("format_name") or "unknown",
+        duration=duration,
+        bit_rate=_parse_number(fmt.get("bit_rate"), int),
+        video_codec=video.get("codec_name") if video else None,
+        audio_codec=audio.get("codec_name") if audio else None,
+        width=video.get("width") if video else None,
+        height=video.get("height") if video else None,
+        fps=_parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")) if video else None,
+        sample_rate=_parse_number(audio.get("sample_rate"), int) if audio else None,
+        channels=audio.get("channels") if audio else None,
+        has_video=video is not None,
+        has_audio=audio is not None
+    )
+
+
+class MediaProbeService:
+    def __init__(self):
+        self._cache: "OrderedDict[str, MediaProbe]" = OrderedDict()
+
+    async def probe(self, video_path: str) -> MediaProbe:
+        """Run ffprobe without blocking the event loop"""
+        process = await asyncio.create_subprocess_exec(
+            FFPROBE_PATH, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', video_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=PROBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"ffprobe timed out after {PROBE_TIMEOUT_SECONDS}s")
+
+        if process.returncode != 0:
+            raise RuntimeError(f"ffprobe failed: {stderr.decode(errors='replace')[-1000:]}")
+        return parse_ffprobe_output(json.loads(stdout or b"{}"))
+
+    def _remember(self, key: str, probe: MediaProbe):
+        self._cache[key] = probe
+        self._cache.move_to_end(key)
+        while len(self._cache) > PROBE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def get_probe(self, video_data: dict, video_path: str) -> MediaProbe:
+        """Probe metadata for a `videos` row, probing `video_path` only on a miss"""
+        if video_data.get("media_info"):
+            return MediaProbe(**video_data["media_info"])
+
+        key = video_data.get("content_hash") or video_data.get("id") or video_path
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        probe = await self.probe(video_path)
+        self._remember(key, probe)
+
+        if video_data.get("id"):
+            try:
+                from utils.supabase_storage import save_video_media_info
+                await asyncio.to_thread(
+                    save_video_media_info, video_data["id"], probe.model_dump(), video_data.get("content_hash")
+                )
+            except Exception as e:
+                logger.warning(f"Failed to store media info for video {video_data['id']}: {str(e)}")
+
+        return probe
@@ -1,6 +1,4 @@
 import os
-import asyncio
-import openai
 from typing import Dict, Any
 import json
 from dotenv import load_dotenv
@@ -9,114 +7,171 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
+from utils.openai_client import chat_completion
+from services.transcript_compaction import TranscriptCompactor
+
+# combined asks for gravitas and storytelling in one structured request;
+# separate sends the transcript twice (one request per analysis)
+NLP_ANALYSIS_MODE = os.getenv("NLP_ANALYSIS_MODE", "combined").lower()
+
+# Structured-output schemas (strict mode: every key required, nullable via "null")
+GRAVITAS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "commanding_presence": {"type": "number"},
+        "decisiveness": {"type": "number"},
+        "poise_under_pressure": {"type": "number"},
+        "emotional_intelligence": {"type": "number"},
+        "vision_articulation": {"type": "number"},
+        "overall_gravitas": {"type": "number"},
+        "key_observations": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": [
+        "commanding_presence", "decisiveness", "poise_under_pressure", "emotional_intelligence",
+        "vision_articulation", "overall_gravitas", "key_observations"
+    ],
+    "additionalProperties": False
+}
+
+STORYTELLING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "has_story": {"type": "boolean"},
+        "narrative_structure": {"type": ["number", "null"]},
+        "authenticity": {"type": ["number", "null"]},
+        "concreteness": {"type": ["number", "null"]},
+        "pacing": {"type": ["number", "null"]},
+        "story_excerpt": {"type": ["string", "null"]},
+        "observations": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": [
+        "has_story", "narrative_structure", "authenticity", "concreteness", "pacing", "story_excerpt", "observations"
+    ],
+    "additionalProperties": False
+}
+
+TRANSCRIPT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {"gravitas": GRAVITAS_SCHEMA, "storytelling": STORYTELLING_SCHEMA},
+    "required": ["gravitas", "storytelling"],
+    "additionalProperties": False
+}
+
+COACHING_TIPS_SCHEMA = {
+    "type": "object",
+    "properties": {"tips": {"type": "array", "items": {"type": "string"}}},
+    "required": ["tips"],
+    "additionalProperties": False
+}
+
 class NLPAnalysisService:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.client = openai.OpenAI(api_key=api_key)
-    
-    async def analyze_gravitas(self, transcript: str, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
+        self.compactor = TranscriptCompactor()
+
+    async def _structured_completion(self, prompt: str, schema_name: str, schema: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+        """One GPT-4o request whose reply is guaranteed to match `schema`"""
+        response = await chat_completion(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": schema_name, "strict": True, "schema": schema}
+            }
+        )
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            raise ValueError(f"Model refused the request: {message.refusal}")
+        return json.loads(message.content)
+
+    async def _transcript_section(self, transcript: str) -> str:
+        """The transcript for the prompt, compacted to the token budget for long recordings"""
+        compaction = await self.compactor.compact_cached(transcript)
+        if not compaction["compacted"]:
+            return f"**Transcript:**\n{transcript}"
+
+        counts = compaction["marker_counts"]
+        return f"""**Transcript excerpt:** the {compaction['sentences_kept']} most informative of {compaction['sentences_total']} sentences of a ~{compaction['original_tokens']}-token talk, in original order; [...] marks omitted passages. Across the full talk the speaker used {counts['hedging']} hedging phrases, {counts['decision']} decision phrases and {counts['story']} story phrases; judge hedging and story pacing against the full talk, not the excerpt.
+
+{compaction['text']}"""
+
+    def _gravitas_instructions(self, user_profile: Dict[str, Any] = None) -> str:
         profile_context = ""
         if user_profile:
             profile_context = f"\n\n**Speaker Profile:**\n- Role: {user_profile.get('role', 'Executive')}\n- Seniority: {user_profile.get('seniority_level', 'Senior')}\n- Experience: {user_profile.get('years_experience', 5)} years\n- Industry: {user_profile.get('industry', 'Technology')}\n\nIMPORTANT: Evaluate this speaker against the standards expected for their specific role and seniority level. A {user_profile.get('role', 'Executive')} at {user_profile.get('seniority_level', 'Senior')} level should demonstrate authority, strategic thinking, and leadership appropriate to this position.\n"
-        
-        prompt = f"""Analyze this executive's transcript for GRAVITAS indicators. Score each dimension 0-100:{profile_context}
 
-**Transcript:**
-{transcript}
+        return f"""**GRAVITAS** indicators. Score each dimension 0-100:{profile_context}
 
-**Gravitas Dimensions:**
 1. **Commanding Presence**: Directness, confident language, reduced hedging
 2. **Decisiveness**: Clear decisions, reasoning with 'because/therefore', closure statements
 3. **Poise Under Pressure**: Calm framing, problem decomposition when discussing challenges
 4. **Emotional Intelligence**: Empathy markers, stakeholder framing, ownership, respectful language
 5. **Vision Articulation**: Clear why/what/how, outcomes, strategic alignment
 
-Provide JSON response:
-{{
-  "commanding_presence": float,
-  "decisiveness": float,
-  "poise_under_pressure": float,
-  "emotional_intelligence": float,
-  "vision_articulation": float,
-  "overall_gravitas": float,
-  "key_observations": ["point 1", "point 2"]
-}}"""
-        
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=600
-            )
-            
-            result_text = response.choices[0].message.content
-            json_start = result_text.find('{')
-            json_end = result_text.rfind('}') + 1
-            
-            if json_start != -1 and json_end != 0:
-                result = json.loads(result_text[json_start:json_end])
-            else:
-                result = self._default_gravitas()
-            
-            return result
-        except Exception as e:
-            return self._default_gravitas(error=str(e))
-    
-    async def analyze_storytelling(self, transcript: str, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
+Also give overall_gravitas (0-100) and 2-4 key_observations."""
+
+    def _storytelling_instructions(self, user_profile: Dict[str, Any] = None) -> str:
         profile_context = ""
         if user_profile:
             profile_context = f"\n\n**Speaker Profile:** {user_profile.get('role', 'Executive')} ({user_profile.get('seniority_level', 'Senior')} level). Evaluate storytelling effectiveness appropriate for this leadership level.\n"
-        
-        prompt = f"""Analyze this transcript for STORYTELLING quality:{profile_context}
 
-**Transcript:**
-{transcript}
+        return f"""**STORYTELLING** quality:{profile_context}
 
-**Analysis:**
 1. Does it contain a story with setup → conflict → resolution?
 2. If YES, score these (0-100):
    - Narrative Structure: Clear beginning/middle/end
    - Authenticity: First-person lessons, reflections, responsibility
    - Concreteness: Specific details and examples
    - Pacing: Story portion as % of total
-3. If NO story detected, return has_story: false
-
-JSON response:
-{{
-  "has_story": bool,
-  "narrative_structure": float or null,
-  "authenticity": float or null,
-  "concreteness": float or null,
-  "pacing": float or null,
-  "story_excerpt": "brief excerpt" or null,
-  "observations": ["point 1", "point 2"]
-}}"""
-        
+   and quote a brief story_excerpt
+3. If NO story detected, set has_story to false and the scores and excerpt to null
+
+Include 2-4 observations."""
+
+    async def analyze_transcript(self, transcript: str, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Gravitas and storytelling from a single request: {"gravitas": {...}, "storytelling": {...}}"""
+        prompt = f"""Analyze this executive's transcript for two things.
+
+{await self._transcript_section(transcript)}
+
+**Part 1 (gravitas)**: {self._gravitas_instructions(user_profile)}
+
+**Part 2 (storytelling)**: {self._storytelling_instructions(user_profile)}"""
+
+        try:
+            return await self._structured_completion(prompt, "transcript_analysis", TRANSCRIPT_ANALYSIS_SCHEMA, max_tokens=1000)
+        except Exception as e:
+            return {
+                "gravitas": self._default_gravitas(error=str(e)),
+                "storytelling": {"has_story": False, "error": str(e)},
+                "error": str(e)
+            }
+
+    async def analyze_gravitas(self, transcript: str, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
+        prompt = f"""Analyze this executive's transcript for {self._gravitas_instructions(user_profile)}
+
+{await self._transcript_section(transcript)}"""
+
+        try:
+            return await self._structured_completion(prompt, "gravitas", GRAVITAS_SCHEMA, max_tokens=600)
+        except Exception as e:
+            return self._default_gravitas(error=str(e))
+
+    async def analyze_storytelling(self, transcript: str, user_profile: Dict[str, Any] = None) -> Dict[str, Any]:
+        prompt = f"""Analyze this transcript for {self._storytelling_instructions(user_profile)}
+
+{await self._transcript_section(transcript)}"""
+
         try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500
-            )
-            
-            result_text = response.choices[0].message.content
-            json_start = result_text.find('{')
-            json_end = result_text.rfind('}') + 1
-            
-            if json_start != -1 and json_end != 0:
-                result = json.loads(result_text[json_start:json_end])
-            else:
-                result = {"has_story": False}
-            
-            return result
+            return await self._structured_completion(prompt, "storytelling", STORYTELLING_SCHEMA, max_tokens=500)
         except Exception as e:
             return {"has_story": False, "error": str(e)}
-    
+
     async def generate_coaching_tips(self, all_metrics: Dict[str, Any]) -> list:
+        """Raises on failure; callers fall back to default_tips() (which must not be cached)"""
         prompt = f"""Based on these EP metrics, provide 5-7 actionable coaching tips:
 
 **Metrics Summary:**
@@ -126,30 +181,13 @@ Generate coaching tips that are:
 - Specific and actionable
 - Supportive and constructive
 - Mapped to weak areas
-- Include 1-2 positive reinforcements
+- Include 1-2 positive reinforcements"""
+
+        result = await self._structured_completion(prompt, "coaching_tips", COACHING_TIPS_SCHEMA, max_tokens=400)
+        if not result["tips"]:
+            raise ValueError("No coaching tips returned")
+        return result["tips"][:7]
 
-Return JSON array: ["tip 1", "tip 2", ...]"""
-        
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400
-            )
-            
-            result_text = response.choices[0].message.content
-            json_start = result_text.find('[')
-            json_end = result_text.rfind(']') + 1
-            
-            if json_start != -1 and json_end != 0:
-                tips = json.loads(result_text[json_start:json_end])
-                return tips[:7]
-            else:
-                return self._default_tips()
-        except Exception as e:
-            return self._default_tips()
-    
     def _default_gravitas(self, error=None):
         return {
             "commanding_presence": 60.0,
@@ -161,12 +199,12 @@ Return JSON array: ["tip 1", "tip 2", ...]"""
             "key_observations": ["Analysis unavailable"],
             "error": error
         }
-    
-    def _default_tips(self):
+
+    def default_tips(self):
         return [
             "Practice strategic pauses before key points",
             "Reduce filler words with deliberate pacing",
             "Maintain eye contact with the camera lens",
             "Use concrete examples to support your points",
             "Frame challenges as opportunities for growth"
-        ]
\ No newline at end of file
+        ]
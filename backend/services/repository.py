@@ -0,0 +1,285 @@
+"""
+Repository
+Non-blocking table access for the async route handlers. Rows come back as
+plain dicts shaped like PostgREST responses (timestamps as ISO strings,
+numerics as floats), whichever backend is in use.
+
+Backends:
+- postgres: asyncpg connection pool straight to the database (DATABASE_URL),
+  e.g. the Supabase pooler or a local Postgres
+- supabase: the supabase-py client run on a dedicated thread pool, so
+  PostgREST round-trips never block the event loop or starve the default
+  executor used by file and media work
+"""
+import os
+import re
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "20"))
+# pgbouncer in transaction mode (the Supabase pooler on port 6543) needs 0
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))
+REPOSITORY_THREADS = int(os.getenv("REPOSITORY_THREADS", "32"))
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+_MISS = object()
+
+
+def _quote(identifier: str) -> str:
+    if not _IDENTIFIER.match(identifier):
+        raise ValueError(f"Invalid identifier: {identifier}")
+    return f'"{identifier}"'
+
+
+def _columns(columns: str) -> str:
+    if columns.strip() == "*":
+        return "*"
+    return ", ".join(_quote(column.strip()) for column in columns.split(","))
+
+
+class Repository:
+    """Interface shared by the repository backends; `filters` are column equality tests"""
+
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*",
+                     order_by: Optional[str] = None, desc: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def upsert(self, table: str, row: Dict[str, Any], on_conflict: str = "id") -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Returns the updated rows"""
+        raise NotImplementedError
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Returns the deleted rows"""
+        raise NotImplementedError
+
+    async def rpc(self, function: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Call a set-returning SQL function in the public schema with named arguments"""
+        raise NotImplementedError
+
+    async def select_one(self, table: str, filters: Dict[str, Any], columns: str = "*") -> Optional[Dict[str, Any]]:
+        rows = await self.select(table, filters, columns=columns, limit=1)
+        return rows[0] if rows else None
+
+    async def close(self) -> None:
+        pass
+
+
+class SupabaseRepository(Repository):
+    def __init__(self, supabase=None):
+        self._supabase = supabase
+        self._executor = ThreadPoolExecutor(max_workers=REPOSITORY_THREADS, thread_name_prefix="repository")
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    async def _run(self, build) -> List[Dict[str, Any]]:
+        # The query is built on the worker thread too: building can trigger client setup
+        response = await asyncio.get_running_loop().run_in_executor(self._executor, lambda: build().execute())
+        return response.data or []
+
+    @staticmethod
+    def _filtered(query, filters: Optional[Dict[str, Any]]):
+        for column, value in (filters or {}).items():
+            query = query.is_(column, "null") if value is None else query.eq(column, value)
+        return query
+
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*",
+                     order_by: Optional[str] = None, desc: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        def build():
+            query = self._filtered(self.supabase.table(table).select(columns), filters)
+            if order_by:
+                query = query.order(order_by, desc=desc)
+            if limit:
+                query = query.limit(limit)
+            return query
+        return await self._run(build)
+
+    async def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        rows = await self._run(lambda: self.supabase.table(table).insert(row))
+        return rows[0] if rows else row
+
+    async def upsert(self, table: str, row: Dict[str, Any], on_conflict: str = "id") -> Dict[str, Any]:
+        rows = await self._run(lambda: self.supabase.table(table).upsert(row, on_conflict=on_conflict))
+        return rows[0] if rows else row
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._run(lambda: self._filtered(self.supabase.table(table).update(values), filters))
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._run(lambda: self._filtered(self.supabase.table(table).delete(), filters))
+
+    async def rpc(self, function: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._run(lambda: self.supabase.rpc(function, params))
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def _encode_timestamp(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _decode_timestamp(text: str) -> str:
+    """Postgres text output ("2026-10-17 12:00:00.5+00") -> ISO 8601, as PostgREST returns it"""
+    text = text.replace(" ", "T", 1)
+    if re.search(r"[+-]\d\d$", text):
+        text += ":00"
+    return text
+
+
+def _row(record) -> Dict[str, Any]:
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in record.items()}
+
+
+class PostgresRepository(Repository):
+    """asyncpg pool, created on first use in the running event loop"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    async def _init_connection(connection):
+        # Match PostgREST's JSON representation so handlers see the same shapes on both backends
+        for name in ("json", "jsonb"):
+            await connection.set_type_codec(name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+        await connection.set_type_codec("uuid", encoder=str, decoder=str, schema="pg_catalog", format="text")
+        for name in ("timestamptz", "timestamp"):
+            await connection.set_type_codec(name, encoder=_encode_timestamp, decoder=_decode_timestamp,
+                                            schema="pg_catalog", format="text")
+
+    async def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                import asyncpg
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=DATABASE_POOL_MIN_SIZE,
+                    max_size=DATABASE_POOL_MAX_SIZE,
+                    statement_cache_size=DATABASE_STATEMENT_CACHE_SIZE,
+                    server_settings={"timezone": "UTC"},
+                    init=self._init_connection
+                )
+                logger.info(f"Opened Postgres pool ({DATABASE_POOL_MIN_SIZE}-{DATABASE_POOL_MAX_SIZE} connections)")
+        return self._pool
+
+    async def _fetch(self, sql: str, *args) -> List[Dict[str, Any]]:
+        pool = await self._get_pool()
+        return [_row(record) for record in await pool.fetch(sql, *args)]
+
+    @staticmethod
+    def _where(filters: Optional[Dict[str, Any]], args: List[Any]) -> str:
+        clauses = []
+        for column, value in (filters or {}).items():
+            if value is None:
+                clauses.append(f"{_quote(column)} IS NULL")
+            else:
+                args.append(value)
+                clauses.append(f"{_quote(column)} = ${len(args)}")
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    async def select(self, table: str, filters: Optional[Dict[str, Any]] = None, columns: str = "*",
+                     order_by: Optional[str] = None, desc: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        args: List[Any] = []
+        sql = f"SELECT {_columns(columns)} FROM {_quote(table)}{self._where(filters, args)}"
+        if order_by:
+            sql += f" ORDER BY {_quote(order_by)} {'DESC' if desc else 'ASC'}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return await self._fetch(sql, *args)
+
+    @staticmethod
+    def _insert_sql(table: str, row: Dict[str, Any]) -> str:
+        columns = ", ".join(_quote(column) for column in row)
+        placeholders = ", ".join(f"${i}" for i in range(1, len(row) + 1))
+        return f"INSERT INTO {_quote(table)} ({columns}) VALUES ({placeholders})"
+
+    async def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        rows = await self._fetch(f"{self._insert_sql(table, row)} RETURNING *", *row.values())
+        return rows[0]
+
+    async def upsert(self, table: str, row: Dict[str, Any], on_conflict: str = "id") -> Dict[str, Any]:
+        conflict = [column.strip() for column in on_conflict.split(",")]
+        updates = ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in row if column not in conflict)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        sql = (f"{self._insert_sql(table, row)} ON CONFLICT ({', '.join(_quote(c) for c in conflict)}) "
+               f"{action} RETURNING *")
+        rows = await self._fetch(sql, *row.values())
+        return rows[0] if rows else row
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        args = list(values.values())
+        assignments = ", ".join(f"{_quote(column)} = ${i}" for i, column in enumerate(values, start=1))
+        sql = f"UPDATE {_quote(table)} SET {assignments}{self._where(filters, args)} RETURNING *"
+        return await self._fetch(sql, *args)
+
+    async def delete(self, table: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        args: List[Any] = []
+        return await self._fetch(f"DELETE FROM {_quote(table)}{self._where(filters, args)} RETURNING *", *args)
+
+    async def rpc(self, function: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        arguments = ", ".join(f"{_quote(name)} => ${i}" for i, name in enumerate(params, start=1))
+        return await self._fetch(f"SELECT * FROM public.{_quote(function)}({arguments})", *params.values())
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+_repository = _MISS
+
+
+def get_repository() -> Repository:
+    """Return the repository selected by REPOSITORY_BACKEND (postgres, supabase or auto)"""
+    global _repository
+
+    if _repository is not _MISS:
+        return _repository
+
+    backend = os.getenv("REPOSITORY_BACKEND", "auto").lower()
+    if backend == "auto":
+        backend = "postgres" if os.getenv("DATABASE_URL") else "supabase"
+
+    if backend == "postgres":
+        dsn = os.getenv("DATABASE_URL")
+        if not dsn:
+            raise ValueError("DATABASE_URL must be set for the postgres repository backend")
+        _repository = PostgresRepository(dsn)
+    elif backend == "supabase":
+        _repository = SupabaseRepository()
+    else:
+        raise ValueError(f"Unknown REPOSITORY_BACKEND: {backend}")
+
+    logger.info(f"Using {backend} repository backend")
+    return _repository
+
+
+async def close_repository():
+    global _repository
+    if _repository is not _MISS:
+        await _repository.close()
+    _repository = _MISS
@@ -0,0 +1,210 @@
+"""
+Stage Graph Executor
+Runs pipeline stages as a dependency DAG: every stage starts as soon as the
+stages it depends on have finished, so independent work (vision vs. audio,
+gravitas vs. storytelling) overlaps instead of running back to back.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Per-stage retries for transient failures (network, ffmpeg hiccups)
+STAGE_MAX_RETRIES = int(os.getenv("STAGE_MAX_RETRIES", "2"))
+STAGE_RETRY_BACKOFF_SECONDS = float(os.getenv("STAGE_RETRY_BACKOFF_SECONDS", "2"))
+# Result keys marking an incomplete or substitute result, which is not cached
+DEGRADED_RESULT_KEYS = ("error", "fallback_reason", "failed_windows")
+
+
+class Stage:
+    """A unit of pipeline work.
+
+    `func` receives a dict of the results of the stages listed in `deps`.
+    Coroutine functions are awaited; plain functions run in a worker thread so
+    CPU-bound work (OpenCV, librosa) never blocks the event loop.
+
+    Stages with a `cache_version` have JSON-serializable results that are
+    cached per content hash; `cache_variant` distinguishes inputs other than
+    the media itself (e.g. the speaker profile used in a prompt). Stages
+    with `cache_by_inputs` are instead keyed by a hash of their inputs, so
+    they are looked up once their dependencies have produced them.
+
+    `fallback(inputs)`, if given, supplies a substitute result once the last
+    retry has failed, instead of failing the graph; it is never cached.
+    """
+
+    def __init__(self, name: str, func: Callable, deps: Iterable[str] = (), status: str = None,
+                 step: str = None, retries: Optional[int] = None, cache_version: Optional[int] = None,
+                 cache_variant: str = "", cache_by_inputs: bool = False, fallback: Optional[Callable] = None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.status = status
+        self.step = step
+        self.retries = STAGE_MAX_RETRIES if retries is None else retries
+        self.cache_version = cache_version
+        self.cache_variant = cache_variant
+        self.cache_by_inputs = cache_by_inputs
+        self.fallback = fallback
+
+
+class StageGraph:
+    """`outputs` names the stages whose results the caller reads; they always end up in the results"""
+
+    def __init__(self, stages: List[Stage], cache=None, content_hash: Optional[str] = None,
+                 outputs: Iterable[str] = ()):
+        self.stages = {stage.name: stage for stage in stages}
+        self.cache = cache if content_hash else None
+        self.content_hash = content_hash
+        self.outputs = list(outputs)
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+        unknown = [name for name in self.outputs if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown output stages: {unknown}")
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Any] = {}
+
+    async def _call(self, stage: Stage, inputs: Dict[str, Any]):
+        if asyncio.iscoroutinefunction(stage.func):
+            return await stage.func(inputs)
+        result = await asyncio.to_thread(stage.func, inputs)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    @staticmethod
+    def _inputs_variant(stage: Stage, inputs: Dict[str, Any]) -> str:
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f"{stage.cache_variant}-{digest}" if stage.cache_variant else digest
+
+    async def _run_stage(self, stage: Stage, inputs: Dict[str, Any], started: float):
+        stage_start = time.monotonic()
+        cacheable = self.cache and stage.cache_version is not None
+        variant = self._inputs_variant(stage, inputs) if cacheable and stage.cache_by_inputs else stage.cache_variant
+        if cacheable and stage.cache_by_inputs:
+            try:
+                result = await self.cache.get(self.content_hash, stage.name, stage.cache_version, variant)
+            except Exception as e:
+                print(f"Cache lookup failed for {stage.name}: {str(e)}")
+                result = None
+            if result is not None:
+                self.timings[stage.name] = {"start": round(stage_start - started, 3), "duration": 0.0, "cached": True}
+                return result
+
+        fallback = False
+        for attempt in range(stage.retries + 1):
+            try:
+                result = await self._call(stage, inputs)
+                break
+            except Exception as e:
+                if attempt >= stage.retries:
+                    if stage.fallback is None:
+                        raise
+                    print(f"Stage {stage.name} failed: {str(e)}, using its fallback")
+                    result = stage.fallback(inputs)
+                    fallback = True
+                    break
+                print(f"Stage {stage.name} failed (attempt {attempt + 1}): {str(e)}, retrying")
+                await asyncio.sleep(STAGE_RETRY_BACKOFF_SECONDS * (attempt + 1))
+
+        self.timings[stage.name] = {
+            "start": round(stage_start - started, 3),
+            "duration": round(time.monotonic() - stage_start, 3),
+            "attempts": attempt + 1
+        }
+        if fallback:
+            self.timings[stage.name]["fallback"] = True
+
+        # Services report failures as default results with an "error" key, and results
+        # from a degraded path (e.g. local vision after GPT-4o failed) with a
+        # DEGRADED_RESULT_KEYS key; never cache those
+        failed = fallback or (isinstance(result, dict) and any(result.get(key) for key in DEGRADED_RESULT_KEYS))
+        if cacheable and not failed:
+            try:
+                await self.cache.set(self.content_hash, stage.name, stage.cache_version, result, variant)
+            except Exception as e:
+                print(f"Failed to cache {stage.name} result: {str(e)}")
+        return result
+
+    async def _load_cached(self) -> Dict[str, Any]:
+        cacheable = [
+            stage for stage in self.stages.values() if stage.cache_version is not None and not stage.cache_by_inputs
+        ]
+        if not self.cache or not cacheable:
+            return {}
+
+        async def lookup(stage: Stage):
+            try:
+                return await self.cache.get(self.content_hash, stage.name, stage.cache_version, stage.cache_variant)
+            except Exception as e:
+                print(f"Cache lookup failed for {stage.name}: {str(e)}")
+                return None
+
+        found = await asyncio.gather(*(lookup(stage) for stage in cacheable))
+        return {stage.name: result for stage, result in zip(cacheable, found) if result is not None}
+
+    def _required_stages(self, cached: Dict[str, Any]) -> Dict[str, Stage]:
+        """Stages that still have to run: uncached sinks and outputs plus the uncached stages they depend on"""
+        consumed = {dep for stage in self.stages.values() for dep in stage.deps}
+        required = {}
+        frontier = [name for name in self.stages if name not in consumed and name not in cached]
+        frontier += [name for name in self.outputs if name not in cached]
+        while frontier:
+            name = frontier.pop()
+            if name in required or name in cached:
+                continue
+            required[name] = self.stages[name]
+            frontier.extend(self.stages[name].deps)
+        return required
+
+    async def run(self, on_stage_start: Callable = None) -> Dict[str, Any]:
+        """Execute the graph and return {stage name: result}.
+
+        Cached results are loaded first; stages whose output is only needed by
+        cached stages (and that are not listed in `outputs`) are skipped entirely.
+
+        `on_stage_start(stage, completed, total)` is awaited whenever a stage is
+        launched, e.g. to report job progress. The first failing stage cancels
+        everything still running and its exception propagates.
+        """
+        results = self.results
+        started = time.monotonic()
+        running: Dict[asyncio.Task, str] = {}
+
+        cached = await self._load_cached()
+        results.update(cached)
+        for name in cached:
+            self.timings[name] = {"start": 0.0, "duration": 0.0, "cached": True}
+        pending = self._required_stages(cached)
+        total = len(cached) + len(pending)
+
+        try:
+            while pending or running:
+                ready = [stage for stage in pending.values() if all(dep in results for dep in stage.deps)]
+                for stage in ready:
+                    del pending[stage.name]
+                    if on_stage_start:
+                        await on_stage_start(stage, len(results), total)
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    running[asyncio.create_task(self._run_stage(stage, inputs, started))] = stage.name
+
+                if not running:
+                    raise RuntimeError(f"Stage graph has a dependency cycle: {list(pending)}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        self.timings["total"] = {"start": 0.0, "duration": round(time.monotonic() - started, 3)}
+        return results
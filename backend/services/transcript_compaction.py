@@ -0,0 +1,220 @@
+"""
+Transcript Compaction
+Extractive compaction of long transcripts to a token budget before they go
+into the NLP prompts, so prompt size (and GPT-4o latency and cost) stays
+roughly flat as recordings get longer.
+
+Sentences are scored by the signals the gravitas and storytelling prompts
+look for (decision, hedging, story, stakeholder and vision markers), by how
+central their vocabulary is to the whole talk, by concrete detail and by
+position (openings and closings). The transcript is split into sections and
+each section gets a share of the budget proportional to its length, so the
+extract keeps the arc of the talk instead of clustering in one part. Marker
+counts over the full transcript are reported alongside the extract so rates
+(e.g. how often the speaker hedges) are not skewed by the selection.
+
+Results are cached in the analysis cache keyed by the transcript's hash.
+"""
+import os
+import re
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List
+
+from services.analysis_cache import get_analysis_cache
+
+logger = logging.getLogger(__name__)
+
+# Transcripts over this many (estimated) tokens are compacted; 0 disables compaction
+NLP_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("NLP_TRANSCRIPT_TOKEN_BUDGET", "3000"))
+COMPACTION_CACHE_VERSION = 1
+COMPACTION_SECTIONS = 8
+MEMO_SIZE = 32
+# Same estimate as the OpenAI client's limiter
+CHARS_PER_TOKEN = 4
+GAP_MARKER = "[...]"
+
+MARKERS = {
+    "decision": [
+        "we will", "we'll", "i decided", "we decided", "decision", "because", "therefore", "so we", "my recommendation",
+        "i recommend", "the plan is", "next step", "we're going to", "i will", "commit", "priority", "bottom line"
+    ],
+    "hedging": [
+        "i think", "maybe", "perhaps", "sort of", "kind of", "probably", "i guess", "i feel like", "might", "hopefully",
+        "not sure", "i believe", "possibly"
+    ],
+    "story": [
+        "when i", "i remember", "years ago", "i learned", "the lesson", "at the time", "that's when", "it turned out",
+        "story", "i realized", "back then", "one day"
+    ],
+    "stakeholder": [
+        "team", "customer", "customers", "clients", "stakeholders", "together", "we", "you", "people", "our"
+    ],
+    "vision": [
+        "vision", "strategy", "goal", "future", "mission", "outcome", "impact", "why", "long term", "growth"
+    ]
+}
+MARKER_WEIGHTS = {"decision": 1.5, "hedging": 1.0, "story": 1.5, "stakeholder": 0.3, "vision": 1.0}
+MARKER_PATTERNS = {
+    kind: re.compile(r"\b(?:" + "|".join(re.escape(phrase) for phrase in phrases) + r")\b", re.IGNORECASE)
+    for kind, phrases in MARKERS.items()
+}
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be been being but by can could did do does doing
+don't down during each few for from further had has have having he her here hers him his how i i'm if in into is
+it it's its just like me more most my no nor not now of off on once only or other our ours out over own really
+same she should so some such than that that's the their theirs them then there these they this those through to
+too um uh under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"[a-z']+")
+MAX_SENTENCE_WORDS = 60
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_sentences(transcript: str) -> List[str]:
+    """Sentences on terminal punctuation; run-ons are cut every MAX_SENTENCE_WORDS words"""
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(transcript.strip()):
+        words = sentence.split()
+        for start in range(0, len(words), MAX_SENTENCE_WORDS):
+            sentences.append(" ".join(words[start:start + MAX_SENTENCE_WORDS]))
+    return [s for s in sentences if s]
+
+
+def count_markers(text: str) -> Dict[str, int]:
+    return {kind: len(pattern.findall(text)) for kind, pattern in MARKER_PATTERNS.items()}
+
+
+class TranscriptCompactor:
+    def __init__(self, token_budget: int = NLP_TRANSCRIPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _score(self, sentences: List[str]) -> List[float]:
+        tokenized = [[w for w in WORD.findall(s.lower()) if w not in STOPWORDS] for s in sentences]
+        frequencies = Counter(w for words in tokenized for w in words)
+        top = max(frequencies.values(), default=1)
+        edge = max(1, len(sentences) // 20)
+
+        scores = []
+        for index, (sentence, words) in enumerate(zip(sentences, tokenized)):
+            markers = count_markers(sentence)
+            score = sum(MARKER_WEIGHTS[kind] * min(count, 3) for kind, count in markers.items())
+            # Luhn-style centrality: sentences built from the talk's recurring vocabulary
+            if words:
+                score += 2.0 * sum(frequencies[w] for w in words) / (len(words) * top)
+            # Concrete detail: numbers and mid-sentence capitalized names
+            score += 0.5 * min(len(re.findall(r"\d", sentence)), 2)
+            score += 0.3 * min(len(re.findall(r"(?<=\s)[A-Z][a-z]+", sentence)), 3)
+            if index < edge or index >= len(sentences) - edge:
+                score += 1.5
+            if len(sentence.split()) < 4:
+                score *= 0.3
+            scores.append(score)
+        return scores
+
+    def compact(self, transcript: str) -> Dict[str, Any]:
+        """The transcript itself when it fits the budget, else an in-order extract of the best sentences"""
+        original_tokens = estimate_tokens(transcript)
+        result = {
+            "text": transcript,
+            "compacted": False,
+            "original_tokens": original_tokens,
+            "tokens": original_tokens,
+            "marker_counts": count_markers(transcript)
+        }
+        if self.token_budget <= 0 or original_tokens <= self.token_budget:
+            return result
+
+        sentences = split_sentences(transcript)
+        scores = self._score(sentences)
+        # Room for the separating space and a gap marker in front of every sentence
+        costs = [estimate_tokens(s) + 2 for s in sentences]
+        # Repeated sentences (catchphrases, transcription loops) are only kept once
+        seen = set()
+        for i, sentence in enumerate(sentences):
+            key = sentence.lower()
+            if key in seen:
+                scores[i] = -1.0
+            seen.add(key)
+
+        # Split the budget across sections in proportion to their length
+        section_size = max(1, -(-len(sentences) // COMPACTION_SECTIONS))
+        selected = set()
+        spent = 0
+        for start in range(0, len(sentences), section_size):
+            indices = range(start, min(start + section_size, len(sentences)))
+            allowance = self.token_budget * sum(costs[i] for i in indices) / sum(costs)
+            used = 0
+            for i in sorted(indices, key=lambda i: scores[i], reverse=True):
+                if scores[i] >= 0 and used + costs[i] <= allowance:
+                    selected.add(i)
+                    used += costs[i]
+            spent += used
+
+        # Hand the rounding leftovers to the best remaining sentences anywhere
+        for i in sorted(set(range(len(sentences))) - selected, key=lambda i: scores[i], reverse=True):
+            if scores[i] >= 0 and spent + costs[i] <= self.token_budget:
+                selected.add(i)
+                spent += costs[i]
+
+        parts = []
+        previous = -1
+        for i in sorted(selected):
+            if i != previous + 1:
+                parts.append(GAP_MARKER)
+            parts.append(sentences[i])
+            previous = i
+        if previous != len(sentences) - 1:
+            parts.append(GAP_MARKER)
+
+        text = " ".join(parts)
+        result.update({
+            "text": text,
+            "compacted": True,
+            "tokens": estimate_tokens(text),
+            "sentences_total": len(sentences),
+            "sentences_kept": len(selected)
+        })
+        return result
+
+    async def compact_cached(self, transcript: str) -> Dict[str, Any]:
+        """compact(), cached per transcript hash (in process and in the analysis cache)"""
+        if self.token_budget <= 0 or estimate_tokens(transcript) <= self.token_budget:
+            return self.compact(transcript)
+
+        transcript_hash = hashlib.sha256(transcript.encode()).hexdigest()
+        if transcript_hash in self._memo:
+            self._memo.move_to_end(transcript_hash)
+            return self._memo[transcript_hash]
+
+        cache = get_analysis_cache()
+        variant = str(self.token_budget)
+        result = None
+        if cache:
+            try:
+                result = await cache.get(transcript_hash, "transcript_compaction", COMPACTION_CACHE_VERSION, variant)
+            except Exception as e:
+                logger.warning(f"Failed to read cached transcript compaction: {str(e)}")
+
+        if result is None:
+            result = self.compact(transcript)
+            logger.info(f"Compacted transcript from {result['original_tokens']} to {result['tokens']} tokens "
+                        f"({result['sentences_kept']}/{result['sentences_total']} sentences)")
+            if cache:
+                try:
+                    await cache.set(transcript_hash, "transcript_compaction", COMPACTION_CACHE_VERSION, result, variant)
+                except Exception as e:
+                    logger.warning(f"Failed to cache transcript compaction: {str(e)}")
+
+        self._memo[transcript_hash] = result
+        while len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return result
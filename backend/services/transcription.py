@@ -1,67 +1,159 @@
 import os
+import json
+import wave
 import tempfile
 import asyncio
-from openai import OpenAI
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
 from dotenv import load_dotenv
-from pydub import AudioSegment
-import subprocess
 from pathlib import Path
 
+from services.audio_artifact import AudioArtifact
+from services.transcription_engines import get_transcription_engine
+from services.media_probe import MediaProbeService
+from models.video import MediaProbe
+from utils import metrics
+
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
+# single uploads the whole WAV; chunked splits at silences and transcribes the
+# chunks concurrently; auto chunks long recordings or ones over the upload limit
+TRANSCRIPTION_MODE = os.getenv("TRANSCRIPTION_MODE", "auto").lower()
+TRANSCRIPTION_CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "120"))
+TRANSCRIPTION_CHUNK_MIN_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_MIN_SECONDS", "240"))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+TRANSCRIPTION_CHUNK_OVERLAP_SECONDS = 1.0
+# Cuts are placed at the quietest window within this many seconds before each chunk boundary
+TRANSCRIPTION_CHUNK_SEARCH_SECONDS = 20.0
+SILENCE_WINDOW_SECONDS = 0.1
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "/usr/bin/ffmpeg")
+FFMPEG_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_ATTEMPT_TIMEOUT_SECONDS", "120"))
+
+# Extraction attempt that last worked for each "container/audio codec", tried first next
+# time; kept in a file so worker restarts (and the other workers, once restarted) keep it
+AUDIO_EXTRACTION_PREFERENCES_PATH = os.getenv(
+    "AUDIO_EXTRACTION_PREFERENCES_PATH", str(ROOT_DIR / "data" / "audio_extraction_preferences.json")
+)
+
+
+def _load_preferred_attempts() -> Dict[str, str]:
+    try:
+        with open(AUDIO_EXTRACTION_PREFERENCES_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable audio extraction preferences: {str(e)}")
+        return {}
+
+
+def _save_preferred_attempt(format_key: str, attempt: str):
+    # Merge with what other workers stored since this one started
+    preferences = {**_load_preferred_attempts(), format_key: attempt}
+    directory = os.path.dirname(AUDIO_EXTRACTION_PREFERENCES_PATH)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(preferences, f)
+    os.replace(temp_path, AUDIO_EXTRACTION_PREFERENCES_PATH)
+
+
+_preferred_attempts: Dict[str, str] = _load_preferred_attempts()
+metrics.describe("audio_extraction_attempts_total", "Audio extraction attempts by format, attempt and outcome")
+
 class TranscriptionService:
     def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.api_key = api_key
+        self.engine = get_transcription_engine()
+        self.probe_service = MediaProbeService()
     
-    def detect_video_format(self, video_path: str) -> str:
-        """Detect the actual video format using ffprobe"""
-        try:
-            result = subprocess.run(
-                ['/usr/bin/ffprobe', '-v', 'error', '-select_streams', 'v:0', 
-                 '-show_entries', 'stream=codec_name', '-of', 'default=noprint_wrappers=1:nokey=1',
-                 video_path],
-                capture_output=True, text=True, timeout=10
-            )
-            codec = result.stdout.strip()
-            
-            # Also check container format
-            result2 = subprocess.run(
-                ['/usr/bin/ffprobe', '-v', 'error', '-show_entries', 
-                 'format=format_name', '-of', 'default=noprint_wrappers=1:nokey=1',
-                 video_path],
-                capture_output=True, text=True, timeout=10
+    @staticmethod
+    def _format_key(probe: MediaProbe) -> str:
+        return f"{probe.format_name}/{probe.audio_codec or 'unknown'}"
+    
+    def _fallback_attempts(self, video_path: str, audio_path: str, probe: MediaProbe) -> List[Tuple[str, List[list]]]:
+        """Fallback extractions that fit the probed container, cheapest first"""
+        pcm_output = ['-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y', audio_path]
+        format_name = probe.format_name.lower()
+        is_matroska = 'webm' in format_name or 'matroska' in format_name
+        unknown = format_name == "unknown"
+        attempts = []
+        
+        if probe.has_audio:
+            # Copy the audio stream out without decoding anything, then decode just that
+            remux_path = audio_path + ".mka"
+            attempts.append(("remux", [
+                [FFMPEG_PATH, '-i', video_path, '-map', '0:a:0', '-vn', '-c:a', 'copy', '-y', remux_path],
+                [FFMPEG_PATH, '-i', remux_path, *pcm_output]
+            ]))
+        if is_matroska:
+            # The standard attempt forces the WebM demuxer; let ffmpeg detect the container instead
+            attempts.append(("autodetect", [[FFMPEG_PATH, '-i', video_path, '-vn', *pcm_output]]))
+        elif unknown:
+            attempts.append(("force_webm", [[FFMPEG_PATH, '-f', 'webm', '-i', video_path, '-vn', *pcm_output]]))
+        attempts.append(("ignore_errors", [[
+            FFMPEG_PATH, '-err_detect', 'ignore_err', '-fflags', '+discardcorrupt+genpts',
+            '-i', video_path, '-vn', *pcm_output
+        ]]))
+        if unknown:
+            attempts.append(("lavfi", [[FFMPEG_PATH, '-f', 'lavfi', '-i', f'amovie={video_path}', *pcm_output]]))
+        return attempts
+    
+    async def _run_attempt(self, commands: List[list], audio_path: str) -> Tuple[str, str]:
+        """Run one attempt's commands; returns (outcome, error)"""
+        for command in commands:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
             )
-            format_name = result2.stdout.strip()
-            
-            return format_name, codec
-        except Exception as e:
-            print(f"Error detecting format: {e}")
-            return "unknown", "unknown"
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=FFMPEG_ATTEMPT_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return "timeout", f"timed out after {FFMPEG_ATTEMPT_TIMEOUT_SECONDS}s"
+            if process.returncode != 0:
+                return "failure", stderr.decode(errors="replace")[-1000:]
+        
+        if not os.path.exists(audio_path) or os.path.getsize(audio_path) < 1000:
+            return "failure", "no audio was produced"
+        return "success", ""
     
-    async def extract_audio_from_video(self, video_path: str, original_format: str = None) -> str:
-        """Extract audio from video, handling various formats including WebM"""
+    async def extract_audio_from_video(self, video_path: str, original_format: str = None,
+                                       probe: Optional[MediaProbe] = None) -> str:
+        """Extract audio from video, handling various formats including WebM
+        
+        The standard extraction runs first, then fallbacks chosen from the
+        probed container. Once a fallback has worked for a format, later
+        videos of that format try it first.
+        """
         
         # Generate audio output path
         audio_path = tempfile.mktemp(suffix=".wav")
         
-        # Detect actual format if not provided
-        format_name, codec = self.detect_video_format(video_path)
-        print(f"Detected format: {format_name}, codec: {codec}")
+        # Use the job's probe when available; probe only if the caller has none
+        if probe is None:
+            try:
+                probe = await self.probe_service.probe(video_path)
+            except Exception as e:
+                print(f"Error detecting format: {e}")
+                probe = MediaProbe()
+        format_key = self._format_key(probe)
+        print(f"Detected format: {probe.format_name}, codec: {probe.video_codec}, audio: {probe.audio_codec}")
+        
+        if probe.format_name != "unknown" and not probe.has_audio:
+            metrics.increment("audio_extraction_attempts_total", format=format_key, attempt="none", outcome="no_audio")
+            raise RuntimeError("Video has no audio track")
         
         # Build FFmpeg command with format-specific options
-        command = ['/usr/bin/ffmpeg']
+        command = [FFMPEG_PATH]
         
         # For WebM files, we need specific input options
-        if 'webm' in format_name.lower() or 'matroska' in format_name.lower():
+        if 'webm' in probe.format_name.lower() or 'matroska' in probe.format_name.lower():
             # WebM/Matroska container
             command.extend(['-f', 'webm'])
-        elif 'mp4' in format_name.lower() or 'mov' in format_name.lower():
-            # MP4/MOV container
-            pass  # FFmpeg auto-detects
         
         command.extend([
             '-i', video_path,
@@ -73,113 +165,159 @@ class TranscriptionService:
             audio_path
         ])
         
+        attempts = [("standard", [command])] + self._fallback_attempts(video_path, audio_path, probe)
+        preferred = _preferred_attempts.get(format_key)
+        attempts.sort(key=lambda attempt: attempt[0] != preferred)
+        
+        last_error = ""
         try:
-            process = await asyncio.create_subprocess_exec(
-                *command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                stderr_text = stderr.decode()
-                print(f"FFmpeg failed with return code {process.returncode}")
-                print(f"STDERR: {stderr_text}")
-                
-                # Try alternative approach for problematic files
-                audio_path = await self._extract_audio_fallback(video_path)
-                if audio_path:
+            for name, commands in attempts:
+                outcome, last_error = await self._run_attempt(commands, audio_path)
+                metrics.increment("audio_extraction_attempts_total", format=format_key, attempt=name, outcome=outcome)
+                if outcome == "success":
+                    if (name != "standard" or preferred) and name != preferred:
+                        _preferred_attempts[format_key] = name
+                        try:
+                            await asyncio.to_thread(_save_preferred_attempt, format_key, name)
+                        except OSError as e:
+                            print(f"Failed to store audio extraction preference: {str(e)}")
+                    if name != "standard":
+                        print(f"Audio extraction for {format_key} succeeded with the {name} fallback")
                     return audio_path
-                    
-                raise RuntimeError(f"FFmpeg failed: {stderr_text}")
-            
-            # Check if audio file was created and has content
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError(f"Audio file was not created: {audio_path}")
-            
-            if os.path.getsize(audio_path) < 1000:
-                print(f"Warning: Audio file is very small ({os.path.getsize(audio_path)} bytes)")
-                # Try fallback
-                fallback_path = await self._extract_audio_fallback(video_path)
-                if fallback_path and os.path.getsize(fallback_path) > os.path.getsize(audio_path):
-                    os.remove(audio_path)
-                    return fallback_path
-                
-            return audio_path
+                print(f"Audio extraction attempt {name} for {format_key} failed ({outcome}): {last_error}")
+        finally:
+            if os.path.exists(audio_path + ".mka"):
+                os.unlink(audio_path + ".mka")
+        
+        if os.path.exists(audio_path):
+            os.unlink(audio_path)
+        raise RuntimeError(f"FFmpeg failed: {last_error}")
+    
+    async def transcribe_audio(self, audio: Union[str, AudioArtifact]) -> dict:
+        """Transcribe a 16 kHz WAV (path or AudioArtifact).
+        
+        Long recordings are split at silences and the chunks transcribed
+        concurrently; the merged result has the same
+        {"text", "words", "segments", "duration"} shape either way.
+        """
+        artifact = audio if isinstance(audio, AudioArtifact) else None
+        audio_path = audio.path if artifact else audio
+        
+        if TRANSCRIPTION_MODE != "single":
+            if artifact is None:
+                try:
+                    artifact = AudioArtifact(audio_path)
+                except ValueError as e:
+                    print(f"Cannot chunk audio, transcribing in one request: {str(e)}")
             
-        except Exception as e:
-            print(f"Error in extract_audio_from_video: {e}")
-            # Try fallback
-            fallback_path = await self._extract_audio_fallback(video_path)
-            if fallback_path:
-                return fallback_path
-            raise
+            max_upload_bytes = self.engine.max_upload_bytes
+            long_audio = artifact is not None and (
+                artifact.duration > TRANSCRIPTION_CHUNK_MIN_SECONDS
+                or (max_upload_bytes is not None and os.path.getsize(audio_path) > max_upload_bytes)
+            )
+            if artifact is not None and (TRANSCRIPTION_MODE == "chunked" or long_audio):
+                return await self._transcribe_chunked(artifact)
+        
+        return await self._transcribe_file(audio_path)
     
-    async def _extract_audio_fallback(self, video_path: str) -> str:
-        """Fallback method using different FFmpeg options"""
-        audio_path = tempfile.mktemp(suffix=".wav")
+    async def _transcribe_file(self, audio_path: str) -> dict:
+        return await self.engine.transcribe_file(audio_path)
+    
+    @staticmethod
+    def _split_points(artifact: AudioArtifact) -> List[float]:
+        """Cut times (seconds) at the quietest window near every chunk boundary"""
+        sr = artifact.sample_rate
+        window = int(sr * SILENCE_WINDOW_SECONDS)
+        pcm = artifact.pcm if artifact.pcm.ndim == 1 else artifact.pcm[:, 0]
         
-        # Try with more permissive options
-        commands_to_try = [
-            # Try 1: Force WebM input format
-            ['/usr/bin/ffmpeg', '-f', 'webm', '-i', video_path, 
-             '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y', audio_path],
-            # Try 2: Copy audio codec first then convert
-            ['/usr/bin/ffmpeg', '-i', video_path, 
-             '-vn', '-c:a', 'copy', '-y', video_path + '.audio'],
-            # Try 3: Use raw demuxer
-            ['/usr/bin/ffmpeg', '-f', 'lavfi', '-i', f'amovie={video_path}', 
-             '-ar', '16000', '-ac', '1', '-y', audio_path],
-            # Try 4: Simple extraction ignoring errors
-            ['/usr/bin/ffmpeg', '-err_detect', 'ignore_err', '-i', video_path,
-             '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1', '-y', audio_path],
-        ]
-        
-        for cmd in commands_to_try:
-            try:
-                process = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await process.communicate()
-                
-                if process.returncode == 0 and os.path.exists(audio_path) and os.path.getsize(audio_path) > 1000:
-                    print(f"Fallback succeeded with command: {' '.join(cmd[:3])}")
-                    return audio_path
-            except Exception as e:
-                print(f"Fallback command failed: {e}")
-                continue
+        # Mean energy per window, read from the memmap in bounded blocks
+        window_count = len(pcm) // window
+        energy = np.empty(window_count, dtype=np.float64)
+        block_windows = 6000
+        for first in range(0, window_count, block_windows):
+            last = min(first + block_windows, window_count)
+            block = pcm[first * window:last * window].astype(np.float32).reshape(last - first, window)
+            energy[first:last] = (block * block).mean(axis=1)
         
-        return None
+        cuts = [0.0]
+        while artifact.duration - cuts[-1] > TRANSCRIPTION_CHUNK_SECONDS:
+            target = cuts[-1] + TRANSCRIPTION_CHUNK_SECONDS
+            # Search at most the second half of the chunk, so chunks shorter than the
+            # search window neither start it before 0 nor fall back on the previous cut
+            low = max(int((target - TRANSCRIPTION_CHUNK_SEARCH_SECONDS) / SILENCE_WINDOW_SECONDS),
+                      int((cuts[-1] + TRANSCRIPTION_CHUNK_SECONDS / 2) / SILENCE_WINDOW_SECONDS))
+            high = min(int(target / SILENCE_WINDOW_SECONDS), window_count)
+            if high <= low:
+                break
+            quietest = low + int(np.argmin(energy[low:high]))
+            cuts.append((quietest + 0.5) * SILENCE_WINDOW_SECONDS)
+        cuts.append(artifact.duration)
+        return cuts
     
-    async def transcribe_audio(self, audio_path: str) -> dict:
-        import openai
-        client = openai.OpenAI(api_key=self.api_key)
-        
-        with open(audio_path, "rb") as audio_file:
-            response = await asyncio.to_thread(
-                client.audio.transcriptions.create,
-                file=audio_file,
-                model="whisper-1",
-                response_format="verbose_json",
-                timestamp_granularities=["word", "segment"]
-            )
+    @staticmethod
+    def _write_chunk(artifact: AudioArtifact, start: float, end: float) -> str:
+        sr = artifact.sample_rate
+        pcm = artifact.pcm[int(start * sr):int(end * sr)]
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as chunk_file:
+            try:
+                with wave.open(chunk_file, "wb") as chunk:
+                    chunk.setnchannels(artifact.channels)
+                    chunk.setsampwidth(2)
+                    chunk.setframerate(sr)
+                    chunk.writeframes(np.ascontiguousarray(pcm).tobytes())
+            except Exception:
+                os.unlink(chunk_file.name)
+                raise
+        return chunk_file.name
+    
+    async def _transcribe_chunked(self, artifact: AudioArtifact) -> dict:
+        cuts = self._split_points(artifact)
+        semaphore = asyncio.Semaphore(TRANSCRIPTION_CONCURRENCY)
+        print(f"Transcribing {artifact.duration:.0f}s of audio in {len(cuts) - 1} chunks")
         
-        words_list = []
-        if hasattr(response, 'words') and response.words:
-            words_list = [{"word": w.word, "start": w.start, "end": w.end} for w in response.words]
+        async def transcribe_chunk(index: int):
+            # Pad each chunk so words cut at the boundary are heard whole by one side
+            start = max(0.0, cuts[index] - TRANSCRIPTION_CHUNK_OVERLAP_SECONDS)
+            end = min(artifact.duration, cuts[index + 1] + TRANSCRIPTION_CHUNK_OVERLAP_SECONDS)
+            async with semaphore:
+                chunk_path = await asyncio.to_thread(self._write_chunk, artifact, start, end)
+                try:
+                    return start, await self._transcribe_file(chunk_path)
+                finally:
+                    os.unlink(chunk_path)
         
-        segments_list = []
-        if hasattr(response, 'segments') and response.segments:
-            segments_list = [{"text": s.text, "start": s.start, "end": s.end} for s in response.segments]
+        results = await asyncio.gather(*(transcribe_chunk(i) for i in range(len(cuts) - 1)))
+        return self._merge_chunks(results, cuts, artifact.duration)
+    
+    @staticmethod
+    def _merge_chunks(results: List[tuple], cuts: List[float], duration: float) -> dict:
+        """Shift chunk timestamps to the recording's timeline; in the overlap, each
+        word/segment is kept only by the chunk whose span contains its midpoint"""
+        words, segments, texts = [], [], []
         
-        duration = response.duration if hasattr(response, 'duration') else 180
+        for index, (offset, result) in enumerate(results):
+            own_start, own_end = cuts[index], cuts[index + 1]
+            
+            def owned(item):
+                midpoint = offset + (item["start"] + item["end"]) / 2
+                return own_start <= midpoint < own_end or (index == len(results) - 1 and midpoint >= own_end)
+            
+            for word in result["words"]:
+                if owned(word):
+                    words.append({**word, "start": word["start"] + offset, "end": word["end"] + offset})
+            
+            chunk_segments = [segment for segment in result["segments"] if owned(segment)]
+            for segment in chunk_segments:
+                segments.append({**segment, "start": segment["start"] + offset, "end": segment["end"] + offset})
+            
+            if result["segments"]:
+                texts.extend(segment["text"].strip() for segment in chunk_segments)
+            else:
+                texts.append(result["text"].strip())
         
         return {
-            "text": response.text,
-            "words": words_list,
-            "segments": segments_list,
+            "text": " ".join(text for text in texts if text),
+            "words": words,
+            "segments": segments,
             "duration": duration
         }
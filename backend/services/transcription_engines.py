@@ -0,0 +1,144 @@
+"""
+Transcription Engines
+Backends that turn a 16 kHz WAV into {"text", "words", "segments", "duration"},
+with words as {"word", "start", "end"} (the shape AudioAnalysisService's
+pause and filler detection reads). Selected by TRANSCRIPTION_BACKEND:
+
+- openai: whisper-1 over the API (default)
+- local: a quantized Whisper model on CPU via faster-whisper, loaded once per
+  worker process; requests take turns on the single model instance, each
+  decoded through faster-whisper's batched pipeline
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai").lower()
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base.en")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_CPU_THREADS = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "0"))
+# Windows of one recording decoded per forward pass
+LOCAL_WHISPER_BATCH_SIZE = int(os.getenv("LOCAL_WHISPER_BATCH_SIZE", "8"))
+
+
+class TranscriptionEngine:
+    # The API rejects uploads over 25 MB, so long audio has to be chunked; local engines take any length
+    max_upload_bytes: Optional[int] = None
+
+    async def transcribe_file(self, audio_path: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class OpenAIWhisperEngine(TranscriptionEngine):
+    max_upload_bytes = 25 * 1024 * 1024
+
+    def __init__(self, api_key: str = None):
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        self.api_key = api_key
+
+    async def transcribe_file(self, audio_path: str) -> Dict[str, Any]:
+        from utils.openai_client import transcription
+        response = await transcription(
+            audio_path,
+            model="whisper-1",
+            response_format="verbose_json",
+            timestamp_granularities=["word", "segment"]
+        )
+
+        words_list = []
+        if hasattr(response, 'words') and response.words:
+            words_list = [{"word": w.word, "start": w.start, "end": w.end} for w in response.words]
+
+        segments_list = []
+        if hasattr(response, 'segments') and response.segments:
+            segments_list = [{"text": s.text, "start": s.start, "end": s.end} for s in response.segments]
+
+        duration = response.duration if hasattr(response, 'duration') else 180
+
+        return {
+            "text": response.text,
+            "words": words_list,
+            "segments": segments_list,
+            "duration": duration
+        }
+
+
+class LocalWhisperEngine(TranscriptionEngine):
+    """faster-whisper on CPU.
+
+    The model is created on first use and kept for the life of the process.
+    Requests (several jobs, or the chunks of one) run one at a time on a
+    single model thread, since parallel calls would only contend for the
+    same CPU threads; the throughput comes from the batched pipeline, which
+    decodes LOCAL_WHISPER_BATCH_SIZE windows of a recording per forward pass.
+    """
+
+    def __init__(self):
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+
+    def _load(self):
+        with self._model_lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel, BatchedInferencePipeline
+                logger.info(f"Loading local Whisper model {LOCAL_WHISPER_MODEL} ({LOCAL_WHISPER_COMPUTE_TYPE})")
+                model = WhisperModel(
+                    LOCAL_WHISPER_MODEL,
+                    device="cpu",
+                    compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                    cpu_threads=LOCAL_WHISPER_CPU_THREADS
+                )
+                self._model = BatchedInferencePipeline(model=model)
+            return self._model
+
+    def _transcribe_sync(self, audio_path: str) -> Dict[str, Any]:
+        segments, info = self._load().transcribe(
+            audio_path,
+            batch_size=LOCAL_WHISPER_BATCH_SIZE,
+            word_timestamps=True
+        )
+
+        words_list, segments_list = [], []
+        for segment in segments:
+            segments_list.append({"text": segment.text, "start": segment.start, "end": segment.end})
+            for word in segment.words or []:
+                # faster-whisper keeps the leading space on each word; the API does not
+                words_list.append({"word": word.word.strip(), "start": word.start, "end": word.end})
+
+        return {
+            "text": "".join(segment["text"] for segment in segments_list).strip(),
+            "words": words_list,
+            "segments": segments_list,
+            "duration": info.duration
+        }
+
+    async def transcribe_file(self, audio_path: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transcribe_sync, audio_path)
+
+
+_engine: Optional[TranscriptionEngine] = None
+
+
+def get_transcription_engine() -> TranscriptionEngine:
+    """Return the process-wide engine selected by TRANSCRIPTION_BACKEND (openai or local)"""
+    global _engine
+
+    if _engine is None:
+        if TRANSCRIPTION_BACKEND == "openai":
+            _engine = OpenAIWhisperEngine()
+        elif TRANSCRIPTION_BACKEND == "local":
+            _engine = LocalWhisperEngine()
+        else:
+            raise ValueError(f"Unknown TRANSCRIPTION_BACKEND: {TRANSCRIPTION_BACKEND}")
+        logger.info(f"Using {TRANSCRIPTION_BACKEND} transcription backend")
+
+    return _engine
@@ -1,60 +1,93 @@
 import os
 import sys
+import json
+import hashlib
 import tempfile
 import asyncio
 sys.path.append('/app/backend')
 
 from services.transcription import TranscriptionService
-from services.audio_analysis import AudioAnalysisService
-from services.vision_analysis import VisionAnalysisService
-from services.nlp_analysis import NLPAnalysisService
-from utils.supabase_storage import get_video_from_storage
+from services.audio_analysis import AudioAnalysisService, PITCH_ESTIMATOR
+from services.vision_analysis import VisionAnalysisService, FRAME_SAMPLING_MODE, VISION_BACKEND
+from services.nlp_analysis import NLPAnalysisService, NLP_ANALYSIS_MODE
+from services.media_ingest import MediaIngestService
+from services.audio_artifact import AudioArtifact
+from services.media_probe import MediaProbeService
+from models.video import MediaProbe
+from services.job_events import get_job_event_broker, job_event
+from services.job_status_writer import TERMINAL_STATUSES, get_job_status_writer
+from services.stage_graph import Stage, StageGraph
+from services.analysis_cache import get_analysis_cache
+from utils.supabase_storage import get_video_from_storage, download_video_to_file
 import uuid
 from datetime import datetime, timezone
 
+# Bump a stage's version when its output or prompt changes to invalidate cached results
+STAGE_CACHE_VERSIONS = {
+    "probe": 1,
+    "extract_frames": 3,
+    "transcribe": 1,
+    "vocal_metrics": 1,
+    "vision": 2,
+    "nlp_analysis": 2,
+    "gravitas": 3,
+    "storytelling": 3,
+    "coaching_tips": 3
+}
+
 class VideoProcessorService:
     def __init__(self):
         self.transcription_service = TranscriptionService()
         self.audio_service = AudioAnalysisService()
         self.vision_service = VisionAnalysisService()
         self.nlp_service = NLPAnalysisService()
+        self.ingest_service = MediaIngestService(with_frames=FRAME_SAMPLING_MODE == "interval")
+        self.probe_service = MediaProbeService()
     
     async def update_job_status(self, job_id: str, status: str, progress: float, step: str, extra_fields: dict | None = None):
+        update_data = {
+            "status": status,
+            "progress": progress,
+            "current_step": step,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        
+        if extra_fields:
+            update_data.update(extra_fields)
+        
+        writer = get_job_status_writer()
+        if status not in TERMINAL_STATUSES:
+            # Progress is written behind, coalesced with the job's other steps
+            writer.update(job_id, update_data)
+        else:
+            # Final states are stored before the job is reported finished; if that fails, so does the job
+            if not await writer.write(job_id, update_data):
+                raise RuntimeError(f"Job {job_id} not found while writing its final status")
+        
         try:
-            # Import Supabase client
-            from utils.supabase_client import get_supabase_client
-            supabase = get_supabase_client()
-            
-            # Update job status in database
-            update_data = {
-                "status": status,
-                "progress": progress,
-                "current_step": step,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            if extra_fields:
-                update_data.update(extra_fields)
-            
-            response = supabase.table("jobs").update(update_data).eq("id", job_id).execute()
-            
-            if not response.data:
-                print(f"Warning: Job {job_id} not found in database")
-            
+            # Push the transition to clients streaming the job's events
+            await get_job_event_broker().publish(job_id, job_event(update_data))
         except Exception as e:
-            print(f"Failed to update job status: {str(e)}")
+            print(f"Failed to publish job event: {str(e)}")
     
-    async def process_video(self, job_id: str, video_id: str, user_id: str):
-        try:
-            await self.update_job_status(job_id, "transcribing", 10, "Extracting audio...")
-            
-            # Get video from storage
-            video_data = get_video_from_storage(video_id)
-            
-            # Get video metadata
-            content_type = video_data.get("content_type", "video/mp4")
-            filename = video_data.get("filename", "video.mp4")
-            
+    def _build_stage_graph(self, video_data: dict, user_profile: dict) -> StageGraph:
+        """Pipeline stages and their data dependencies.
+
+        A single ffmpeg pass (ingest) produces the WAV (and, in interval
+        sampling mode, the frames; keyframe mode seeks to the few frames that
+        are actually sent). Vision work only needs the frames and vocal metrics only need
+        the WAV, so both overlap with transcription; the NLP analysis starts once
+        the transcript is available (one combined request by default, or one
+        request each for gravitas and storytelling). Stage outputs are cached by the video's
+        content hash, so re-processing an identical upload skips the download
+        and every model call.
+        """
+        audio = self.audio_service
+        content_type = video_data.get("content_type") or "video/mp4"
+        filename = video_data.get("filename") or "video.mp4"
+        profile_variant = hashlib.sha256(json.dumps(user_profile, sort_keys=True).encode()).hexdigest()[:16] if user_profile else ""
+        
+        async def fetch_video(_):
             # Determine file extension based on content type or filename
             if "webm" in content_type.lower() or filename.lower().endswith(".webm"):
                 suffix = ".webm"
@@ -65,84 +98,182 @@ class VideoProcessorService:
             else:
                 suffix = ".mp4"
             
-            # Create temporary files for processing
+            # Stream the video from storage into a temporary file for processing
             with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_video:
-                temp_video.write(video_data["content"])
                 video_path = temp_video.name
-            
+            try:
+                await download_video_to_file(video_data, video_path)
+            except Exception:
+                os.unlink(video_path)
+                raise
             print(f"Processing video: {video_path}, content_type: {content_type}, filename: {filename}")
-            
-            # Extract audio from video
-            audio_path = await self.transcription_service.extract_audio_from_video(video_path, content_type)
-            
-            await self.update_job_status(job_id, "transcribing", 20, "Transcribing speech...")
-            
-            # Transcribe audio
-            transcription_result = await self.transcription_service.transcribe_audio(audio_path)
-            
+            return video_path
+        
+        async def probe(deps):
+            try:
+                media_probe = await self.probe_service.get_probe(video_data, deps["fetch_video"])
+            except Exception as e:
+                # Not fatal: extraction still runs without the hints (and the result is not cached)
+                print(f"Media probe failed: {str(e)}")
+                return {**MediaProbe().model_dump(), "error": str(e)}
+            return media_probe.model_dump()
+        
+        async def ingest(deps):
+            try:
+                media_probe = deps["probe"]
+                probed = not media_probe.get("error")
+                return await self.ingest_service.ingest(
+                    deps["fetch_video"],
+                    has_audio=media_probe["has_audio"] if probed else None,
+                    has_video=media_probe["has_video"] if probed else None
+                )
+            except Exception as e:
+                print(f"Single-pass ingest failed, falling back to separate extraction: {str(e)}")
+                return {"workdir": None, "audio_path": None, "frames": [], "frame_timestamps": []}
+        
+        async def extract_audio(deps):
+            audio_path = deps["ingest"]["audio_path"]
+            if not audio_path:
+                audio_path = await self.transcription_service.extract_audio_from_video(
+                    deps["fetch_video"], content_type, probe=MediaProbe(**deps["probe"])
+                )
+            # Opened once; every audio consumer shares its PCM mapping and derived features
+            return AudioArtifact(audio_path)
+        
+        async def transcribe(deps):
+            return await self.transcription_service.transcribe_audio(deps["extract_audio"])
+        
+        async def vocal_metrics(deps):
+            return await audio.analyze_vocal_metrics(deps["extract_audio"])
+        
+        def speech_metrics(deps):
+            transcription_result = deps["transcribe"]
             transcript = transcription_result["text"]
             words = transcription_result.get("words", [])
             duration = transcription_result.get("duration", 180)
             
-            await self.update_job_status(job_id, "audio_analysis", 35, "Analyzing speech patterns...")
-            
-            # Analyze audio metrics
-            speaking_rate_analysis = self.audio_service.analyze_speaking_rate(transcript, duration)
-            pauses_analysis = self.audio_service.detect_pauses(words)
-            filler_words_analysis = self.audio_service.detect_filler_words(transcript, words)
-            vocal_metrics_analysis = await self.audio_service.analyze_vocal_metrics(audio_path)
-            sentence_clarity_analysis = self.audio_service.analyze_sentence_clarity(transcript)
-            
-            communication_metrics = {
-                "speaking_rate": speaking_rate_analysis,
+            pauses_analysis = audio.detect_pauses(words)
+            sentence_clarity_analysis = audio.analyze_sentence_clarity(transcript)
+            return {
+                "speaking_rate": audio.analyze_speaking_rate(transcript, duration),
                 "pauses": {
                     "detected": pauses_analysis,
                     "count": len(pauses_analysis),
                     "average_gap": sum(p["duration"] for p in pauses_analysis) / len(pauses_analysis) if pauses_analysis else 0
                 },
-                "filler_words": filler_words_analysis,
-                "vocal_metrics": vocal_metrics_analysis,
+                "filler_words": audio.detect_filler_words(transcript, words),
                 "sentence_clarity": {
                     "analysis": sentence_clarity_analysis,
                     "total_sentences": len(sentence_clarity_analysis)
                 }
             }
+        
+        def extract_frames(deps):
+            if FRAME_SAMPLING_MODE == "keyframe":
+                return self.vision_service.extract_keyframes(deps["fetch_video"], duration=deps["probe"]["duration"])
+            if deps["ingest"]["frames"]:
+                return self.vision_service.sample_interval_frames(
+                    deps["ingest"]["frames"], timestamps=deps["ingest"]["frame_timestamps"]
+                )
+            return self.vision_service.sample_interval_frames(self.vision_service.extract_frames(deps["fetch_video"]))
+        
+        async def vision(deps):
+            sampled = deps["extract_frames"]
+            return await self.vision_service.analyze_presence(sampled["frames"], sampled["timestamps"])
+        
+        async def nlp_analysis(deps):
+            return await self.nlp_service.analyze_transcript(deps["transcribe"]["text"], user_profile)
+        
+        async def gravitas(deps):
+            if "nlp_analysis" in deps:
+                return deps["nlp_analysis"]["gravitas"]
+            return await self.nlp_service.analyze_gravitas(deps["transcribe"]["text"], user_profile)
+        
+        async def storytelling(deps):
+            if "nlp_analysis" in deps:
+                return deps["nlp_analysis"]["storytelling"]
+            return await self.nlp_service.analyze_storytelling(deps["transcribe"]["text"], user_profile)
+        
+        def scoring(deps):
+            communication_metrics = dict(deps["speech_metrics"])
+            communication_metrics["vocal_metrics"] = deps["vocal_metrics"]
+            scores = self._calculate_scores(
+                communication_metrics,
+                deps["vision"],
+                deps["gravitas"],
+                deps["storytelling"]
+            )
+            return {
+                "communication": communication_metrics,
+                "presence": deps["vision"],
+                "gravitas": deps["gravitas"],
+                "storytelling": deps["storytelling"],
+                "scores": scores
+            }
+        
+        async def coaching_tips(deps):
+            return await self.nlp_service.generate_coaching_tips(deps["scoring"])
+        
+        versions = STAGE_CACHE_VERSIONS
+        combined = NLP_ANALYSIS_MODE == "combined"
+        nlp_deps = ["nlp_analysis"] if combined else ["transcribe"]
+        nlp_stages = [
+            Stage("nlp_analysis", nlp_analysis, deps=["transcribe"], status="nlp_analysis", step="Analyzing transcript...",
+                  cache_version=versions["nlp_analysis"], cache_variant=profile_variant)
+        ] if combined else []
+        return StageGraph([
+            Stage("fetch_video", fetch_video, status="transcribing", step="Downloading video..."),
+            Stage("probe", probe, deps=["fetch_video"], status="transcribing", step="Reading video metadata...",
+                  cache_version=versions["probe"]),
+            Stage("ingest", ingest, deps=["fetch_video", "probe"], status="transcribing", step="Decoding video...", retries=0),
+            Stage("extract_audio", extract_audio, deps=["fetch_video", "probe", "ingest"], status="transcribing", step="Extracting audio..."),
+            Stage("extract_frames", extract_frames, deps=["fetch_video", "probe", "ingest"], status="video_analysis", step="Extracting video frames...",
+                  cache_version=versions["extract_frames"]),
+            Stage("transcribe", transcribe, deps=["extract_audio"], status="transcribing", step="Transcribing speech...",
+                  cache_version=versions["transcribe"]),
+            Stage("vocal_metrics", vocal_metrics, deps=["extract_audio"], status="audio_analysis", step="Analyzing vocal delivery...",
+                  cache_version=versions["vocal_metrics"], cache_variant="" if PITCH_ESTIMATOR == "piptrack" else PITCH_ESTIMATOR),
+            Stage("vision", vision, deps=["extract_frames"], status="video_analysis", step="Analyzing visual presence...",
+                  cache_version=versions["vision"], cache_variant="" if VISION_BACKEND == "openai" else VISION_BACKEND),
+            Stage("speech_metrics", speech_metrics, deps=["transcribe"], status="audio_analysis", step="Analyzing speech patterns..."),
+            *nlp_stages,
+            Stage("gravitas", gravitas, deps=nlp_deps, status="nlp_analysis", step="Analyzing leadership signals...",
+                  cache_version=versions["gravitas"], cache_variant=profile_variant),
+            Stage("storytelling", storytelling, deps=nlp_deps, status="nlp_analysis", step="Analyzing storytelling...",
+                  cache_version=versions["storytelling"], cache_variant=profile_variant),
+            Stage("scoring", scoring, deps=["speech_metrics", "vocal_metrics", "vision", "gravitas", "storytelling"],
+                  status="scoring", step="Calculating scores..."),
+            # Keyed by the scores it is given, so tips follow any change upstream (backends, failed stages)
+            Stage("coaching_tips", coaching_tips, deps=["scoring"], status="scoring", step="Generating coaching tips...",
+                  cache_version=versions["coaching_tips"], cache_by_inputs=True,
+                  fallback=lambda deps: self.nlp_service.default_tips()),
+        ], cache=get_analysis_cache(), content_hash=video_data.get("content_hash"),
+            outputs=["transcribe", "scoring", "coaching_tips"])
+    
+    async def process_video(self, job_id: str, video_id: str, user_id: str):
+        graph = None
+        try:
+            await self.update_job_status(job_id, "transcribing", 5, "Preparing video...")
             
-            await self.update_job_status(job_id, "video_analysis", 50, "Analyzing visual presence...")
-            
-            # Analyze visual presence
-            frames = self.vision_service.extract_frames(video_path)
-            presence_metrics = await self.vision_service.analyze_with_gpt4o(frames)
-            
-            await self.update_job_status(job_id, "nlp_analysis", 70, "Analyzing leadership signals...")
+            # Get video metadata from storage
+            video_data = await asyncio.to_thread(get_video_from_storage, video_id)
             
             # Get user profile (in a real implementation, this would come from the database)
             user_profile = {}
             
-            # Analyze gravitas and storytelling
-            gravitas_analysis = await self.nlp_service.analyze_gravitas(transcript, user_profile)
-            storytelling_analysis = await self.nlp_service.analyze_storytelling(transcript, user_profile)
-            
-            await self.update_job_status(job_id, "scoring", 85, "Calculating scores...")
+            graph = self._build_stage_graph(video_data, user_profile)
             
-            # Calculate scores
-            scores = self._calculate_scores(
-                communication_metrics,
-                presence_metrics,
-                gravitas_analysis,
-                storytelling_analysis
-            )
+            async def report_stage_start(stage, completed, total):
+                progress = 10 + round(75 * completed / total)
+                await self.update_job_status(job_id, stage.status, progress, stage.step)
             
-            all_metrics = {
-                "communication": communication_metrics,
-                "presence": presence_metrics,
-                "gravitas": gravitas_analysis,
-                "storytelling": storytelling_analysis,
-                "scores": scores
-            }
+            results = await graph.run(on_stage_start=report_stage_start)
+            print(f"Stage timings for job {job_id}: {graph.timings}")
             
-            # Generate coaching tips
-            coaching_tips = await self.nlp_service.generate_coaching_tips(all_metrics)
+            transcript = results["transcribe"]["text"]
+            all_metrics = results["scoring"]
+            scores = all_metrics["scores"]
+            coaching_tips = results["coaching_tips"]
             
             # Create report
             report_id = f"report_{uuid.uuid4().hex}"
@@ -165,22 +296,29 @@ class VideoProcessorService:
             # Save report to database
             from utils.supabase_client import get_supabase_client
             supabase = get_supabase_client()
-            supabase.table("reports").insert(report_doc).execute()
+            await asyncio.to_thread(lambda: supabase.table("reports").insert(report_doc).execute())
             
-            await self.update_job_status(job_id, "completed", 100, "Report generated", extra_fields={"report_id": report_id})
-            
-            # Clean up temporary files
-            os.unlink(video_path)
-            if os.path.exists(audio_path):
-                os.unlink(audio_path)
+            await self.update_job_status(
+                job_id, "completed", 100, "Report generated",
+                extra_fields={"report_id": report_id, "stage_timings": graph.timings}
+            )
             
             return report_id
             
         except Exception as e:
             print(f"Video processing failed: {str(e)}")
-            # Update job status to failed
-            await self.update_job_status(job_id, "failed", 0, f"Processing failed: {str(e)}")
+            # The worker releases the job through the queue, which decides between a retry and `failed`
             raise e
+        finally:
+            # Clean up temporary files
+            artifact = graph.results.get("extract_audio") if graph else None
+            if artifact:
+                artifact.close()
+            for path in (graph.results.get("fetch_video") if graph else None, artifact.path if artifact else None):
+                if path and os.path.exists(path):
+                    os.unlink(path)
+            if graph:
+                MediaIngestService.cleanup(graph.results.get("ingest"))
     
     def _calculate_scores(self, comm_metrics, presence_metrics, gravitas_analysis, storytelling_analysis):
         # Extract gravitas score from NLP analysis
@@ -219,10 +357,9 @@ class VideoProcessorService:
         # Extract storytelling score from analysis
         if storytelling_analysis.get("has_story", False):
             # If a story was detected, calculate based on story quality metrics
-            narrative_score = storytelling_analysis.get("narrative_structure", 80)
-            authenticity_score = storytelling_analysis.get("authenticity", 80)
-            concreteness_score = storytelling_analysis.get("concreteness", 80)
-            storytelling_score = (narrative_score + authenticity_score + concreteness_score) / 3
+            # The structured-output schema allows null scores; treat them like missing ones
+            story_metrics = [storytelling_analysis.get(key) for key in ("narrative_structure", "authenticity", "concreteness")]
+            storytelling_score = sum(80 if score is None else score for score in story_metrics) / 3
         else:
             # If no story detected, use a lower default score
             storytelling_score = 50
@@ -19,8 +19,8 @@ RETENTION_PERIODS = {
 }
 
 class VideoRetentionService:
-    def __init__(self, supabase=None):
-        self.supabase = supabase
+    def __init__(self, repository=None):
+        self.repository = repository
         self._cleanup_task = None
     
     async def set_video_retention(self, video_id: str, user_id: str, retention_period: str) -> dict:
@@ -29,7 +29,6 @@ class VideoRetentionService:
             raise ValueError(f"Invalid retention period. Choose from: {list(RETENTION_PERIODS.keys())}")
         
         try:
-            supabase_client = self.supabase()
             days = RETENTION_PERIODS[retention_period]
             delete_at = None
             if days is not None:
@@ -41,9 +40,9 @@ class VideoRetentionService:
                 "scheduled_deletion": delete_at
             }
             
-            response = supabase_client.table("videos").update(update_data).eq("id", video_id).eq("user_id", user_id).execute()
+            updated = await self.repository.update("videos", update_data, {"id": video_id, "user_id": user_id})
             
-            if not response.data:
+            if not updated:
                 raise Exception("Video not found or not owned by user")
             
             return {
@@ -59,12 +58,10 @@ class VideoRetentionService:
     async def get_user_retention_settings(self, user_id: str) -> dict:
         """Get user's retention settings"""
         try:
-            supabase_client = self.supabase()
-            
             # Get user's videos with retention info
-            response = supabase_client.table("videos").select("id,filename,uploaded_at,retention_policy,scheduled_deletion").eq("user_id", user_id).execute()
-            
-            videos = response.data if response.data else []
+            videos = await self.repository.select(
+                "videos", {"user_id": user_id}, columns="id,filename,uploaded_at,retention_policy,scheduled_deletion"
+            )
             
             # Get user's default retention setting (could be stored in a user_settings table)
             # For now, we'll use a default value
@@ -97,14 +94,14 @@ class VideoRetentionService:
             logger.error(f"Failed to set default retention: {str(e)}")
             raise Exception(f"Failed to set default retention: {str(e)}")
 
-def create_retention_router(supabase):
+def create_retention_router(repository):
     from fastapi import APIRouter, HTTPException, Cookie, Header
     from typing import Optional
     from utils.auth import get_current_user
     from pydantic import BaseModel
     
     router = APIRouter(prefix="/retention", tags=["retention"])
-    retention_service = VideoRetentionService(supabase)
+    retention_service = VideoRetentionService(repository)
     
     class RetentionPolicyUpdate(BaseModel):
         retention_period: str
@@ -1,22 +1,75 @@
 import cv2
+import json
 import numpy as np
 import base64
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import asyncio
-import openai
 from dotenv import load_dotenv
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
+from utils.openai_client import chat_completion
+
+# "keyframe" seeks straight to the frames that are sent to GPT-4o;
+# "interval" decodes sequentially and keeps every Nth frame (legacy)
+FRAME_SAMPLING_MODE = os.getenv("FRAME_SAMPLING_MODE", "keyframe").lower()
+# Adaptive frame budget: one frame per VISION_SECONDS_PER_FRAME of video, plus
+# one extra frame between sampled frames that straddle a scene change
+VISION_SECONDS_PER_FRAME = float(os.getenv("VISION_SECONDS_PER_FRAME", "12"))
+VISION_MIN_FRAMES = 5
+VISION_MAX_FRAMES = int(os.getenv("VISION_MAX_FRAMES", "40"))
+SCENE_CHANGE_THRESHOLD = 0.12
+# Frames per GPT-4o request, and how many requests run at once
+VISION_WINDOW_FRAMES = 6
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "4"))
+FIRST_IMPRESSION_SECONDS = 10.0
+FIRST_IMPRESSION_FRAMES = 2
+# Targets closer than this are reached with grab() instead of a seek
+SEEK_THRESHOLD_FRAMES = 30
+# openai (GPT-4o) or local (OpenCV, see vision_local); VISION_FALLBACK_LOCAL scores
+# locally when every GPT-4o request fails instead of reporting zeros
+VISION_BACKEND = os.getenv("VISION_BACKEND", "openai").lower()
+VISION_FALLBACK_LOCAL = os.getenv("VISION_FALLBACK_LOCAL", "true").lower() == "true"
+# "low" detail images are scaled to fit 512x512 and cost a fixed 85 tokens each
+MAX_FRAME_SIDE = 512
+
 class VisionAnalysisService:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+        if not api_key and VISION_BACKEND == "openai":
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.client = openai.OpenAI(api_key=api_key)
+    
+    async def analyze_presence(self, frames: List[str], timestamps: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Presence metrics from the configured backend"""
+        if VISION_BACKEND == "local":
+            return await self._analyze_locally(frames, timestamps)
+        
+        result = await self.analyze_with_gpt4o(frames, timestamps)
+        if result.get("error") and VISION_FALLBACK_LOCAL and frames:
+            print(f"GPT-4o vision failed ({result['error']}), scoring presence locally")
+            local_result = await self._analyze_locally(frames, timestamps)
+            if not local_result.get("error"):
+                # Marks the result as not cacheable under the openai variant
+                local_result["fallback_reason"] = result["error"]
+                return local_result
+        return result
+    
+    async def _analyze_locally(self, frames: List[str], timestamps: Optional[List[float]]) -> Dict[str, Any]:
+        from services.vision_local import get_local_vision_engine
+        try:
+            return await asyncio.to_thread(get_local_vision_engine().analyze, frames, timestamps)
+        except Exception as e:
+            return {
+                "posture_score": 0,
+                "eye_contact_ratio": 0,
+                "facial_expressions": {"neutral": 0, "positive": 0, "negative": 0},
+                "gesture_rate": 0,
+                "first_impression_score": 0,
+                "error": str(e)
+            }
     
     def extract_frames(self, video_path: str, fps: int = 2) -> List[str]:
         cap = cv2.VideoCapture(video_path)
@@ -49,75 +102,239 @@ class VisionAnalysisService:
         cap.release()
         return frames_base64
     
-    async def analyze_with_gpt4o(self, frames: List[str]) -> Dict[str, Any]:
-        sample_frames = frames[::max(1, len(frames) // 10)][:10]
+    @staticmethod
+    def frame_budget(duration: float) -> int:
+        return int(min(VISION_MAX_FRAMES, max(VISION_MIN_FRAMES, round(duration / VISION_SECONDS_PER_FRAME))))
+    
+    @staticmethod
+    def sample_timestamps(duration: float, count: int) -> List[float]:
+        """Target timestamps (seconds): a few frames inside the first-impression
+        window, the rest spread uniformly over the remainder of the video"""
+        if duration <= 0 or count <= 0:
+            return []
         
-        analysis_prompt = """Analyze this executive's presence in these video frames. Provide scores (0-100) for:
+        window = min(FIRST_IMPRESSION_SECONDS, duration)
+        first_count = min(FIRST_IMPRESSION_FRAMES, count)
+        timestamps = [window * (i + 0.5) / first_count for i in range(first_count)]
+        
+        remaining = count - first_count
+        if remaining and duration > window:
+            span = duration - window
+            timestamps.extend(window + span * (i + 0.5) / remaining for i in range(remaining))
+        elif remaining:
+            # Short video: spread every frame over the whole clip instead
+            timestamps = [duration * (i + 0.5) / count for i in range(count)]
+        
+        return [round(t, 3) for t in timestamps]
+    
+    @staticmethod
+    def _encode_frame(frame) -> str:
+        height, width = frame.shape[:2]
+        scale = MAX_FRAME_SIDE / max(height, width)
+        if scale < 1:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        return base64.b64encode(buffer).decode('utf-8')
+    
+    @staticmethod
+    def _thumbnail(frame) -> np.ndarray:
+        """Tiny grayscale copy used to measure how much consecutive frames differ"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (32, 18), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+    
+    def _read_frames(self, cap, timestamps: List[float], video_fps: float, frame_total: float) -> Dict[float, tuple]:
+        """{timestamp: (base64 JPEG, thumbnail)} for the frames that could be read"""
+        frames = {}
+        position = None  # unknown until the first seek
+        for timestamp in sorted(timestamps):
+            target = int(timestamp * video_fps)
+            if frame_total > 0:
+                target = min(target, int(frame_total) - 1)
+            
+            if position is None or target < position or target - position > SEEK_THRESHOLD_FRAMES:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            else:
+                while position < target and cap.grab():
+                    position += 1
+            
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            position = target + 1
+            # Encode right away so only one decoded frame is held at a time
+            frames[timestamp] = (self._encode_frame(frame), self._thumbnail(frame))
+        return frames
+    
+    def extract_keyframes(self, video_path: str, duration: float = None) -> Dict[str, Any]:
+        """Decode only the frames that are analysed and return exactly those.
+        
+        The duration sets the base frame count; wherever two consecutive
+        sampled frames differ strongly (a scene change) a frame between them
+        is added, up to VISION_MAX_FRAMES. Distant targets are reached with a
+        container seek, nearby ones with grab().
+        
+        Returns {"frames": [base64 JPEG], "timestamps": [seconds], "scene_changes": int}.
+        """
+        cap = cv2.VideoCapture(video_path)
+        try:
+            video_fps = cap.get(cv2.CAP_PROP_FPS)
+            if video_fps <= 0:
+                video_fps = 30  # Default to 30 fps if detection fails
+            
+            frame_total = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            if not duration and frame_total > 0:
+                duration = frame_total / video_fps
+            if not duration:
+                # Containers without an index (e.g. some WebM recordings) report no length
+                cap.release()
+                return self.sample_interval_frames(self.extract_frames(video_path), fps=2)
+            
+            frames = self._read_frames(cap, self.sample_timestamps(duration, self.frame_budget(duration)),
+                                       video_fps, frame_total)
+            
+            timestamps = sorted(frames)
+            thumbnails = np.stack([frames[t][1] for t in timestamps]) if timestamps else np.empty((0, 18, 32))
+            differences = np.abs(np.diff(thumbnails, axis=0)).mean(axis=(1, 2))
+            scene_changes = np.flatnonzero(differences > SCENE_CHANGE_THRESHOLD)
+            
+            extra_budget = VISION_MAX_FRAMES - len(timestamps)
+            if extra_budget > 0 and scene_changes.size:
+                # Refine around the strongest changes first
+                strongest = scene_changes[np.argsort(differences[scene_changes])[::-1][:extra_budget]]
+                midpoints = [round((timestamps[i] + timestamps[i + 1]) / 2, 3) for i in strongest]
+                frames.update(self._read_frames(cap, midpoints, video_fps, frame_total))
+            
+            timestamps = sorted(frames)
+            return {
+                "frames": [frames[t][0] for t in timestamps],
+                "timestamps": timestamps,
+                "scene_changes": int(scene_changes.size)
+            }
+        finally:
+            cap.release()
+    
+    def sample_interval_frames(self, frames: List[str], fps: float = 2, timestamps: List[float] = None) -> Dict[str, Any]:
+        """Evenly thin frames sampled at a fixed rate down to the duration-based budget"""
+        timestamps = timestamps or [round(i / fps, 3) for i in range(len(frames))]
+        duration = timestamps[-1] + 1 / fps if timestamps else 0
+        step = max(1, len(frames) // self.frame_budget(duration)) if frames else 1
+        return {"frames": frames[::step], "timestamps": timestamps[::step], "scene_changes": 0}
+    
+    @staticmethod
+    def _format_time(seconds: float) -> str:
+        return f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+    
+    async def _analyze_window(self, frames: List[str], timestamps: List[float], include_first_impression: bool) -> Dict[str, Any]:
+        times = ", ".join(self._format_time(t) for t in timestamps)
+        first_impression = (
+            '\n5. **First Impression**: Score (0-100) for the first 7-10 seconds of the video'
+            if include_first_impression else ""
+        )
+        analysis_prompt = f"""Analyze this executive's presence in these video frames, taken at {times} (m:ss). Provide scores (0-100) for:
         
 1. **Posture**: Percentage of frames with upright, open posture
 2. **Eye Contact**: Estimated ratio looking at camera (0.0-1.0)
 3. **Facial Expressions**: Breakdown of neutral/positive/negative (%)
-4. **Gesture Rate**: Average gestures per minute
-5. **First Impression**: Score for first 7-10 seconds
+4. **Gesture Rate**: Estimated gestures per minute{first_impression}
 
 Provide response as JSON:
-{
+{{
   "posture_score": float,
   "eye_contact_ratio": float,
-  "facial_expressions": {"neutral": float, "positive": float, "negative": float},
-  "gesture_rate": float,
-  "first_impression_score": float,
+  "facial_expressions": {{"neutral": float, "positive": float, "negative": float}},
+  "gesture_rate": float,{chr(10) + '  "first_impression_score": float,' if include_first_impression else ""}
   "notes": "Brief observation"
-}"""
-        
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": analysis_prompt}
-                ]
-            }
-        ]
+}}"""
         
-        for idx, frame in enumerate(sample_frames[:5]):
-            messages[0]["content"].append({
+        content = [{"type": "text", "text": analysis_prompt}]
+        for frame in frames:
+            content.append({
                 "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{frame}"
-                }
+                "image_url": {"url": f"data:image/jpeg;base64,{frame}", "detail": "low"}
             })
         
-        try:
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model="gpt-4o",
-                messages=messages,
-                max_tokens=500
-            )
-            
-            import json
-            result_text = response.choices[0].message.content
-            
-            json_start = result_text.find('{')
-            json_end = result_text.rfind('}') + 1
-            if json_start != -1 and json_end != 0:
-                result = json.loads(result_text[json_start:json_end])
-            else:
-                result = {
-                    "posture_score": 70.0,
-                    "eye_contact_ratio": 0.6,
-                    "facial_expressions": {"neutral": 50.0, "positive": 40.0, "negative": 10.0},
-                    "gesture_rate": 5.0,
-                    "first_impression_score": 70.0
-                }
-            
-            return result
-        except Exception as e:
+        response = await chat_completion(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
+            max_tokens=300
+        )
+        result = json.loads(response.choices[0].message.content)
+        result["start"] = timestamps[0]
+        result["end"] = timestamps[-1]
+        result["frame_count"] = len(frames)
+        return result
+    
+    @staticmethod
+    def _aggregate_windows(windows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Frame-weighted averages of the per-window scores, in the presence_metrics shape"""
+        weights = np.array([w["frame_count"] for w in windows], dtype=float)
+        
+        def average(values):
+            values = np.array([float(v or 0) for v in values])
+            return float(np.average(values, weights=weights))
+        
+        expressions = {
+            key: round(average(w.get("facial_expressions", {}).get(key, 0) for w in windows), 1)
+            for key in ("neutral", "positive", "negative")
+        }
+        opening = [w for w in windows if w.get("first_impression_score") is not None]
+        
+        return {
+            "posture_score": round(average(w.get("posture_score") for w in windows), 1),
+            "eye_contact_ratio": round(average(w.get("eye_contact_ratio") for w in windows), 3),
+            "facial_expressions": expressions,
+            "gesture_rate": round(average(w.get("gesture_rate") for w in windows), 1),
+            # Only the opening window is asked for it; None if that window failed
+            "first_impression_score": round(float(opening[0]["first_impression_score"]), 1) if opening else None,
+            "notes": " ".join(w["notes"] for w in windows if w.get("notes"))[:1000],
+            "windows": [
+                {key: w.get(key) for key in ("start", "end", "frame_count", "posture_score", "eye_contact_ratio",
+                                             "facial_expressions", "gesture_rate")}
+                for w in windows
+            ],
+            "frames_analyzed": int(weights.sum())
+        }
+    
+    async def analyze_with_gpt4o(self, frames: List[str], timestamps: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Score presence over every sampled frame.
+        
+        Frames are sent at low detail in windows of VISION_WINDOW_FRAMES, with
+        up to VISION_CONCURRENCY requests in flight; the per-window scores
+        (kept under "windows" with their timestamps) are averaged into the
+        presence metrics.
+        """
+        timestamps = timestamps or [float(i) for i in range(len(frames))]
+        windows = [
+            (frames[i:i + VISION_WINDOW_FRAMES], timestamps[i:i + VISION_WINDOW_FRAMES])
+            for i in range(0, len(frames), VISION_WINDOW_FRAMES)
+        ]
+        semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+        
+        async def run_window(index: int, window_frames: List[str], window_times: List[float]):
+            async with semaphore:
+                return await self._analyze_window(window_frames, window_times, include_first_impression=index == 0)
+        
+        outcomes = await asyncio.gather(
+            *(run_window(i, f, t) for i, (f, t) in enumerate(windows)), return_exceptions=True
+        )
+        succeeded = [o for o in outcomes if isinstance(o, dict)]
+        failed = [o for o in outcomes if isinstance(o, BaseException)]
+        for error in failed:
+            print(f"Vision window failed: {str(error)}")
+        
+        if not succeeded:
             return {
                 "posture_score": 0,
                 "eye_contact_ratio": 0,
                 "facial_expressions": {"neutral": 0, "positive": 0, "negative": 0},
                 "gesture_rate": 0,
                 "first_impression_score": 0,
-                "error": str(e)
-            }
\ No newline at end of file
+                "error": str(failed[0]) if failed else "No frames to analyze"
+            }
+        
+        result = self._aggregate_windows(succeeded)
+        if failed:
+            # Partial results are not cached (see DEGRADED_RESULT_KEYS)
+            result["failed_windows"] = len(failed)
+        return result
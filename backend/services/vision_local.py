@@ -0,0 +1,156 @@
+"""
+Local Vision Engine
+Deterministic presence metrics computed on the box with OpenCV, as an
+alternative (or fallback) to GPT-4o scoring. Works on the sampled frames:
+
+- face / eye / smile detection with the Haar cascades bundled with OpenCV
+- head pose from the frontal/profile detections and the eye-line angle
+- motion energy outside the face region for gesture rate
+
+Frames are decoded once into a stacked grayscale batch; motion energy is
+computed for the whole batch at once.
+"""
+import base64
+import threading
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+FIRST_IMPRESSION_SECONDS = 10.0
+ANALYSIS_WIDTH = 320
+# Head tilt beyond this (degrees, from the eye line) no longer counts as upright
+MAX_UPRIGHT_TILT = 12.0
+# Mean absolute change (0-1) of the body region between frames that counts as a gesture
+GESTURE_MOTION_THRESHOLD = 0.06
+
+
+class LocalVisionEngine:
+    def __init__(self):
+        cascades = cv2.data.haarcascades
+        self.face_cascade = cv2.CascadeClassifier(cascades + "haarcascade_frontalface_default.xml")
+        self.profile_cascade = cv2.CascadeClassifier(cascades + "haarcascade_profileface.xml")
+        self.eye_cascade = cv2.CascadeClassifier(cascades + "haarcascade_eye.xml")
+        self.smile_cascade = cv2.CascadeClassifier(cascades + "haarcascade_smile.xml")
+        # Cascade classifiers are not safe to share between threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _decode(frames: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """Base64 JPEGs -> (n, h, w) uint8 grayscale batch at ANALYSIS_WIDTH, and the
+        index in `frames` of each decoded frame (undecodable ones are skipped)"""
+        decoded, kept = [], []
+        for index, frame in enumerate(frames):
+            image = cv2.imdecode(np.frombuffer(base64.b64decode(frame), np.uint8), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            height = int(image.shape[0] * ANALYSIS_WIDTH / image.shape[1])
+            decoded.append(cv2.resize(image, (ANALYSIS_WIDTH, height), interpolation=cv2.INTER_AREA))
+            kept.append(index)
+        if not decoded:
+            return np.empty((0, 0, 0), dtype=np.uint8), kept
+        # Frames of one video share a size; guard against odd ones anyway
+        height = decoded[0].shape[0]
+        return np.stack([image if image.shape[0] == height else cv2.resize(image, (ANALYSIS_WIDTH, height))
+                         for image in decoded]), kept
+
+    def _frame_features(self, gray: np.ndarray) -> Dict[str, Any]:
+        height, width = gray.shape
+        gray = cv2.equalizeHist(gray)
+        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(width // 12, width // 12))
+
+        if len(faces) == 0:
+            profiles = self.profile_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+            return {"face": None, "frontal": False, "profile": len(profiles) > 0, "tilt": None, "smile": False}
+
+        x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+        face = gray[y:y + h, x:x + w]
+
+        tilt = None
+        eyes = self.eye_cascade.detectMultiScale(face[:h // 2], scaleFactor=1.1, minNeighbors=6)
+        if len(eyes) >= 2:
+            (ex1, ey1, ew1, eh1), (ex2, ey2, ew2, eh2) = sorted(eyes, key=lambda e: e[2] * e[3])[-2:]
+            dx = (ex2 + ew2 / 2) - (ex1 + ew1 / 2)
+            dy = (ey2 + eh2 / 2) - (ey1 + eh1 / 2)
+            if dx:
+                angle = np.degrees(np.arctan2(dy, dx))
+                tilt = float(abs(angle if abs(angle) <= 90 else 180 - abs(angle)))
+
+        smiles = self.smile_cascade.detectMultiScale(face[h // 2:], scaleFactor=1.7, minNeighbors=22)
+
+        return {
+            "face": (x / width, y / height, w / width, h / height),
+            "frontal": True,
+            "profile": False,
+            "tilt": tilt,
+            "eyes": len(eyes),
+            "smile": len(smiles) > 0
+        }
+
+    @staticmethod
+    def _motion_energy(batch: np.ndarray, features: List[Dict[str, Any]]) -> np.ndarray:
+        """Mean absolute change between consecutive frames outside the face box, per frame pair"""
+        if len(batch) < 2:
+            return np.zeros(0)
+        small = batch[:, ::4, ::4].astype(np.float32) / 255.0
+        mask = np.ones_like(small)
+        h, w = small.shape[1:]
+        for index, feature in enumerate(features):
+            if feature["face"]:
+                fx, fy, fw, fh = feature["face"]
+                mask[index, int(fy * h):int((fy + fh) * h), int(fx * w):int((fx + fw) * w)] = 0
+        # Only pixels outside the face in both frames count as body movement
+        pair_mask = mask[1:] * mask[:-1]
+        change = np.abs(np.diff(small, axis=0)) * pair_mask
+        return change.sum(axis=(1, 2)) / np.maximum(pair_mask.sum(axis=(1, 2)), 1)
+
+    def analyze(self, frames: List[str], timestamps: Optional[List[float]] = None) -> Dict[str, Any]:
+        batch, kept = self._decode(frames)
+        if len(batch) == 0:
+            raise ValueError("No decodable frames")
+        # Keep each decoded frame's own timestamp, not the first len(batch) of them
+        timestamps = [timestamps[index] for index in kept] if timestamps else [float(index) for index in kept]
+        with self._lock:
+            features = [self._frame_features(gray) for gray in batch]
+
+        frontal = np.array([f["frontal"] for f in features])
+        centered = np.array([f["face"] is not None and abs(f["face"][0] + f["face"][2] / 2 - 0.5) < 0.2
+                             for f in features])
+        # Head level and in the upper part of the frame
+        upright = np.array([
+            f["frontal"] and (f["tilt"] is None or f["tilt"] <= MAX_UPRIGHT_TILT) and f["face"][1] + f["face"][3] / 2 < 0.55
+            for f in features
+        ])
+        eye_contact = frontal & centered & np.array([f.get("eyes", 0) >= 1 for f in features])
+        smiles = np.array([f["smile"] for f in features])
+
+        motion = self._motion_energy(batch, features)
+        gestures = int((motion > GESTURE_MOTION_THRESHOLD).sum())
+        span_minutes = max((timestamps[-1] - timestamps[0]) / 60.0, 1 / 60.0) if len(timestamps) > 1 else 1.0
+
+        per_frame = 100 * (0.5 * upright + 0.3 * eye_contact + 0.2 * smiles)
+        opening = np.array(timestamps) < FIRST_IMPRESSION_SECONDS
+        first_impression = per_frame[opening].mean() if opening.any() else per_frame[:2].mean()
+
+        positive = 100 * smiles.mean()
+        return {
+            "posture_score": round(float(100 * upright.mean()), 1),
+            "eye_contact_ratio": round(float(eye_contact.mean()), 3),
+            "facial_expressions": {"neutral": round(100 - positive, 1), "positive": round(positive, 1), "negative": 0.0},
+            "gesture_rate": round(gestures / span_minutes, 1),
+            "first_impression_score": round(float(first_impression), 1),
+            "notes": f"Face visible in {int(frontal.sum())}/{len(batch)} frames, profile in "
+                     f"{sum(f['profile'] for f in features)}; computed locally",
+            "frames_analyzed": len(batch),
+            "engine": "local"
+        }
+
+
+_engine: Optional[LocalVisionEngine] = None
+
+
+def get_local_vision_engine() -> LocalVisionEngine:
+    """Cascades are loaded once per process"""
+    global _engine
+    if _engine is None:
+        _engine = LocalVisionEngine()
+    return _engine
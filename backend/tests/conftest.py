@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import backend modules the way the server does (`from services...`)
+sys.path.insert(0, str(Path(__file__).parent.parent))
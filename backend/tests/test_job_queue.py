@@ -0,0 +1,140 @@
+"""SQLiteJobQueue leasing, heartbeats, retries and lease recovery"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from services.job_queue import QUEUE_DEAD, QUEUE_DONE, QUEUE_LEASED, QUEUE_QUEUED, SQLiteJobQueue, _now
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=2)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def expire_lease(queue, job_id):
+    await queue.update_job(job_id, {"lease_expires_at": (_now() - timedelta(seconds=1)).isoformat()})
+
+
+def test_claim_leases_the_oldest_job_once(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.enqueue("job-2", "user", "video-2")
+        first = await queue.claim("worker-a")
+        second = await queue.claim("worker-b")
+        return first, second, await queue.claim("worker-c")
+
+    first, second, third = run(scenario())
+    assert (first["id"], first["lease_owner"], first["attempts"]) == ("job-1", "worker-a", 1)
+    assert first["queue_state"] == QUEUE_LEASED
+    assert second["id"] == "job-2"
+    assert third is None
+
+
+def test_heartbeat_fails_once_the_lease_is_lost(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.claim("worker-a")
+        extended = await queue.heartbeat("job-1", "worker-a")
+        await expire_lease(queue, "job-1")
+        reclaimed = await queue.claim("worker-b")
+        return extended, reclaimed, await queue.heartbeat("job-1", "worker-a"), await queue.heartbeat("job-1", "worker-b")
+
+    extended, reclaimed, old_owner, new_owner = run(scenario())
+    assert extended is True
+    assert reclaimed["lease_owner"] == "worker-b"
+    assert old_owner is False
+    assert new_owner is True
+
+
+def test_fail_requeues_until_max_attempts_then_dead_letters(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.claim("worker-a")
+        requeued = await queue.fail("job-1", "worker-a", "ffmpeg crashed")
+        retry = await queue.get_job("job-1")
+        await queue.claim("worker-a")
+        dead_lettered = await queue.fail("job-1", "worker-a", "ffmpeg crashed again")
+        return requeued, retry, dead_lettered, await queue.get_job("job-1")
+
+    requeued, retry, dead_lettered, dead = run(scenario())
+    assert requeued is True
+    assert (retry["queue_state"], retry["status"], retry["lease_owner"]) == (QUEUE_QUEUED, "pending", None)
+    assert dead_lettered is False
+    assert (dead["queue_state"], dead["status"], dead["last_error"]) == (QUEUE_DEAD, "failed", "ffmpeg crashed again")
+
+
+def test_fail_from_a_worker_that_lost_the_lease_is_ignored(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.claim("worker-a")
+        await expire_lease(queue, "job-1")
+        await queue.claim("worker-b")
+        return await queue.fail("job-1", "worker-a", "late failure"), await queue.get_job("job-1")
+
+    requeued, job = run(scenario())
+    assert requeued is False
+    assert (job["queue_state"], job["lease_owner"], job["last_error"]) == (QUEUE_LEASED, "worker-b", None)
+
+
+def test_expired_lease_is_reclaimed_then_dead_lettered_after_max_attempts(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.claim("worker-a")
+        await expire_lease(queue, "job-1")
+        reclaimed = await queue.claim("worker-b")
+        await expire_lease(queue, "job-1")
+        return reclaimed, await queue.claim("worker-c"), await queue.get_job("job-1")
+
+    reclaimed, exhausted, job = run(scenario())
+    assert (reclaimed["lease_owner"], reclaimed["attempts"]) == ("worker-b", 2)
+    assert exhausted is None
+    assert (job["queue_state"], job["last_error"]) == (QUEUE_DEAD, "Worker lease expired")
+
+
+def test_complete_only_by_the_lease_owner(queue):
+    async def scenario():
+        await queue.enqueue("job-1", "user", "video-1")
+        await queue.claim("worker-a")
+        await queue.complete("job-1", "worker-b")
+        not_completed = await queue.get_job("job-1")
+        await queue.complete("job-1", "worker-a")
+        return not_completed, await queue.get_job("job-1")
+
+    not_completed, completed = run(scenario())
+    assert not_completed["queue_state"] == QUEUE_LEASED
+    assert (completed["queue_state"], completed["lease_owner"]) == (QUEUE_DONE, None)
+
+
+def test_worker_cancels_the_job_when_its_heartbeat_loses_the_lease(queue):
+    pytest.importorskip("dotenv")
+    from worker import JobWorker
+
+    class SlowProcessor:
+        cancelled = False
+
+        async def process_video(self, job_id, video_id, user_id):
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                SlowProcessor.cancelled = True
+                raise
+
+    async def scenario():
+        queue.lease_seconds = 1
+        await queue.enqueue("job-1", "user", "video-1")
+        worker = JobWorker(queue, worker_id="worker-a")
+        worker._processor = SlowProcessor()
+        job = await queue.claim("worker-a")
+        await expire_lease(queue, "job-1")
+        await queue.claim("worker-b")
+        await asyncio.wait_for(worker.process_job(job), timeout=10)
+        return await queue.get_job("job-1")
+
+    job = run(scenario())
+    assert SlowProcessor.cancelled
+    assert (job["queue_state"], job["lease_owner"]) == (QUEUE_LEASED, "worker-b")
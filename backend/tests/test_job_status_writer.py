@@ -0,0 +1,85 @@
+"""JobStatusWriter coalescing and terminal writes"""
+import asyncio
+
+import pytest
+
+from services.job_status_writer import JobStatusWriter
+
+
+class FakeQueue:
+    def __init__(self, failures=0):
+        self.writes = []
+        self.failures = failures
+
+    async def update_job(self, job_id, fields):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.writes.append((job_id, dict(fields)))
+        return True
+
+
+def test_progress_is_coalesced_per_flush():
+    async def scenario():
+        queue = FakeQueue()
+        writer = JobStatusWriter(queue, flush_seconds=0.05)
+        for step in range(7):
+            writer.update("job", {"status": "transcribing", "progress": step * 10, "current_step": f"step {step}"})
+        writer.update("other", {"progress": 5})
+        await asyncio.sleep(0.1)
+        await writer.close()
+        return queue.writes
+
+    writes = asyncio.run(scenario())
+    assert sorted(writes, key=lambda w: w[0]) == [
+        ("job", {"status": "transcribing", "progress": 60, "current_step": "step 6"}),
+        ("other", {"progress": 5}),
+    ]
+
+
+def test_terminal_write_merges_pending_progress():
+    async def scenario():
+        queue = FakeQueue()
+        writer = JobStatusWriter(queue, flush_seconds=60)
+        writer.update("job", {"progress": 80, "stage": "scoring"})
+        await writer.write("job", {"status": "completed", "progress": 100, "report_id": "r1"})
+        await writer.close()
+        return queue.writes
+
+    assert asyncio.run(scenario()) == [
+        ("job", {"progress": 100, "stage": "scoring", "status": "completed", "report_id": "r1"})
+    ]
+
+
+def test_terminal_write_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    queue = FakeQueue(failures=2)
+    assert asyncio.run(JobStatusWriter(queue).write("job", {"status": "completed"})) is True
+    assert queue.writes == [("job", {"status": "completed"})]
+
+
+def test_terminal_write_failure_propagates(monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    queue = FakeQueue(failures=100)
+    with pytest.raises(ConnectionError):
+        asyncio.run(JobStatusWriter(queue).write("job", {"status": "completed"}))
+    assert queue.writes == []
+
+
+def test_discard_drops_unwritten_progress():
+    async def scenario():
+        queue = FakeQueue()
+        writer = JobStatusWriter(queue, flush_seconds=60)
+        writer.update("job", {"progress": 40})
+        await writer.discard("job")
+        await writer.close()
+        return queue.writes
+
+    assert asyncio.run(scenario()) == []
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _no_sleep(seconds):
+    await _real_sleep(0)
@@ -0,0 +1,48 @@
+"""Per-process metric files: deferred writes and retiring exited processes"""
+import json
+import os
+
+import pytest
+
+from utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_dirty", False)
+    return tmp_path
+
+
+def write_counter_file(directory, pid, value):
+    rows = [{"name": "jobs_total", "labels": {"outcome": "done"}, "value": value}]
+    (directory / f"{pid}.json").write_text(json.dumps({"descriptions": {}, "counters": rows}))
+
+
+def dead_pid():
+    pid = 2 ** 22 - 1
+    while metrics._pid_alive(pid):
+        pid -= 1
+    return pid
+
+
+def test_increment_defers_the_write_until_flush(metrics_dir):
+    metrics.increment("jobs_total", outcome="done")
+    assert not (metrics_dir / f"{os.getpid()}.json").exists()
+
+    metrics.flush()
+    data = json.loads((metrics_dir / f"{os.getpid()}.json").read_text())
+    assert data["counters"] == [{"name": "jobs_total", "labels": {"outcome": "done"}, "value": 1}]
+
+
+def test_exited_processes_are_folded_into_retired_totals(metrics_dir):
+    write_counter_file(metrics_dir, dead_pid(), 3)
+    metrics.increment("jobs_total", outcome="done")
+
+    assert 'jobs_total{outcome="done"} 4' in metrics.render_prometheus()
+    assert sorted(p.name for p in metrics_dir.glob("*.json")) == sorted([metrics.RETIRED_FILE, f"{os.getpid()}.json"])
+
+    # A later process exiting adds to the retired totals instead of replacing them
+    write_counter_file(metrics_dir, dead_pid(), 2)
+    assert 'jobs_total{outcome="done"} 6' in metrics.render_prometheus()
@@ -0,0 +1,114 @@
+"""Signed session tokens: signing, key rotation, expiry, tampering and revocation"""
+import asyncio
+import time
+
+import pytest
+
+import services.repository as repository
+import utils.session_tokens as session_tokens
+from utils.session_tokens import (
+    RevocationList, decode_session_token, issue_session_token, is_signed_token, revoke_session_token,
+    verify_session_token
+)
+
+USER = {"user_id": "user-1", "email": "ada@example.com", "name": "Ada", "picture": None, "created_at": "2026-01-01"}
+
+
+class FakeRepository:
+    def __init__(self, fail=False):
+        self.revoked = {}
+        self.fail = fail
+
+    async def rpc(self, function, params):
+        assert function == "get_revoked_sessions"
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return [{"jti": jti} for jti in self.revoked]
+
+    async def upsert(self, table, row, on_conflict="id"):
+        assert table == "revoked_sessions" and on_conflict == "jti"
+        self.revoked[row["jti"]] = row["expires_at"]
+        return row
+
+
+def use_keys(monkeypatch, spec):
+    keys = session_tokens._parse_keys(spec)
+    monkeypatch.setattr(session_tokens, "_keys", keys)
+    monkeypatch.setattr(session_tokens, "_active_kid", next(iter(keys)))
+
+
+@pytest.fixture(autouse=True)
+def signing_setup(monkeypatch):
+    use_keys(monkeypatch, "k1:first-secret")
+    fake = FakeRepository()
+    monkeypatch.setattr(repository, "_repository", fake)
+    monkeypatch.setattr(session_tokens, "_revocation_list", RevocationList(refresh_seconds=60))
+    return fake
+
+
+def test_signed_token_round_trip():
+    token, expires_at = issue_session_token(USER)
+    assert is_signed_token(token) and token.startswith("v1.k1.")
+    payload = decode_session_token(token)
+    assert payload["sub"] == "user-1" and payload["exp"] == int(expires_at.timestamp())
+    assert asyncio.run(verify_session_token(token)) == USER
+
+
+def test_rotation_keeps_old_tokens_valid_until_their_key_is_dropped(monkeypatch):
+    old_token, _ = issue_session_token(USER)
+
+    use_keys(monkeypatch, "k2:second-secret,k1:first-secret")
+    new_token, _ = issue_session_token(USER)
+    assert new_token.startswith("v1.k2.")
+    assert decode_session_token(old_token) is not None
+    assert decode_session_token(new_token) is not None
+
+    use_keys(monkeypatch, "k2:second-secret")
+    assert decode_session_token(old_token) is None
+    assert decode_session_token(new_token) is not None
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token, _ = issue_session_token(USER)
+    monkeypatch.setattr(time, "time", lambda: 4_000_000_000)
+    assert decode_session_token(token) is None
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda t: t[:-2] + ("AA" if not t.endswith("AA") else "BB"),
+    lambda t: ".".join([*t.split(".")[:2], session_tokens._b64encode(b'{"sub":"admin","exp":4000000000}'),
+                        t.split(".")[3]]),
+    lambda t: t.replace("v1.k1.", "v1.k9.", 1),
+    lambda t: t.rsplit(".", 1)[0],
+])
+def test_tampered_token_is_rejected(tamper):
+    token, _ = issue_session_token(USER)
+    assert decode_session_token(tamper(token)) is None
+    assert asyncio.run(verify_session_token(tamper(token))) is None
+
+
+def test_revoked_token_is_rejected_here_and_after_refresh(signing_setup):
+    token, _ = issue_session_token(USER)
+    asyncio.run(revoke_session_token(token))
+    assert asyncio.run(verify_session_token(token)) is None
+    assert decode_session_token(token)["jti"] in signing_setup.revoked
+
+    # Another process learns about it from the stored list
+    fresh = RevocationList(refresh_seconds=60)
+    assert asyncio.run(fresh.is_revoked(decode_session_token(token)["jti"])) is True
+
+
+def test_revocation_list_fails_closed_until_first_load(monkeypatch):
+    failing = FakeRepository(fail=True)
+    monkeypatch.setattr(repository, "_repository", failing)
+    token, _ = issue_session_token(USER)
+    with pytest.raises(ConnectionError):
+        asyncio.run(verify_session_token(token))
+
+    # Once loaded, a failed refresh keeps serving the last list
+    revocations = RevocationList(refresh_seconds=0)
+    monkeypatch.setattr(session_tokens, "_revocation_list", revocations)
+    failing.fail = False
+    assert asyncio.run(verify_session_token(token)) == USER
+    failing.fail = True
+    assert asyncio.run(verify_session_token(token)) == USER
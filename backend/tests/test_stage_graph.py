@@ -0,0 +1,112 @@
+"""StageGraph execution and caching"""
+import asyncio
+
+from services.stage_graph import Stage, StageGraph
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, content_hash, stage, version, variant=""):
+        return self.entries.get((content_hash, stage, version, variant))
+
+    async def set(self, content_hash, stage, version, result, variant=""):
+        self.entries[(content_hash, stage, version, variant)] = result
+
+
+def build_graph(cache, calls, vision_backend="openai"):
+    def record(name, func):
+        def run(deps):
+            calls.append(name)
+            return func(deps)
+        return run
+
+    return StageGraph([
+        Stage("fetch", record("fetch", lambda _: "video.mp4"), retries=0),
+        Stage("transcribe", record("transcribe", lambda d: {"text": "hello"}), deps=["fetch"], cache_version=1),
+        Stage("vision", record("vision", lambda d: {"posture_score": 80 if vision_backend == "openai" else 70}), deps=["fetch"], cache_version=1,
+              cache_variant=vision_backend),
+        Stage("scoring", record("scoring", lambda d: {"overall": d["vision"]["posture_score"]}),
+              deps=["transcribe", "vision"]),
+        Stage("coaching_tips", record("coaching_tips", lambda d: [f"tip {d['scoring']['overall']}"]),
+              deps=["scoring"], cache_version=1, cache_by_inputs=True),
+    ], cache=cache, content_hash="abc", outputs=["transcribe", "scoring", "coaching_tips"])
+
+
+def test_runs_every_stage_without_cache():
+    calls = []
+    results = asyncio.run(build_graph(None, calls).run())
+    assert sorted(calls) == ["coaching_tips", "fetch", "scoring", "transcribe", "vision"]
+    assert results["coaching_tips"] == ["tip 80"]
+
+
+def test_fully_cached_second_run_still_produces_outputs():
+    cache = DictCache()
+    asyncio.run(build_graph(cache, []).run())
+
+    calls = []
+    graph = build_graph(cache, calls)
+    results = asyncio.run(graph.run())
+
+    # Cheap uncached stages the caller reads still run; cached work (and its inputs) is skipped
+    assert calls == ["scoring"]
+    assert results["scoring"] == {"overall": 80}
+    assert results["coaching_tips"] == ["tip 80"]
+    assert graph.timings["coaching_tips"]["cached"] is True
+
+
+def test_input_keyed_stage_reruns_when_its_inputs_change():
+    cache = DictCache()
+    asyncio.run(build_graph(cache, []).run())
+
+    calls = []
+    results = asyncio.run(build_graph(cache, calls, vision_backend="local").run())
+
+    assert "vision" in calls and "coaching_tips" in calls
+    assert results["coaching_tips"] == ["tip 70"]
+
+
+def test_failed_results_are_not_cached():
+    cache = DictCache()
+    graph = StageGraph([
+        Stage("analysis", lambda _: {"error": "timeout"}, cache_version=1),
+    ], cache=cache, content_hash="abc")
+    asyncio.run(graph.run())
+    assert cache.entries == {}
+
+
+def test_fallback_results_are_not_cached():
+    cache = DictCache()
+
+    def unavailable(_):
+        raise ConnectionError("OpenAI unavailable")
+
+    graph = StageGraph([
+        Stage("coaching_tips", unavailable, retries=0, cache_version=1, cache_by_inputs=True,
+              fallback=lambda _: ["default tip"]),
+    ], cache=cache, content_hash="abc")
+    results = asyncio.run(graph.run())
+
+    assert results["coaching_tips"] == ["default tip"]
+    assert graph.timings["coaching_tips"]["fallback"] is True
+    assert cache.entries == {}
+
+    # The next run retries the real stage instead of replaying the default
+    calls = []
+    graph = StageGraph([
+        Stage("coaching_tips", lambda _: calls.append("tips") or ["real tip"], cache_version=1, cache_by_inputs=True,
+              fallback=lambda _: ["default tip"]),
+    ], cache=cache, content_hash="abc")
+    assert asyncio.run(graph.run())["coaching_tips"] == ["real tip"]
+    assert calls == ["tips"]
+
+
+def test_degraded_results_are_not_cached():
+    cache = DictCache()
+    graph = StageGraph([
+        Stage("vision", lambda _: {"posture_score": 70, "fallback_reason": "GPT-4o timed out"}, cache_version=1),
+        Stage("windows", lambda _: {"posture_score": 75, "failed_windows": 2}, cache_version=1),
+    ], cache=cache, content_hash="abc")
+    asyncio.run(graph.run())
+    assert cache.entries == {}
@@ -0,0 +1,96 @@
+"""Silence-based chunk cuts and merging of overlapping chunk transcripts"""
+import os
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from services import transcription
+from services.audio_artifact import AudioArtifact
+from services.transcription import TranscriptionService
+
+SAMPLE_RATE = 16000
+
+
+def write_wav(path, seconds, silences=()):
+    """Noise with silent stretches at the given (start, end) seconds"""
+    samples = np.random.default_rng(0).integers(-8000, 8000, int(seconds * SAMPLE_RATE)).astype("<i2")
+    for start, end in silences:
+        samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    return AudioArtifact(str(path))
+
+
+def test_cuts_land_in_the_silence_before_each_boundary(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription, "TRANSCRIPTION_CHUNK_SECONDS", 20.0)
+    artifact = write_wav(tmp_path / "talk.wav", 50, silences=[(17.0, 17.3), (35.0, 35.3)])
+
+    cuts = TranscriptionService._split_points(artifact)
+
+    assert cuts[0] == 0.0 and cuts[-1] == artifact.duration
+    assert len(cuts) == 4
+    assert 17.0 <= cuts[1] <= 17.3
+    assert 35.0 <= cuts[2] <= 35.3
+
+
+def test_chunks_shorter_than_the_search_window_still_advance(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription, "TRANSCRIPTION_CHUNK_SECONDS", 5.0)
+    artifact = write_wav(tmp_path / "talk.wav", 30)
+
+    cuts = TranscriptionService._split_points(artifact)
+
+    gaps = np.diff(cuts)
+    assert (gaps > 0).all()
+    assert ((gaps[:-1] >= 2.5) & (gaps[:-1] <= 5.0)).all()
+    assert cuts[-1] == artifact.duration
+
+
+def test_overlapping_words_belong_to_the_chunk_holding_their_midpoint():
+    cuts = [0.0, 10.0, 20.0]
+    first = {
+        "text": "hello boundary next",
+        "words": [
+            {"word": "hello", "start": 1.0, "end": 1.5},
+            {"word": "boundary", "start": 9.6, "end": 10.2},
+            {"word": "next", "start": 10.1, "end": 10.5},
+        ],
+        "segments": [{"text": " hello boundary", "start": 1.0, "end": 9.9}, {"text": " next", "start": 10.1, "end": 10.6}],
+    }
+    # The second chunk starts one second early, at 9.0
+    second = {
+        "text": "boundary next tail",
+        "words": [
+            {"word": "boundary", "start": 0.6, "end": 1.2},
+            {"word": "next", "start": 1.1, "end": 1.5},
+            {"word": "tail", "start": 10.8, "end": 11.2},
+        ],
+        "segments": [{"text": " boundary", "start": 0.6, "end": 0.9}, {"text": " next tail", "start": 1.1, "end": 11.2}],
+    }
+
+    merged = TranscriptionService._merge_chunks([(0.0, first), (9.0, second)], cuts, 20.5)
+
+    assert [(w["word"], w["start"]) for w in merged["words"]] == [
+        ("hello", 1.0), ("boundary", 9.6), ("next", 10.1), ("tail", 19.8)
+    ]
+    assert merged["text"] == "hello boundary next tail"
+    assert [s["start"] for s in merged["segments"]] == [1.0, 10.1]
+    assert merged["duration"] == 20.5
+
+
+def test_write_chunk_copies_the_span_to_its_own_wav(tmp_path):
+    artifact = write_wav(tmp_path / "talk.wav", 3)
+
+    chunk_path = TranscriptionService._write_chunk(artifact, 1.0, 2.5)
+    try:
+        with wave.open(chunk_path) as chunk:
+            assert (chunk.getframerate(), chunk.getnframes()) == (SAMPLE_RATE, int(1.5 * SAMPLE_RATE))
+            frames = np.frombuffer(chunk.readframes(chunk.getnframes()), dtype="<i2")
+        assert (frames == artifact.pcm[SAMPLE_RATE:int(2.5 * SAMPLE_RATE)]).all()
+    finally:
+        os.unlink(chunk_path)
@@ -0,0 +1,113 @@
+"""UploadStagingStore: range bookkeeping, the finalize claim and TTL cleanup"""
+import asyncio
+import os
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+
+from routes import uploads
+from routes.uploads import CreateUploadRequest, UploadStagingStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_PART_SIZE", 10)
+    return UploadStagingStore(str(tmp_path))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def create(store, size=35, user_id="user"):
+    return run(store.create(user_id, CreateUploadRequest(filename="../talk.mp4", size=size)))
+
+
+class ChunkedRequest:
+    def __init__(self, *chunks):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def test_create_stages_a_sparse_file(store):
+    meta = create(store)
+    assert meta["filename"] == "talk.mp4"
+    assert os.path.getsize(store.data_path(meta["upload_id"])) == 35
+    assert run(store.ranges(meta["upload_id"])) == []
+
+
+def test_ranges_merge_out_of_order_duplicate_and_overlapping_parts(store):
+    upload_id = create(store)["upload_id"]
+    for start, end in [(20, 30), (0, 10), (20, 30), (5, 12), (12, 15), (30, 30)]:
+        run(store.record_range(upload_id, start, end))
+
+    assert run(store.ranges(upload_id)) == [(0, 15), (20, 30)]
+    assert run(store.offset(upload_id)) == 15
+
+
+def test_offset_is_zero_until_the_start_arrives():
+    assert UploadStagingStore.offset_from([(10, 20)]) == 0
+    assert UploadStagingStore.offset_from([]) == 0
+
+
+def test_missing_parts_include_partially_received_ones():
+    meta = {"size": 35, "part_size": 10}
+    assert UploadStagingStore.missing_parts_from(meta, [(0, 15), (20, 35)]) == [1]
+    assert UploadStagingStore.missing_parts_from(meta, [(0, 35)]) == []
+    assert UploadStagingStore.missing_parts_from(meta, []) == [0, 1, 2, 3]
+
+
+def test_write_streams_at_the_offset_and_enforces_the_limit(store):
+    upload_id = create(store)["upload_id"]
+    assert run(store.write(upload_id, 10, ChunkedRequest(b"abc", b"de"), limit=25)) == 5
+    with open(store.data_path(upload_id), "rb") as f:
+        f.seek(10)
+        assert f.read(5) == b"abcde"
+
+    with pytest.raises(HTTPException) as error:
+        run(store.write(upload_id, 0, ChunkedRequest(b"x" * 20), limit=10))
+    assert error.value.status_code == 413
+
+
+def test_finalize_claim_is_exclusive_and_blocks_writes(store):
+    upload_id = create(store)["upload_id"]
+    assert run(store.claim_finalize(upload_id)) is True
+    assert run(store.claim_finalize(upload_id)) is False
+
+    with pytest.raises(HTTPException) as error:
+        run(store.write(upload_id, 0, ChunkedRequest(b"late"), limit=35))
+    assert error.value.status_code == 409
+
+    run(store.release_finalize(upload_id))
+    assert run(store.claim_finalize(upload_id)) is True
+
+
+def test_uploads_are_private_and_ids_validated(store):
+    upload_id = create(store)["upload_id"]
+    for other_id, user_id in [(upload_id, "someone-else"), ("upload_../../etc", "user"), ("upload_missing", "user")]:
+        with pytest.raises(HTTPException) as error:
+            run(store.get(other_id, user_id))
+        assert error.value.status_code == 404
+
+
+def test_cleanup_removes_only_uploads_idle_past_the_ttl(store):
+    idle = create(store)["upload_id"]
+    active = create(store)["upload_id"]
+    long_ago = time.time() - uploads.UPLOAD_STAGING_TTL_SECONDS - 60
+    for upload_id in (idle, active):
+        upload_dir = os.path.join(store.root, upload_id)
+        for path in (upload_dir, os.path.join(upload_dir, "ranges"), os.path.join(upload_dir, "data")):
+            os.utime(path, (long_ago, long_ago))
+    # A recent chunk write keeps an upload alive even though its directory looks old
+    os.utime(store.data_path(active))
+
+    create(store)
+
+    assert not os.path.exists(os.path.join(store.root, idle))
+    assert os.path.exists(os.path.join(store.root, active))
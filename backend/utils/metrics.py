@@ -0,0 +1,166 @@
+"""
+Process-safe counters exposed in Prometheus text format at /metrics.
+
+Pipeline work runs in worker processes, so each process writes its counters
+to its own JSON file under METRICS_DIR; the API process sums every file when
+/metrics is scraped. Increments only mark the counters dirty: a background
+thread writes them at most once per METRICS_FLUSH_SECONDS, and flush() writes
+them at shutdown.
+
+When a scrape finds the file of a process that is no longer running, its
+counters are folded into retired.json and the file removed, so totals keep
+counting up across worker restarts. The liveness check uses local PIDs, so
+METRICS_DIR must not be shared between hosts.
+"""
+import os
+import json
+import glob
+import fcntl
+import atexit
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", str(Path(__file__).parent.parent / "data" / "metrics"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "10"))
+RETIRED_FILE = "retired.json"
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_descriptions: Dict[str, str] = {}
+_dirty = False
+_flusher: Optional[threading.Thread] = None
+
+
+def describe(name: str, description: str):
+    _descriptions[name] = description
+
+
+def _write_json(path: str, data: dict):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _rows(counters) -> list:
+    return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()]
+
+
+def flush():
+    """Write this process's counters if they changed since the last write"""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        try:
+            _write_json(os.path.join(METRICS_DIR, f"{os.getpid()}.json"),
+                        {"descriptions": _descriptions, "counters": _rows(_counters)})
+            _dirty = False
+        except OSError as e:
+            logger.warning(f"Failed to write metrics: {str(e)}")
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush()
+
+
+def increment(name: str, value: float = 1, **labels):
+    global _dirty, _flusher
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        _dirty = True
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush")
+            _flusher.start()
+
+
+atexit.register(flush)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _add(totals: dict, descriptions: dict, data: dict):
+    descriptions.update(data.get("descriptions", {}))
+    for row in data.get("counters", []):
+        key = (row["name"], tuple(sorted(row["labels"].items())))
+        totals[key] = totals.get(key, 0) + row["value"]
+
+
+def _retire_dead_processes():
+    """Fold the counter files of exited processes into retired.json"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock_file:
+        # Concurrent scrapes must not fold the same file twice
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+            pid = Path(path).stem
+            if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                dead.append(path)
+        if not dead:
+            return
+
+        retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+        totals: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        descriptions: Dict[str, str] = {}
+        for path in [retired_path] + dead:
+            _add(totals, descriptions, _read(path))
+        _write_json(retired_path, {"descriptions": descriptions, "counters": _rows(totals)})
+        for path in dead:
+            os.unlink(path)
+
+
+def render_prometheus() -> str:
+    """Sum the counters of every process and format them for Prometheus"""
+    flush()
+    try:
+        _retire_dead_processes()
+    except OSError as e:
+        logger.warning(f"Failed to retire metrics of exited processes: {str(e)}")
+
+    totals: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+    descriptions = dict(_descriptions)
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        _add(totals, descriptions, _read(path))
+
+    lines = []
+    for name in sorted({name for name, _ in totals}):
+        if name in descriptions:
+            lines.append(f"# HELP {name} {descriptions[name]}")
+        lines.append(f"# TYPE {name} counter")
+        for (counter_name, labels), value in sorted(totals.items()):
+            if counter_name != name:
+                continue
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,286 @@
+"""
+Process-wide AsyncOpenAI client.
+
+Every OpenAI call in a process goes through one AsyncOpenAI instance backed
+by a tuned httpx connection pool (no threads parked in `asyncio.to_thread`).
+Requests pass a per-model token bucket first: the request and token budgets
+start from OPENAI_RPM / OPENAI_TPM and are re-synced from the
+x-ratelimit-* headers of every response, so all processes sharing the API
+key back off together instead of collecting 429s. Transient failures are
+retried with full-jitter exponential backoff, and slow chat requests are
+hedged with a second copy once they pass the model's recent p95 latency
+(only when the bucket has room for the duplicate).
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+# Starting budgets per model until the first response reports the real limits
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "30000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_RETRY_BASE_SECONDS = 1.0
+OPENAI_RETRY_MAX_SECONDS = 30.0
+# Hedge after the model's p95 latency (or this many seconds until enough samples); 0 disables hedging
+OPENAI_HEDGE_AFTER_SECONDS = float(os.getenv("OPENAI_HEDGE_AFTER_SECONDS", "20"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# A "low" detail image costs a fixed 85 tokens
+IMAGE_TOKENS = 85
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+_client: Optional[openai.AsyncOpenAI] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_limiters: Dict[str, "ModelRateLimiter"] = {}
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """The shared client for the running event loop (httpx connections are bound to one loop)"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is not None and _client_loop is loop:
+        return _client
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                            keepalive_expiry=60),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=10.0)
+    )
+    # Retries are handled below so they can respect the shared rate limiter
+    _client = openai.AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+    _client_loop = loop
+    logger.debug(f"Initialized AsyncOpenAI client (max {OPENAI_MAX_CONNECTIONS} connections)")
+    return _client
+
+
+async def close_openai_client():
+    global _client, _client_loop
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _client_loop = None
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """x-ratelimit-reset-* durations such as "1s", "6m0s" or "120ms", in seconds"""
+    if not value:
+        return None
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total
+
+
+class ModelRateLimiter:
+    """Request and token buckets for one model, refilled continuously at the per-minute limits"""
+
+    def __init__(self, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM):
+        self.request_limit = float(rpm)
+        self.token_limit = float(tpm)
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.request_limit, self.requests + elapsed * self.request_limit / 60)
+        self.tokens = min(self.token_limit, self.tokens + elapsed * self.token_limit / 60)
+
+    def _wait_time(self, tokens: int) -> float:
+        """Seconds until a request of `tokens` fits (0 if it fits now)"""
+        self._refill()
+        # A request larger than the whole budget only waits for a full bucket
+        tokens = min(tokens, self.token_limit)
+        waits = [self.paused_until - time.monotonic()]
+        if self.requests < 1:
+            waits.append((1 - self.requests) * 60 / self.request_limit)
+        if self.tokens < tokens:
+            waits.append((tokens - self.tokens) * 60 / self.token_limit)
+        return max(max(waits), 0.0)
+
+    def _take(self, tokens: int):
+        self.requests -= 1
+        self.tokens -= min(tokens, self.token_limit)
+
+    async def acquire(self, tokens: int):
+        async with self._lock:
+            while True:
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    self._take(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    def try_acquire(self, tokens: int) -> bool:
+        if self._lock.locked() or self._wait_time(tokens) > 0:
+            return False
+        self._take(tokens)
+        return True
+
+    def update(self, headers: httpx.Headers):
+        """Sync the buckets with what the API reports for this key"""
+        self._refill()
+        try:
+            if headers.get("x-ratelimit-limit-requests"):
+                self.request_limit = float(headers["x-ratelimit-limit-requests"])
+            if headers.get("x-ratelimit-limit-tokens"):
+                self.token_limit = float(headers["x-ratelimit-limit-tokens"])
+            if headers.get("x-ratelimit-remaining-requests"):
+                self.requests = min(self.requests, float(headers["x-ratelimit-remaining-requests"]))
+            if headers.get("x-ratelimit-remaining-tokens"):
+                self.tokens = min(self.tokens, float(headers["x-ratelimit-remaining-tokens"]))
+        except ValueError:
+            pass
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def record_latency(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        if OPENAI_HEDGE_AFTER_SECONDS <= 0:
+            return None
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return OPENAI_HEDGE_AFTER_SECONDS
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+def get_rate_limiter(model: str) -> ModelRateLimiter:
+    if model not in _limiters:
+        _limiters[model] = ModelRateLimiter()
+    return _limiters[model]
+
+
+def estimate_chat_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Rough prompt size (4 characters per token, fixed cost per image) plus the completion budget"""
+    characters = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                characters += len(part.get("text", ""))
+    return characters // 4 + images * IMAGE_TOKENS + (max_tokens or 0)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return _parse_reset(response.headers.get("x-ratelimit-reset-requests")) or \
+            _parse_reset(response.headers.get("x-ratelimit-reset-tokens"))
+
+
+async def _send(limiter: ModelRateLimiter, send: Callable):
+    start = time.monotonic()
+    raw = await send()
+    limiter.record_latency(time.monotonic() - start)
+    limiter.update(raw.headers)
+    return raw.parse()
+
+
+async def _attempt(limiter: ModelRateLimiter, send: Callable, tokens: int):
+    await limiter.acquire(tokens)
+    return await _send(limiter, send)
+
+
+async def _hedged(limiter: ModelRateLimiter, send: Callable, tokens: int):
+    """Run `send`; if it is slower than the hedge delay, race it against a second copy"""
+    primary = asyncio.create_task(_attempt(limiter, send, tokens))
+    delay = limiter.hedge_delay()
+    if delay is None:
+        return await primary
+
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not limiter.try_acquire(tokens):
+        return await primary
+
+    logger.debug(f"Hedging request after {delay:.1f}s")
+    tasks = {primary, asyncio.create_task(_send(limiter, send))}
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not tasks:
+                # Both failed; surface the primary's error
+                return primary.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _request(model: str, send: Callable, tokens: int, hedge: bool) -> Any:
+    limiter = get_rate_limiter(model)
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        try:
+            if hedge:
+                return await _hedged(limiter, send, tokens)
+            return await _attempt(limiter, send, tokens)
+        except RETRYABLE_ERRORS as e:
+            if attempt >= OPENAI_MAX_RETRIES:
+                raise
+            retry_after = _retry_after(e)
+            if isinstance(e, openai.RateLimitError):
+                # Hold every request for this model, not just this one
+                limiter.pause(retry_after or OPENAI_RETRY_BASE_SECONDS)
+            # Full jitter keeps retries from many jobs from arriving together
+            backoff = random.uniform(0, min(OPENAI_RETRY_MAX_SECONDS, OPENAI_RETRY_BASE_SECONDS * 2 ** attempt))
+            delay = max(backoff, retry_after or 0)
+            logger.warning(f"OpenAI {model} request failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def chat_completion(**kwargs) -> Any:
+    """client.chat.completions.create through the limiter, with retries and hedging"""
+    client = get_openai_client()
+    tokens = estimate_chat_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+    return await _request(
+        kwargs["model"], lambda: client.chat.completions.with_raw_response.create(**kwargs), tokens, hedge=True
+    )
+
+
+async def transcription(audio_path: str, **kwargs) -> Any:
+    """client.audio.transcriptions.create for a file on disk (re-read on every attempt, never hedged)"""
+    client = get_openai_client()
+
+    async def send():
+        with open(audio_path, "rb") as audio_file:
+            return await client.audio.transcriptions.with_raw_response.create(file=audio_file, **kwargs)
+
+    # Whisper is limited by requests per minute only
+    return await _request(kwargs["model"], send, 0, hedge=False)
@@ -0,0 +1,133 @@
+"""
+Cache of validated sessions for the auth hot path.
+
+Entries map the SHA-256 of a session token (never the token itself) to the
+user it authenticates and the session's expiry. An entry lives for at most
+SESSION_CACHE_TTL_SECONDS and never past the session's own `expires_at`;
+logout deletes it.
+
+Backends (SESSION_CACHE_BACKEND):
+- local: per-process TTL + LRU map bounded by SESSION_CACHE_MAX_ENTRIES
+- redis: shared by every API worker (REDIS_URL, requires `redis`), so a
+  logout on one worker is seen by all of them
+- none: always look the session up
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "60"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+REDIS_KEY_PREFIX = "session:"
+
+_MISS = object()
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _seconds_left(expires_at: str) -> float:
+    expiry = datetime.fromisoformat(expires_at)
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return (expiry - datetime.now(timezone.utc)).total_seconds()
+
+
+class SessionCache:
+    """Interface shared by the cache backends; lookups return None on a miss"""
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, token: str, user: Dict[str, Any], expires_at: str) -> None:
+        raise NotImplementedError
+
+    async def delete(self, token: str) -> None:
+        raise NotImplementedError
+
+
+class LocalSessionCache(SessionCache):
+    def __init__(self, ttl: float = SESSION_CACHE_TTL_SECONDS, max_entries: int = SESSION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = token_hash(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        deadline, user = entry
+        if deadline <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return dict(user)
+
+    async def set(self, token: str, user: Dict[str, Any], expires_at: str) -> None:
+        lifetime = min(self.ttl, _seconds_left(expires_at))
+        if lifetime <= 0:
+            return
+        key = token_hash(token)
+        self._entries[key] = (time.monotonic() + lifetime, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, token: str) -> None:
+        self._entries.pop(token_hash(token), None)
+
+
+class RedisSessionCache(SessionCache):
+    def __init__(self, url: str, ttl: float = SESSION_CACHE_TTL_SECONDS):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, token: str) -> Optional[Dict[str, Any]]:
+        value = await self.redis.get(REDIS_KEY_PREFIX + token_hash(token))
+        return json.loads(value) if value else None
+
+    async def set(self, token: str, user: Dict[str, Any], expires_at: str) -> None:
+        lifetime = min(self.ttl, _seconds_left(expires_at))
+        if lifetime < 1:
+            return
+        await self.redis.set(REDIS_KEY_PREFIX + token_hash(token), json.dumps(user), ex=int(lifetime))
+
+    async def delete(self, token: str) -> None:
+        await self.redis.delete(REDIS_KEY_PREFIX + token_hash(token))
+
+
+_session_cache = _MISS
+
+
+def get_session_cache() -> Optional[SessionCache]:
+    """Return the cache selected by SESSION_CACHE_BACKEND (local, redis or none)"""
+    global _session_cache
+
+    if _session_cache is not _MISS:
+        return _session_cache
+
+    backend = os.getenv("SESSION_CACHE_BACKEND", "local").lower()
+    if backend == "local":
+        _session_cache = LocalSessionCache()
+    elif backend == "redis":
+        url = os.getenv("REDIS_URL")
+        if not url:
+            raise ValueError("REDIS_URL must be set for the redis session cache backend")
+        _session_cache = RedisSessionCache(url)
+    elif backend == "none":
+        _session_cache = None
+    else:
+        raise ValueError(f"Unknown SESSION_CACHE_BACKEND: {backend}")
+
+    logger.info(f"Using {backend} session cache backend")
+    return _session_cache
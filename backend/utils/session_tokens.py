@@ -0,0 +1,184 @@
+"""
+Signed session tokens.
+
+With SESSION_TOKEN_MODE=signed, login issues a self-contained token instead
+of a random id stored in `user_sessions`, so validating a request is an HMAC
+check in memory and never touches the database:
+
+    v1.<key id>.<base64url JSON payload>.<base64url HMAC-SHA256>
+
+The payload carries the user id, the display fields returned by
+get_current_user, the expiry and a random token id (jti). Tokens are signed
+with the first key of SESSION_SIGNING_KEYS ("kid:secret,kid:secret"); every
+listed key verifies, so keys rotate by prepending a new one and dropping the
+old one once its tokens have expired.
+
+Logout revokes the jti in the `revoked_sessions` table. Each process keeps
+the live revocation list in memory and refreshes it every
+SESSION_REVOCATION_REFRESH_SECONDS (revocations made by the process itself
+apply immediately).
+"""
+import os
+import json
+import time
+import hmac
+import base64
+import asyncio
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_MODE = os.getenv("SESSION_TOKEN_MODE", "database").lower()
+SESSION_SIGNING_KEYS = os.getenv("SESSION_SIGNING_KEYS", "")
+SESSION_TOKEN_TTL_DAYS = 7
+SESSION_REVOCATION_REFRESH_SECONDS = float(os.getenv("SESSION_REVOCATION_REFRESH_SECONDS", "30"))
+TOKEN_VERSION = "v1"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _parse_keys(spec: str) -> Dict[str, bytes]:
+    keys = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kid, _, secret = entry.partition(":")
+        if not secret:
+            raise ValueError("SESSION_SIGNING_KEYS entries must look like kid:secret")
+        keys[kid] = secret.encode()
+    return keys
+
+
+_keys = _parse_keys(SESSION_SIGNING_KEYS)
+# Signing key id (the first listed key)
+_active_kid = next(iter(_keys), None)
+
+# Fail at startup rather than on every login
+if SESSION_TOKEN_MODE not in ("database", "signed"):
+    raise ValueError(f"Unknown SESSION_TOKEN_MODE: {SESSION_TOKEN_MODE}")
+if SESSION_TOKEN_MODE == "signed" and _active_kid is None:
+    raise ValueError("SESSION_SIGNING_KEYS must be set when SESSION_TOKEN_MODE=signed")
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(TOKEN_VERSION + ".")
+
+
+def _signature(key: bytes, message: str) -> str:
+    return _b64encode(hmac.new(key, message.encode(), hashlib.sha256).digest())
+
+
+def issue_session_token(user: Dict[str, Any]) -> Tuple[str, datetime]:
+    """Sign a token for `user` (the get_current_user shape); returns the token and its expiry"""
+    if _active_kid is None:
+        raise ValueError("SESSION_SIGNING_KEYS must be set to issue signed session tokens")
+
+    expires_at = datetime.now(timezone.utc) + timedelta(days=SESSION_TOKEN_TTL_DAYS)
+    payload = {
+        "sub": user["user_id"],
+        "email": user["email"],
+        "name": user.get("name"),
+        "picture": user.get("picture"),
+        "created_at": str(user["created_at"]) if user.get("created_at") else None,
+        "exp": int(expires_at.timestamp()),
+        "jti": secrets.token_hex(16)
+    }
+    message = f"{TOKEN_VERSION}.{_active_kid}.{_b64encode(json.dumps(payload, separators=(',', ':')).encode())}"
+    return f"{message}.{_signature(_keys[_active_kid], message)}", expires_at
+
+
+def decode_session_token(token: str) -> Optional[Dict[str, Any]]:
+    """The payload of a well-formed, correctly signed, unexpired token, else None (revocation not checked)"""
+    try:
+        version, kid, body, signature = token.split(".")
+    except ValueError:
+        return None
+    key = _keys.get(kid)
+    if version != TOKEN_VERSION or key is None:
+        return None
+    if not hmac.compare_digest(signature, _signature(key, f"{version}.{kid}.{body}")):
+        return None
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        return None
+    if payload.get("exp", 0) <= time.time():
+        return None
+    return payload
+
+
+class RevocationList:
+    """Revoked token ids (jti), cached in memory and refreshed from `revoked_sessions`"""
+
+    def __init__(self, refresh_seconds: float = SESSION_REVOCATION_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._revoked: Set[str] = set()
+        self._local: Set[str] = set()
+        self._loaded_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _refresh(self):
+        from services.repository import get_repository
+        rows = await get_repository().rpc("get_revoked_sessions", {})
+        self._revoked = {row["jti"] for row in rows}
+        # Once stored, this process's own revocations come back with the list
+        self._local -= self._revoked
+        self._loaded_at = time.monotonic()
+
+    async def is_revoked(self, jti: str) -> bool:
+        """Raises while the list has never been loaded: without it a revoked token would pass"""
+        if jti in self._local:
+            return True
+        if not self._loaded_at or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if not self._loaded_at or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    try:
+                        await self._refresh()
+                    except Exception as e:
+                        logger.error(f"Failed to refresh session revocation list: {str(e)}")
+                        if not self._loaded_at:
+                            raise
+                        # Keep serving the last loaded list; retry after another interval
+                        self._loaded_at = time.monotonic()
+        return jti in self._revoked
+
+    async def revoke(self, jti: str, expires_at: datetime):
+        from services.repository import get_repository
+        self._local.add(jti)
+        await get_repository().upsert(
+            "revoked_sessions", {"jti": jti, "expires_at": expires_at.isoformat()}, on_conflict="jti"
+        )
+
+
+_revocation_list = RevocationList()
+
+
+async def verify_session_token(token: str) -> Optional[Dict[str, Any]]:
+    """The user for a valid, unrevoked signed token (get_current_user shape), else None"""
+    payload = decode_session_token(token)
+    if payload is None or await _revocation_list.is_revoked(payload["jti"]):
+        return None
+    return {
+        "user_id": payload["sub"],
+        "email": payload["email"],
+        "name": payload.get("name"),
+        "picture": payload.get("picture"),
+        "created_at": payload.get("created_at")
+    }
+
+
+async def revoke_session_token(token: str):
+    payload = decode_session_token(token)
+    if payload is None:
+        return
+    await _revocation_list.revoke(payload["jti"], datetime.fromtimestamp(payload["exp"], tz=timezone.utc))
@@ -6,6 +6,9 @@ from typing import Optional
 from supabase import create_client, Client
 import logging
 
+from utils.session_cache import get_session_cache
+from utils.session_tokens import is_signed_token, verify_session_token, revoke_session_token
+
 logger = logging.getLogger(__name__)
 
 
@@ -36,7 +39,7 @@ async def create_session_token(user_id: str) -> str:
     logger.debug(f"Creating session token for user_id: {user_id}")
     
     try:
-        supabase = get_supabase_client()
+        from services.repository import get_repository
         session_token = f"session_{uuid.uuid4().hex}"
         expires_at = datetime.now(timezone.utc) + timedelta(days=7)
         
@@ -48,9 +51,8 @@ async def create_session_token(user_id: str) -> str:
         }
         logger.debug(f"Session data to insert: {session_data}")
         
-        # Store session in Supabase
-        response = supabase.table("user_sessions").insert(session_data).execute()
-        logger.debug(f"Session insert response: {response}")
+        # Store session
+        await get_repository().insert("user_sessions", session_data)
         
         logger.debug(f"Successfully created session token: {session_token}")
         return session_token
@@ -74,56 +76,61 @@ async def get_current_user(session_token: Optional[str] = Cookie(None), authoriz
         logger.warning("No authentication token provided")
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    # Signed tokens carry the user; validating them needs no database round-trip
+    if is_signed_token(token):
+        try:
+            user = await verify_session_token(token)
+        except Exception as e:
+            # The revocation list could not be loaded; refuse rather than accept a possibly revoked token
+            logger.error(f"Cannot validate signed session token: {str(e)}")
+            raise HTTPException(status_code=503, detail="Session validation unavailable")
+        if not user:
+            logger.warning("Invalid, expired or revoked signed session token")
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
+        return user
+    
+    # Validated sessions are cached so most requests skip the database entirely
+    session_cache = get_session_cache()
+    if session_cache:
+        try:
+            cached_user = await session_cache.get(token)
+        except Exception as e:
+            logger.warning(f"Session cache lookup failed: {str(e)}")
+            cached_user = None
+        if cached_user:
+            return cached_user
+    
     try:
-        # Get Supabase client
-        logger.debug("Initializing Supabase client for user authentication")
-        supabase = get_supabase_client()
-        logger.debug("Supabase client initialized successfully")
-        
-        # Find session in Supabase
-        logger.debug(f"Querying user_sessions table for token: {token}")
-        response = supabase.table("user_sessions").select("*").eq("session_token", token).execute()
-        logger.debug(f"Session query response: {response}")
-        
-        if not response.data:
-            logger.warning(f"No session found for token: {token}")
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        session_doc = response.data[0]
-        logger.debug(f"Found session document: {session_doc}")
+        from services.repository import get_repository
+        repository = get_repository()
         
-        expires_at = session_doc["expires_at"]
-        if isinstance(expires_at, str):
-            expires_at = datetime.fromisoformat(expires_at)
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        # One indexed round-trip: the live session joined to its user (see get_session_user in supabase/migrations)
+        logger.debug(f"Looking up session user for token: {token}")
+        rows = await repository.rpc("get_session_user", {"p_session_token": token})
         
-        if expires_at < datetime.now(timezone.utc):
-            logger.warning(f"Session expired for token: {token}")
-            raise HTTPException(status_code=401, detail="Session expired")
+        if not rows:
+            logger.warning(f"No live session found for token: {token}")
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
         
-        # Get user from Supabase
-        logger.debug(f"Querying users table for user_id: {session_doc['user_id']}")
-        user_response = supabase.table("users").select("*").eq("id", session_doc["user_id"]).execute()
-        logger.debug(f"User query response: {user_response}")
-        
-        if not user_response.data:
-            logger.warning(f"User not found for user_id: {session_doc['user_id']}")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        user_doc = user_response.data[0]
-        logger.debug(f"Found user document: {user_doc}")
+        session_user = rows[0]
+        logger.debug(f"Found session user: {session_user}")
         
         # Transform Supabase user to match existing structure
         user = {
-            "user_id": user_doc["id"],
-            "email": user_doc["email"],
-            "name": user_doc.get("name", ""),
-            "picture": user_doc.get("picture"),
-            "created_at": user_doc.get("created_at")
+            "user_id": session_user["user_id"],
+            "email": session_user["email"],
+            "name": session_user.get("name", ""),
+            "picture": session_user.get("picture"),
+            "created_at": session_user.get("created_at")
         }
         logger.debug(f"Returning user data: {user}")
         
+        if session_cache:
+            try:
+                await session_cache.set(token, user, session_user["expires_at"])
+            except Exception as e:
+                logger.warning(f"Failed to cache session: {str(e)}")
+        
         return user
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -134,6 +141,25 @@ async def get_current_user(session_token: Optional[str] = Cookie(None), authoriz
         raise HTTPException(status_code=500, detail=f"Authentication error: {str(e)}")
 
 
+async def delete_session(session_token: str):
+    """End a session: remove it from the database and the session cache, or revoke a signed token"""
+    from services.repository import get_repository
+    
+    if is_signed_token(session_token):
+        await revoke_session_token(session_token)
+        return
+    
+    # Row first: a request racing the logout could otherwise miss the cache, still find the row and re-cache it
+    await get_repository().delete("user_sessions", {"session_token": session_token})
+    
+    session_cache = get_session_cache()
+    if session_cache:
+        try:
+            await session_cache.delete(session_token)
+        except Exception as e:
+            logger.warning(f"Failed to evict session from cache: {str(e)}")
+
+
 # These functions are kept for compatibility but won't be used with Supabase Auth
 # Supabase handles password hashing and verification automatically through its auth system
 async def hash_password(password: str) -> str:
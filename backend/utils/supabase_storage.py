@@ -1,62 +1,285 @@
 import os
 import uuid
+import base64
+import asyncio
+import hashlib
 from datetime import datetime, timezone
-from typing import Union
+from typing import AsyncIterator, Tuple, Union
+import httpx
 from fastapi import UploadFile
 from utils.supabase_client import get_supabase_client
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def save_video_to_storage(file: UploadFile, user_id: str) -> str:
-    """Save a video file to Supabase storage and return its ID"""
-    try:
-        # Get Supabase client
-        supabase = get_supabase_client()
-        
-        # Generate unique video ID
-        video_id = f"video_{uuid.uuid4().hex}"
-        
-        # Read file content
-        content = await file.read()
-        
-        # Create file path - organize by user ID and date
-        today = datetime.now(timezone.utc).strftime("%Y/%m/%d")
-        file_path = f"videos/{user_id}/{today}/{video_id}_{file.filename}"
-        
-        # Upload to Supabase storage
-        # Create or get the bucket
-        bucket_name = "videos"
-        
-        # Upload the file
-        response = supabase.storage.from_(bucket_name).upload(
-            file_path, 
-            content,
-            file_options={"content-type": file.content_type}
-        )
-        
-        logger.info(f"Video uploaded to Supabase storage: {file_path}")
-        
-        # Store metadata in database
-        metadata = {
-            "id": video_id,
-            "user_id": user_id,
-            "filename": file.filename,
-            "file_path": file_path,
-            "content_type": file.content_type,
-            "size": len(content),
-            "uploaded_at": datetime.now(timezone.utc).isoformat()
+# Supabase resumable uploads require 6 MB parts (except the last one)
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+UPLOAD_CHUNK_RETRIES = 3
+VIDEO_BUCKET = "videos"
+
+
+class ResumableStorageUpload:
+    """Client for Supabase Storage's resumable (TUS) upload endpoint.
+
+    Parts are sent as they are read, so at most one chunk is held in memory
+    regardless of the object size.
+    """
+
+    def __init__(self, bucket_name: str, object_name: str, content_type: str, total_size: int):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.content_type = content_type or "application/octet-stream"
+        self.total_size = total_size
+        self.location = None
+        self.offset = 0
+        self._client = None
+
+        url = os.environ.get("SUPABASE_URL", "").rstrip("/")
+        key = os.environ.get("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        self.endpoint = f"{url}/storage/v1/upload/resumable"
+        self.headers = {
+            "authorization": f"Bearer {key}",
+            "apikey": key,
+            "tus-resumable": "1.0.0"
         }
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    @staticmethod
+    def _encode_metadata(metadata: dict) -> str:
+        return ",".join(
+            f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+        )
+
+    async def create(self):
+        response = await self._client.post(self.endpoint, headers={
+            **self.headers,
+            "upload-length": str(self.total_size),
+            "x-upsert": "true",
+            "upload-metadata": self._encode_metadata({
+                "bucketName": self.bucket_name,
+                "objectName": self.object_name,
+                "contentType": self.content_type,
+                "cacheControl": "3600"
+            })
+        })
+        response.raise_for_status()
+        self.location = response.headers["location"]
+        return self.location
+
+    async def current_offset(self) -> int:
+        response = await self._client.head(self.location, headers=self.headers)
+        response.raise_for_status()
+        return int(response.headers["upload-offset"])
+
+    async def upload_chunk(self, chunk: bytes) -> int:
+        """Append `chunk` at the current offset, resuming from the server offset after transient errors"""
+        chunk_start = self.offset
+        for attempt in range(UPLOAD_CHUNK_RETRIES):
+            try:
+                data = chunk[self.offset - chunk_start:]
+                if data:
+                    response = await self._client.patch(self.location, content=data, headers={
+                        **self.headers,
+                        "upload-offset": str(self.offset),
+                        "content-type": "application/offset+octet-stream"
+                    })
+                    response.raise_for_status()
+                    self.offset = int(response.headers["upload-offset"])
+                return self.offset
+            except httpx.HTTPError as e:
+                if attempt == UPLOAD_CHUNK_RETRIES - 1:
+                    raise
+                logger.warning(f"Chunk upload failed at offset {self.offset}: {str(e)}, resuming")
+                await asyncio.sleep(attempt + 1)
+                self.offset = await self.current_offset()
+        return self.offset
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an UploadFile in fixed-size chunks"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _rechunk(chunks: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+    """Regroup arbitrary-sized chunks into exact `chunk_size` parts (last part may be shorter)"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= chunk_size:
+            yield bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def stream_to_storage(chunks: AsyncIterator[bytes], file_path: str, content_type: str,
+                            total_size: int, bucket_name: str = VIDEO_BUCKET) -> Tuple[int, str]:
+    """Upload a stream of chunks to storage; returns (size, sha256 hex digest)
+
+    Memory use is bounded by UPLOAD_CHUNK_SIZE: the size and content hash are
+    computed incrementally as parts are sent.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    async with ResumableStorageUpload(bucket_name, file_path, content_type, total_size) as upload:
+        await upload.create()
+        async for chunk in _rechunk(chunks, UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+            await upload.upload_chunk(chunk)
+
+    if size != total_size:
+        raise Exception(f"Upload size mismatch: expected {total_size} bytes, received {size}")
+
+    return size, digest.hexdigest()
+
+
+async def iter_local_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a local file in fixed-size chunks without blocking the event loop"""
+    with open(path, "rb") as handle:
+        while True:
+            chunk = await asyncio.to_thread(handle.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _blob_exists(bucket, file_path: str) -> bool:
+    folder, name = file_path.rsplit("/", 1)
+    return any(entry.get("name") == name for entry in bucket.list(folder, {"search": name}))
+
+
+async def _store_video(chunks: AsyncIterator[bytes], filename: str, content_type: str,
+                       total_size: int, user_id: str) -> str:
+    """Store video bytes once per content hash, insert the videos row and return the new video ID
+
+    The source is read once: it is streamed to a staging object while being
+    hashed, then moved to its content-addressed path, or dropped if an
+    identical blob is already stored (duplicates still cost the transfer,
+    but never a second copy in storage).
+    """
+    # Get Supabase client
+    supabase = get_supabase_client()
+    bucket = supabase.storage.from_(VIDEO_BUCKET)
+    
+    # Generate unique video ID
+    video_id = f"video_{uuid.uuid4().hex}"
+    extension = os.path.splitext(filename or "")[1].lower()
+    staging_path = f"videos/staging/{video_id}{extension}"
+    
+    # Stream the file to Supabase storage in resumable parts, hashing it on the way
+    try:
+        size, content_hash = await stream_to_storage(chunks, staging_path, content_type, total_size)
+    except Exception:
+        try:
+            await asyncio.to_thread(bucket.remove, [staging_path])
+        except Exception as e:
+            logger.warning(f"Failed to remove partial upload {staging_path}: {str(e)}")
+        raise
+    
+    existing = await asyncio.to_thread(
+        lambda: supabase.table("videos").select("file_path").eq("content_hash", content_hash).limit(1).execute()
+    )
+    if existing.data:
+        file_path = existing.data[0]["file_path"]
+        await asyncio.to_thread(bucket.remove, [staging_path])
+        logger.info(f"Video content {content_hash} already stored at {file_path}, dropped the new copy")
+    else:
+        # Content-addressed path: identical uploads share a single stored blob
+        file_path = f"videos/blobs/{content_hash[:2]}/{content_hash}{extension}"
+        try:
+            await asyncio.to_thread(bucket.move, staging_path, file_path)
+        except Exception:
+            # A concurrent upload of the same content may have moved its copy there first
+            if not await asyncio.to_thread(_blob_exists, bucket, file_path):
+                raise
+            await asyncio.to_thread(bucket.remove, [staging_path])
         
-        # Insert metadata into videos table
-        supabase.table("videos").insert(metadata).execute()
-        
-        return video_id
-        
+        logger.info(f"Video uploaded to Supabase storage: {file_path} ({size} bytes, sha256 {content_hash})")
+    
+    # Store metadata in database
+    metadata = {
+        "id": video_id,
+        "user_id": user_id,
+        "filename": filename,
+        "file_path": file_path,
+        "content_type": content_type,
+        "size": size,
+        "content_hash": content_hash,
+        "uploaded_at": datetime.now(timezone.utc).isoformat()
+    }
+    
+    # Insert metadata into videos table
+    await asyncio.to_thread(lambda: supabase.table("videos").insert(metadata).execute())
+    
+    return video_id
+
+
+async def _upload_size(file: UploadFile) -> int:
+    """Determine the upload size without reading it into memory"""
+    if file.size is not None:
+        return file.size
+    # Starlette spools uploads to a temporary file; measure it by seeking
+    position = await asyncio.to_thread(file.file.seek, 0, os.SEEK_END)
+    await file.seek(0)
+    return position
+
+
+async def save_video_to_storage(file: UploadFile, user_id: str) -> str:
+    """Stream a video file to Supabase storage and return its ID
+
+    The upload is read and sent in UPLOAD_CHUNK_SIZE parts, so memory use per
+    request stays constant no matter how large the video is. Re-uploads of an
+    identical file reuse the stored blob.
+    """
+    try:
+        total_size = await _upload_size(file)
+        return await _store_video(iter_upload_file(file), file.filename, file.content_type, total_size, user_id)
     except Exception as e:
         logger.error(f"Failed to save video to Supabase storage: {str(e)}", exc_info=True)
         raise Exception(f"Failed to save video: {str(e)}")
 
+
+async def save_video_file_to_storage(path: str, filename: str, content_type: str, user_id: str) -> str:
+    """Stream a locally staged video file (e.g. an assembled resumable upload) to storage"""
+    try:
+        total_size = await asyncio.to_thread(os.path.getsize, path)
+        return await _store_video(iter_local_file(path), filename, content_type, total_size, user_id)
+    except Exception as e:
+        logger.error(f"Failed to save staged video to Supabase storage: {str(e)}", exc_info=True)
+        raise Exception(f"Failed to save video: {str(e)}")
+
+async def download_video_to_file(video_metadata: dict, destination: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> int:
+    """Stream a stored video to a local file without holding it in memory; returns bytes written"""
+    supabase = get_supabase_client()
+    signed = await asyncio.to_thread(
+        supabase.storage.from_(VIDEO_BUCKET).create_signed_url, video_metadata["file_path"], 600
+    )
+    signed_url = signed["signedURL"] if isinstance(signed, dict) else signed.signed_url
+
+    written = 0
+    async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0)) as client:
+        async with client.stream("GET", signed_url) as response:
+            response.raise_for_status()
+            with open(destination, "wb") as output:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await asyncio.to_thread(output.write, chunk)
+                    written += len(chunk)
+    return written
+
 def get_video_from_storage(video_id: str) -> dict:
     """Retrieve a video file metadata from Supabase"""
     try:
@@ -85,6 +308,16 @@ def get_video_from_storage(video_id: str) -> dict:
         logger.error(f"Failed to retrieve video from Supabase storage: {str(e)}", exc_info=True)
         raise Exception(f"Failed to retrieve video: {str(e)}")
 
+def save_video_media_info(video_id: str, media_info: dict, content_hash: str = None):
+    """Store probe metadata on the video row (and on every row sharing its content)"""
+    supabase = get_supabase_client()
+    query = supabase.table("videos").update({"media_info": media_info})
+    if content_hash:
+        query = query.eq("content_hash", content_hash)
+    else:
+        query = query.eq("id", video_id)
+    query.execute()
+
 def delete_video_from_storage(video_id: str) -> bool:
     """Delete a video file from Supabase storage"""
     try:
@@ -99,9 +332,11 @@ def delete_video_from_storage(video_id: str) -> bool:
             
         file_path = response.data[0]["file_path"]
         
-        # Delete from storage
-        bucket_name = "videos"
-        supabase.storage.from_(bucket_name).remove([file_path])
+        # Delete from storage unless another video shares the same content-addressed blob
+        shared = supabase.table("videos").select("id").eq("file_path", file_path).neq("id", video_id).limit(1).execute()
+        if not shared.data:
+            bucket_name = "videos"
+            supabase.storage.from_(bucket_name).remove([file_path])
         
         # Delete metadata from database
         supabase.table("videos").delete().eq("id", video_id).execute()
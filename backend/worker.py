@@ -0,0 +1,202 @@
+"""
+Video Processing Worker Pool
+Runs the analysis pipeline in separate processes that claim jobs from the
+durable job queue, so analysis scales independently of the API tier.
+
+Usage:
+    python backend/worker.py            # WORKER_PROCESSES workers (default 2)
+    python backend/worker.py --processes 4
+"""
+import os
+import sys
+import time
+import uuid
+import socket
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add the backend directory to Python path
+backend_path = Path(__file__).parent
+sys.path.insert(0, str(backend_path))
+
+ROOT_DIR = backend_path.parent
+load_dotenv(ROOT_DIR / '.env')
+
+from services.job_queue import get_job_queue
+from services.job_status_writer import get_job_status_writer
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+DEFAULT_WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
+# Jobs each worker process runs at once; above 1 overlaps one job's model calls and I/O with another's CPU work
+WORKER_JOB_CONCURRENCY = int(os.getenv("WORKER_JOB_CONCURRENCY", "1"))
+
+
+class JobWorker:
+    """Claims jobs (up to `concurrency` at a time) and keeps their leases alive while processing"""
+
+    def __init__(self, queue=None, worker_id: str = None, poll_interval: float = POLL_INTERVAL_SECONDS,
+                 concurrency: int = WORKER_JOB_CONCURRENCY):
+        self.queue = queue or get_job_queue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self.concurrency = max(1, concurrency)
+        self._processor = None
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            from services.video_processor import VideoProcessorService
+            self._processor = VideoProcessorService()
+        return self._processor
+
+    async def run(self, stop_event: asyncio.Event):
+        logger.info(f"Worker {self.worker_id} started ({self.concurrency} concurrent jobs)")
+        await asyncio.gather(*(self._claim_loop(stop_event) for _ in range(self.concurrency)))
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    async def _claim_loop(self, stop_event: asyncio.Event):
+        while not stop_event.is_set():
+            try:
+                job = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} failed to claim job: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.process_job(job)
+
+    async def process_job(self, job: dict):
+        job_id = job["id"]
+        logger.info(f"Worker {self.worker_id} processing job {job_id} (attempt {job.get('attempts')})")
+
+        task = asyncio.create_task(
+            self.processor.process_video(job_id, job["video_id"], job["user_id"])
+        )
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, task))
+
+        try:
+            report_id = await task
+            await self.queue.complete(job_id, self.worker_id)
+            logger.info(f"Job {job_id} completed, report_id: {report_id}")
+        except asyncio.CancelledError:
+            logger.warning(f"Job {job_id} cancelled: lease lost to another worker")
+            # The new owner reports progress now; don't overwrite it with ours
+            await get_job_status_writer().discard(job_id)
+        except Exception as e:
+            # The queue writes the retry or failed state; unwritten progress must not land after it
+            await get_job_status_writer().discard(job_id)
+            requeued = await self.queue.fail(job_id, self.worker_id, str(e))
+            logger.error(f"Job {job_id} failed: {str(e)} ({'re-queued' if requeued else 'giving up'})")
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str, task: asyncio.Task):
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not task.done():
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue.heartbeat(job_id, self.worker_id):
+                    task.cancel()
+                    return
+            except Exception as e:
+                # Keep processing; the lease only lapses if heartbeats keep failing
+                logger.warning(f"Heartbeat failed for job {job_id}: {str(e)}")
+
+
+def _worker_process_main(index: int):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker-{index}] %(levelname)s %(message)s")
+
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop_event.set)
+        try:
+            await JobWorker().run(stop_event)
+        finally:
+            # Write progress still pending for jobs interrupted by the shutdown
+            from services.job_status_writer import close_job_status_writer
+            await close_job_status_writer()
+            from utils.openai_client import close_openai_client
+            await close_openai_client()
+            from services.job_events import close_job_events
+            await close_job_events()
+            # Worker processes exit without running atexit handlers
+            from utils import metrics
+            metrics.flush()
+
+    asyncio.run(main())
+
+
+class WorkerPool:
+    """A fixed-size pool of worker processes that are restarted if they die"""
+
+    def __init__(self, processes: int = DEFAULT_WORKER_PROCESSES):
+        self.size = processes
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes = {}
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(target=_worker_process_main, args=(index,), daemon=True, name=f"ep-worker-{index}")
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        logger.info(f"Started {self.size} video processing worker processes")
+
+    def supervise(self):
+        """Restart any worker process that exited unexpectedly"""
+        for index, process in list(self._processes.items()):
+            if not process.is_alive():
+                logger.warning(f"Worker process {index} exited with code {process.exitcode}, restarting")
+                self._spawn(index)
+
+    def stop(self, timeout: float = 30):
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+        self._processes.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run video processing workers")
+    parser.add_argument("--processes", type=int, default=DEFAULT_WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    pool = WorkerPool(args.processes)
+    pool.start()
+
+    def handle_sigterm(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        while True:
+            pool.supervise()
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
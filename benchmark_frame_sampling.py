@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Frame Sampling Benchmark
+Measures frame extraction time against video length: the legacy interval
+sampler (decodes every frame, keeps every Nth) versus the keyframe sampler
+(seeks to the frames that are actually sent to GPT-4o). Test videos are
+synthesized with ffmpeg at 60 fps with a 2-second GOP, like a typical
+screen/webcam recording.
+
+Usage:
+    python benchmark_frame_sampling.py --lengths 30,120,600
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+# The client is constructed but never called
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+
+def create_video(path: str, seconds: int, fps: int = 60):
+    command = [
+        os.getenv('FFMPEG_PATH', '/usr/bin/ffmpeg'),
+        '-f', 'lavfi',
+        '-i', f'testsrc=duration={seconds}:size=1280x720:rate={fps}',
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-g', str(fps * 2),
+        '-pix_fmt', 'yuv420p',
+        '-y', path
+    ]
+    subprocess.run(command, capture_output=True, check=True)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    frames = result["frames"] if isinstance(result, dict) else result
+    return time.perf_counter() - start, len(frames)
+
+
+def main():
+    from services.vision_analysis import VisionAnalysisService
+
+    parser = argparse.ArgumentParser(description="Benchmark frame sampling")
+    parser.add_argument('--lengths', default='30,120,600', help='Comma-separated video lengths in seconds')
+    args = parser.parse_args()
+
+    service = VisionAnalysisService()
+    print(f"{'length (s)':>10} {'interval (s)':>13} {'frames':>7} {'keyframe (s)':>13} {'frames':>7}")
+
+    for seconds in [int(s) for s in args.lengths.split(',')]:
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp:
+            path = temp.name
+        try:
+            create_video(path, seconds)
+            interval_time, interval_frames = timed(service.extract_frames, path)
+            keyframe_time, keyframe_frames = timed(service.extract_keyframes, path)
+        finally:
+            os.unlink(path)
+
+        print(f"{seconds:>10} {interval_time:>13.2f} {interval_frames:>7} {keyframe_time:>13.2f} {keyframe_frames:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Upload Memory Benchmark
+Measures peak RSS of the server-side upload path for growing upload sizes:
+the old buffered `await file.read()` path versus the chunked streaming path
+used by save_video_to_storage. Parts are hashed and discarded instead of
+being sent to Supabase, so only server-side buffering is measured.
+
+Usage:
+    python benchmark_upload_memory.py --sizes 64,256,1024
+"""
+
+import os
+import sys
+import asyncio
+import hashlib
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_upload(path: str, size: int, mode: str):
+    from starlette.datastructures import UploadFile
+    from utils.supabase_storage import iter_upload_file, _rechunk, UPLOAD_CHUNK_SIZE
+
+    with open(path, 'rb') as handle:
+        upload = UploadFile(file=handle, size=size, filename='bench.mp4')
+        digest = hashlib.sha256()
+
+        if mode == 'buffered':
+            content = await upload.read()
+            digest.update(content)
+        else:
+            async for chunk in _rechunk(iter_upload_file(upload), UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+
+def measure(path: str, size: int, mode: str, results):
+    baseline = peak_rss_mb()
+    asyncio.run(run_upload(path, size, mode))
+    results.put(peak_rss_mb() - baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload memory use")
+    parser.add_argument('--sizes', default='64,256,1024', help='Comma-separated upload sizes in MB')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'size (MB)':>10} {'buffered RSS (MB)':>18} {'streaming RSS (MB)':>19}")
+
+    for size_mb in [int(s) for s in args.sizes.split(',')]:
+        size = size_mb * 1024 * 1024
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp:
+            # Write real bytes so reads are not served from a sparse hole
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                temp.write(block)
+            path = temp.name
+
+        row = []
+        try:
+            for mode in ('buffered', 'streaming'):
+                results = ctx.Queue()
+                process = ctx.Process(target=measure, args=(path, size, mode, results))
+                process.start()
+                process.join()
+                row.append(results.get())
+        finally:
+            os.unlink(path)
+
+        print(f"{size_mb:>10} {row[0]:>18.1f} {row[1]:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Vocal Analysis Streaming Benchmark
+Runs AudioAnalysisService vocal metrics in batch and streaming mode on
+synthetic 16 kHz speech-like WAVs of growing length, reporting peak RSS and
+the difference between the two results.
+
+Usage:
+    python benchmark_vocal_streaming.py --minutes 5,30,60
+"""
+
+import os
+import sys
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+SAMPLE_RATE = 16000
+
+
+def write_wav(path: str, minutes: int):
+    import numpy as np
+    import soundfile as sf
+
+    # Gliding 120-220 Hz tone with 4 Hz amplitude modulation, written a minute at a time
+    with sf.SoundFile(path, 'w', samplerate=SAMPLE_RATE, channels=1, subtype='PCM_16') as out:
+        for minute in range(minutes):
+            t = np.arange(60 * SAMPLE_RATE) / SAMPLE_RATE + minute * 60
+            pitch = 170 + 50 * np.sin(2 * np.pi * t / 7)
+            phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+            envelope = 0.3 + 0.2 * np.sin(2 * np.pi * 4 * t)
+            out.write((envelope * np.sin(phase)).astype('float32'))
+
+
+def measure(path: str, mode: str, results):
+    os.environ['AUDIO_ANALYSIS_MODE'] = mode
+    from services.audio_analysis import AudioAnalysisService
+
+    metrics = AudioAnalysisService()._compute_vocal_metrics(path)
+    # ru_maxrss is reported in kilobytes on Linux
+    results.put((metrics, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming vocal analysis")
+    parser.add_argument('--minutes', default='5,30,60', help='Comma-separated recording lengths in minutes')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'minutes':>8} {'batch RSS (MB)':>15} {'stream RSS (MB)':>16} {'pitch diff (Hz)':>16} {'std diff (Hz)':>14} {'loudness diff':>14}")
+
+    for minutes in [int(m) for m in args.minutes.split(',')]:
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp:
+            path = temp.name
+        try:
+            write_wav(path, minutes)
+            runs = {}
+            for mode in ('batch', 'stream'):
+                results = ctx.Queue()
+                process = ctx.Process(target=measure, args=(path, mode, results))
+                process.start()
+                runs[mode] = results.get()
+                process.join()
+        finally:
+            os.unlink(path)
+
+        (batch, batch_rss), (stream, stream_rss) = runs['batch'], runs['stream']
+        print(
+            f"{minutes:>8} {batch_rss:>15.1f} {stream_rss:>16.1f} "
+            f"{abs(batch['pitch_mean_hz'] - stream['pitch_mean_hz']):>16.2f} "
+            f"{abs(batch['pitch_variability'] - stream['pitch_variability']):>14.2f} "
+            f"{abs(batch['loudness_stability'] - stream['loudness_stability']):>14.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
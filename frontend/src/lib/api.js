@@ -98,8 +98,49 @@ export const videoAPI = {
       },
     });
   },
+  // Resumable upload: parts are sent in parallel and retried individually,
+  // so a dropped connection only re-sends the parts that did not arrive.
+  uploadResumable: async (file, onProgress, { concurrency = 3, retries = 3 } = {}) => {
+    const created = await api.post('/uploads', {
+      filename: file.name,
+      size: file.size,
+      content_type: file.type || 'video/mp4',
+    });
+    const { upload_id: uploadId, part_size: partSize } = created.data;
+    const partCount = Math.ceil(file.size / partSize);
+    const pending = Array.from({ length: partCount }, (_, i) => i);
+    let completed = 0;
+
+    const sendPart = async (part) => {
+      const blob = file.slice(part * partSize, Math.min((part + 1) * partSize, file.size));
+      for (let attempt = 0; ; attempt++) {
+        try {
+          await api.put(`/uploads/${uploadId}/parts/${part}`, blob, {
+            headers: { 'Content-Type': 'application/octet-stream' },
+          });
+          completed += 1;
+          if (onProgress) onProgress(Math.round((completed * 100) / partCount));
+          return;
+        } catch (error) {
+          if (attempt + 1 >= retries) throw error;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * (attempt + 1)));
+        }
+      }
+    };
+
+    const worker = async () => {
+      while (pending.length) {
+        await sendPart(pending.shift());
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(concurrency, partCount) }, worker));
+
+    return api.post(`/uploads/${uploadId}/finalize`);
+  },
   process: (videoId) => api.post(`/videos/${videoId}/process`),
   getJobStatus: (jobId) => api.get(`/jobs/${jobId}/status`),
+  // Server-Sent Events stream of the job's progress (authenticated by the session cookie)
+  jobEventsUrl: (jobId) => `${API_URL}/api/jobs/${jobId}/events`,
 };
 
 export const reportAPI = {
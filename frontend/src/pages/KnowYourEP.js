@@ -179,7 +179,7 @@ const KnowYourEP = () => {
     
     setUploading(true);
     try {
-      const uploadResponse = await videoAPI.upload(videoFile);
+      const uploadResponse = await videoAPI.uploadResumable(videoFile);
       const videoId = uploadResponse.data.video_id;
       toast.success('Video uploaded successfully');
       
@@ -197,7 +197,7 @@ const KnowYourEP = () => {
       const processResponse = await videoAPI.process(videoId);
       const newJobId = processResponse.data.job_id;
       
-      pollJobStatus(newJobId);
+      watchJobStatus(newJobId);
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Upload failed');
       setUploading(false);
@@ -205,6 +205,54 @@ const KnowYourEP = () => {
     }
   };
   
+  const finishJob = (job) => {
+    if (job.status === 'completed') {
+      toast.success('Analysis complete!');
+      
+      if (job.report_id) {
+        navigate(`/report/${job.report_id}`);
+      } else {
+        toast.error('Report not found');
+        setProcessing(false);
+        setStep('preview');
+      }
+    } else {
+      toast.error(job.last_error ? 'Processing failed: ' + job.last_error : 'Processing failed');
+      setProcessing(false);
+    }
+  };
+  
+  // Progress is pushed over Server-Sent Events; fall back to polling if the stream is unavailable
+  const watchJobStatus = (jobId) => {
+    if (typeof EventSource === 'undefined') {
+      pollJobStatus(jobId);
+      return;
+    }
+    
+    const source = new EventSource(videoAPI.jobEventsUrl(jobId), { withCredentials: true });
+    
+    source.onmessage = (message) => {
+      const job = JSON.parse(message.data);
+      setProgress(job.progress);
+      setCurrentStep(job.current_step);
+    };
+    
+    source.addEventListener('done', (message) => {
+      source.close();
+      const job = JSON.parse(message.data);
+      setProgress(job.progress);
+      setCurrentStep(job.current_step);
+      finishJob(job);
+    });
+    
+    source.onerror = () => {
+      // The browser reconnects dropped streams on its own; a refused one (e.g. 401/404) is closed
+      if (source.readyState === EventSource.CLOSED) {
+        pollJobStatus(jobId);
+      }
+    };
+  };
+  
   const pollJobStatus = async (jobId) => {
     const interval = setInterval(async () => {
       try {
@@ -214,21 +262,10 @@ const KnowYourEP = () => {
         setProgress(job.progress);
         setCurrentStep(job.current_step);
         
-        if (job.status === 'completed') {
-          clearInterval(interval);
-          toast.success('Analysis complete!');
-          
-          if (job.report_id) {
-            navigate(`/report/${job.report_id}`);
-          } else {
-            toast.error('Report not found');
-            setProcessing(false);
-            setStep('preview');
-          }
-        } else if (job.status === 'failed') {
+        // A failed attempt may be retried; the job is over once the queue is done with it
+        if (job.status === 'completed' || job.queue_state === 'done' || job.queue_state === 'dead') {
           clearInterval(interval);
-          toast.error('Processing failed: ' + job.error);
-          setProcessing(false);
+          finishJob(job);
         }
       } catch (error) {
         console.error('Error polling job:', error);
@@ -0,0 +1,17 @@
+-- Durable job queue: lease/heartbeat columns on the Jobs table
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS queue_state TEXT DEFAULT 'queued';
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS max_attempts INTEGER DEFAULT 3;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS lease_owner TEXT;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS report_id TEXT;
+
+-- Jobs that finished before the queue existed must not be claimed again
+UPDATE public.jobs SET queue_state = 'done' WHERE status = 'completed';
+UPDATE public.jobs SET queue_state = 'dead' WHERE status = 'failed';
+
+-- Indexes for claiming runnable jobs and recovering expired leases
+CREATE INDEX IF NOT EXISTS idx_jobs_queue_state_created_at ON public.jobs(queue_state, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease_expires_at ON public.jobs(lease_expires_at) WHERE queue_state = 'leased';
@@ -0,0 +1,2 @@
+-- Per-stage pipeline timings recorded when a job completes
+ALTER TABLE public.jobs ADD COLUMN IF NOT EXISTS stage_timings JSONB;
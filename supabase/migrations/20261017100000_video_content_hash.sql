@@ -0,0 +1,2 @@
+-- Content hash (sha256) computed while streaming uploads to storage
+ALTER TABLE public.videos ADD COLUMN IF NOT EXISTS content_hash TEXT;
@@ -0,0 +1,17 @@
+-- Deduplicate uploads by content hash
+CREATE INDEX IF NOT EXISTS idx_videos_content_hash ON public.videos(content_hash);
+CREATE INDEX IF NOT EXISTS idx_videos_file_path ON public.videos(file_path);
+
+-- Cached pipeline stage outputs keyed by media content hash and stage version
+CREATE TABLE IF NOT EXISTS public.analysis_cache (
+    content_hash TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    variant TEXT NOT NULL DEFAULT '',
+    result JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (content_hash, stage, version, variant)
+);
+
+-- Only the service role (backend workers) reads and writes the cache
+ALTER TABLE public.analysis_cache ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,2 @@
+-- Parsed ffprobe metadata (see models.video.MediaProbe), filled on first processing
+ALTER TABLE public.videos ADD COLUMN IF NOT EXISTS media_info JSONB;
@@ -0,0 +1,31 @@
+-- Auth hot path: resolve a live session and its user in one indexed round-trip
+
+-- The unique index covers the columns the lookup reads, so the session side is an index-only scan;
+-- it replaces the plain token index (the UNIQUE constraint already provides one)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_sessions_token_covering
+    ON public.user_sessions(session_token) INCLUDE (user_id, expires_at);
+DROP INDEX IF EXISTS public.idx_user_sessions_token;
+-- Used when purging expired sessions
+CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON public.user_sessions(expires_at);
+
+CREATE OR REPLACE FUNCTION public.get_session_user(p_session_token TEXT)
+RETURNS TABLE (
+    user_id UUID,
+    email TEXT,
+    name TEXT,
+    picture TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT u.id, u.email, u.name, u.picture, u.created_at, s.expires_at
+    FROM public.user_sessions s
+    JOIN public.users u ON u.id = s.user_id
+    WHERE s.session_token = p_session_token
+      AND s.expires_at > NOW()
+$$;
+
+-- Only the service role (the backend) resolves session tokens
+REVOKE ALL ON FUNCTION public.get_session_user(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_session_user(TEXT) TO service_role;
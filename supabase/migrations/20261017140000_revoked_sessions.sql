@@ -0,0 +1,22 @@
+-- Revoked signed session tokens (SESSION_TOKEN_MODE=signed), by token id until the token would expire
+CREATE TABLE IF NOT EXISTS public.revoked_sessions (
+    jti TEXT PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_sessions_expires_at ON public.revoked_sessions(expires_at);
+
+-- Only the service role (backend) reads and writes revocations
+ALTER TABLE public.revoked_sessions ENABLE ROW LEVEL SECURITY;
+
+-- The live revocation list each API process caches; expired entries no longer matter
+CREATE OR REPLACE FUNCTION public.get_revoked_sessions()
+RETURNS TABLE (jti TEXT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT r.jti FROM public.revoked_sessions r WHERE r.expires_at > NOW()
+$$;
+
+REVOKE ALL ON FUNCTION public.get_revoked_sessions() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_revoked_sessions() TO service_role;
@@ -216,8 +216,52 @@ create index if not exists idx_video_jobs_user_id on video_jobs(user_id);
 create index if not exists idx_video_jobs_video_id on video_jobs(video_id);
 create index if not exists idx_ep_reports_user_id on ep_reports(user_id);
 create index if not exists idx_ep_reports_video_id on ep_reports(video_id);
-create index if not exists idx_user_sessions_token on user_sessions(session_token);
+create unique index if not exists idx_user_sessions_token_covering on user_sessions(session_token) include (user_id, expires_at);
+create index if not exists idx_user_sessions_expires_at on user_sessions(expires_at);
 create index if not exists idx_user_sessions_user_id on user_sessions(user_id);
 create index if not exists idx_subscriptions_user_id on subscriptions(user_id);
 create index if not exists idx_coaching_requests_user_id on coaching_requests(user_id);
-create index if not exists idx_report_shares_report_id on report_shares(report_id);
\ No newline at end of file
+create index if not exists idx_report_shares_report_id on report_shares(report_id);
+
+-- Resolve a live session and its user in one round-trip (auth hot path)
+create or replace function get_session_user(p_session_token text)
+returns table (
+  user_id uuid,
+  email text,
+  name text,
+  picture text,
+  created_at timestamp with time zone,
+  expires_at timestamp with time zone
+)
+language sql stable
+as $$
+  select u.id, u.email, u.name, u.picture, u.created_at, s.expires_at
+  from user_sessions s
+  join users u on u.id = s.user_id
+  where s.session_token = p_session_token
+    and s.expires_at > now()
+$$;
+
+revoke all on function get_session_user(text) from public, anon, authenticated;
+grant execute on function get_session_user(text) to service_role;
+
+-- Revoked signed session tokens (SESSION_TOKEN_MODE=signed), kept until the token would expire
+create table if not exists revoked_sessions (
+  jti text primary key,
+  expires_at timestamp with time zone not null,
+  revoked_at timestamp with time zone default now()
+);
+
+create index if not exists idx_revoked_sessions_expires_at on revoked_sessions(expires_at);
+
+alter table revoked_sessions enable row level security;
+
+create or replace function get_revoked_sessions()
+returns table (jti text)
+language sql stable
+as $$
+  select r.jti from revoked_sessions r where r.expires_at > now()
+$$;
+
+revoke all on function get_revoked_sessions() from public, anon, authenticated;
+grant execute on function get_revoked_sessions() to service_role;